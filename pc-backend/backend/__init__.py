@@ -14,8 +14,6 @@ from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
 from prometheus_flask_exporter import PrometheusMetrics
 from redis import Redis
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
@@ -28,6 +26,8 @@ from backend.config import Config
 from backend.models import Base
 from backend.middleware.request_id import init_app as request_id_init
 from backend.utils.logging import init_logging
+from backend.utils.compression import init_compression
+from backend.utils.db import init_db, worker_engine
 
 # Blueprints
 from backend.api.auth import auth_bp
@@ -38,6 +38,7 @@ from backend.api.dashboard import dashboard_bp
 from backend.api.portfolio import portfolio_bp
 from backend.api.kpi import kpi_bp
 from backend.api.export import export_bp
+from backend.api.export_jobs import export_jobs_bp
 from backend.api.fx_rates import fx_rates_bp
 from backend.api.system_health import health_bp
 from backend.api.profit_assumptions import profit_bp
@@ -77,8 +78,7 @@ def create_app(config_object=Config):
     })
 
     # Async SQLAlchemy
-    engine = create_async_engine(app.config['DATABASE_URL'], echo=False)
-    app.async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    init_db(app)
 
     # OTel with fallback
     try:
@@ -91,17 +91,17 @@ def create_app(config_object=Config):
         app.logger.warning(f"OTel instrumentation failed: {e} - proceeding without tracing.")
 
     if app.config['FLASK_DEBUG']:
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        Base.metadata.create_all(worker_engine())
 
     blueprints = [
-        auth_bp, api_v1, ingest_bp, ingest_ms_bp, dashboard_bp, portfolio_bp, kpi_bp, export_bp, fx_rates_bp, health_bp, profit_bp, cat_bp, security_bp
+        auth_bp, api_v1, ingest_bp, ingest_ms_bp, dashboard_bp, portfolio_bp, kpi_bp, export_bp, export_jobs_bp, fx_rates_bp, health_bp, profit_bp, cat_bp, security_bp
     ]
     for bp in blueprints:
         app.register_blueprint(bp)
 
     request_id_init(app)
     init_logging(app)
+    init_compression(app)
 
     @app.errorhandler(Exception)
     def handle_exception(err):
@@ -135,15 +135,6 @@ def create_app(config_object=Config):
             "build_time": os.getenv("BUILD_TIME", "unknown")
         })
 
-    @app.teardown_appcontext
-    async def shutdown_session(exception=None):
-        if hasattr(g, 'db_session'):
-            if exception:
-                await g.db_session.rollback()
-            else:
-                await g.db_session.commit()
-            await g.db_session.close()
-
     app.redis = Redis.from_url(app.config['REDIS_URL'], decode_responses=True)
 
     def shutdown_handler(signum, frame):
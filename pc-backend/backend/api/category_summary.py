@@ -1,18 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
 from flask_jwt_extended import jwt_required
 from datetime import date
-from backend.services.category_summary import get_category_summary
+from backend.services.category_summary import CATEGORY_WATERMARK, get_category_summary
 from backend.utils.db import get_db_session
+from backend.utils.serialization import rows_response
+from backend.utils.watermark import conditional
 
 cat_bp = Blueprint('cat_summary', __name__, url_prefix='/api/v1/category_summary')
 
 @cat_bp.route('', methods=['GET'])
 @jwt_required()
+@conditional(*CATEGORY_WATERMARK)
 async def category_summary():
     start_date = date.fromisoformat(request.args.get('start_date'))
     end_date = date.fromisoformat(request.args.get('end_date'))
     product_category_ids = request.args.getlist('product_category_ids')
     mode = request.args.get('mode', 'native')
-    async with get_db_session() as session:
+    async with get_db_session(read_only=True) as session:
         rows = await get_category_summary(session, start_date, end_date, product_category_ids, mode)
-        return jsonify([r._asdict() for r in rows]), 200
\ No newline at end of file
+        return rows_response(rows)
\ No newline at end of file
@@ -1,21 +1,49 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
+import time
 from datetime import date
-from backend.services.campaign_command import get_campaign_command_data
-from backend.utils.pagination import paginate
+from backend.services.campaign_command import CAMPAIGN_COMMAND_WATERMARK, get_campaign_command_data
+from backend.services.dashboard_batch import BatchError, parse_batch, run_batch
+from backend.utils.pagination import InvalidCursor, keyset_paginate, keyset_requested, paginate
 from backend.utils.db import get_db_session
+from backend.utils.serialization import json_response, rows_payload
+from backend.utils.watermark import conditional
 
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api/v1/dashboard')
 
+CAMPAIGN_COMMAND_SORT = (('spend_raw', True), ('campaign_id', False), ('name', False), ('status', False))
+
 @dashboard_bp.route('/campaign_command_data', methods=['GET'])
 @jwt_required()
+@conditional(*CAMPAIGN_COMMAND_WATERMARK)
 async def campaign_command_data():
     start_date = date.fromisoformat(request.args.get('start_date'))
     end_date = date.fromisoformat(request.args.get('end_date'))
     page = int(request.args.get('page', 1))
     page_size = int(request.args.get('page_size', 20))
     filters = {k: request.args.getlist(k) for k in ('master_store_ids', 'bm_ids', 'status')}
-    async with get_db_session() as session:
+    async with get_db_session(read_only=True) as session:
         stmt = await get_campaign_command_data(session, start_date, end_date, filters)
-        items, pagination = await paginate(session, stmt, page, page_size)
-        return jsonify({"rows": [item._asdict() for item in items], "pagination": pagination}), 200
\ No newline at end of file
+        if keyset_requested(request.args):
+            try:
+                items, pagination = await keyset_paginate(
+                    session, stmt, CAMPAIGN_COMMAND_SORT, request.args.get('cursor'), page_size, request.args.get('count')
+                )
+            except InvalidCursor as e:
+                return jsonify({"error": str(e)}), 400
+        else:
+            items, pagination = await paginate(session, stmt, page, page_size)
+        return json_response({"rows": rows_payload(items, request.args.get('shape')), "pagination": pagination})
+
+@dashboard_bp.route('/batch', methods=['POST'])
+@jwt_required()
+async def dashboard_batch():
+    """One page load: {"start_date", "end_date", shared filters..., "widgets": [{"name", "query", "params"}]}."""
+    started = time.perf_counter()
+    body = request.get_json(silent=True)
+    try:
+        shared, widgets = parse_batch(body)
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    results = await run_batch(shared, widgets, body.get('shape') or request.args.get('shape'))
+    return json_response({"widgets": results, "ms": round((time.perf_counter() - started) * 1000, 1)})
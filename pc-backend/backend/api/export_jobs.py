@@ -0,0 +1,71 @@
+import os
+from datetime import date
+from flask import Blueprint, request, jsonify, send_file, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.datastructures import MultiDict
+from backend.services.exports import EXPORTS, FORMATS, export_params, export_watermark
+from backend.tasks.exports import render_export
+from backend.utils.db import get_db_session
+from backend.utils.export_jobs import create_job, get_job, owned_by
+
+export_jobs_bp = Blueprint('export_jobs', __name__, url_prefix='/api/v1/export/jobs')
+
+def _job_response(job):
+    body = {k: job.get(k) or None for k in ("job_id", "export", "format", "status", "error")}
+    body["params"] = job["params"]
+    if job["status"] == "done":
+        body["size"] = int(job["size"])
+        body["download_url"] = url_for('export_jobs.download_export_job', job_id=job["job_id"])
+    return body
+
+def _request_args():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return request.args
+    return MultiDict([(k, v) for k, values in body.items() for v in (values if isinstance(values, list) else [values])])
+
+@export_jobs_bp.route('', methods=['POST'])
+@jwt_required()
+async def create_export_job():
+    args = _request_args()
+    name = args.get('export')
+    if name not in EXPORTS:
+        return jsonify({"error": f"export must be one of: {', '.join(sorted(EXPORTS))}"}), 400
+    fmt = args.get('format', 'xlsx')
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(FORMATS)}"}), 400
+    params = export_params(name, args)
+    try:
+        for k in ('start_date', 'end_date'):
+            if k in params:
+                date.fromisoformat(params[k])
+    except (TypeError, ValueError):
+        return jsonify({"error": "start_date and end_date must be ISO dates"}), 400
+    async with get_db_session() as session:
+        watermark = await export_watermark(session, name)
+    job, created = create_job(name, params, watermark, str(get_jwt_identity()), fmt)
+    if created:
+        render_export.apply_async(args=(job["job_id"],), queue='exports')
+    return jsonify(_job_response(job)), 202 if created else 200
+
+@export_jobs_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+async def get_export_job(job_id):
+    job = get_job(job_id)
+    # Another user's job is reported as missing rather than forbidden, so job ids cannot be probed.
+    if not owned_by(job, get_jwt_identity()):
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(_job_response(job)), 200
+
+@export_jobs_bp.route('/<job_id>/download', methods=['GET'])
+@jwt_required()
+async def download_export_job(job_id):
+    job = get_job(job_id)
+    if not owned_by(job, get_jwt_identity()):
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": f"Job is {job['status']}"}), 409
+    if not os.path.exists(job["path"]):
+        return jsonify({"error": "Artifact expired"}), 410
+    # conditional=True gives Range / If-Range / ETag handling, so interrupted downloads can resume.
+    return send_file(job["path"], mimetype=FORMATS[job["format"]], as_attachment=True, download_name=f"{job['export']}.{job['format']}", conditional=True)
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt
 from datetime import date
 from backend.models.aggregated import FXDailyRate
+from backend.utils.cache_tags import bump_tags, fx_tags
 from backend.utils.db import get_db_session
 from backend.utils.security import admin_required
 from sqlalchemy import select
@@ -35,6 +36,7 @@ async def create_fx_rate():
         new_rate = FXDailyRate(date=date.fromisoformat(data['date']), from_currency=data['from_currency'], to_currency=data['to_currency'], rate=data['rate'], source='manual')
         session.add(new_rate)
         await session.commit()
+        bump_tags(fx_tags())
         return jsonify({"id": new_rate.id, "date": new_rate.date, "from_currency": new_rate.from_currency, "to_currency": new_rate.to_currency, "rate": new_rate.rate, "source": new_rate.source}), 201
 
 @fx_rates_bp.route('/<int:rate_id>', methods=['PUT'])
@@ -50,6 +52,7 @@ async def update_fx_rate(rate_id):
             return jsonify({"error": "Cannot modify auto rate"}), 403
         rate.rate = data['rate']
         await session.commit()
+        bump_tags(fx_tags())
         return jsonify({"id": rate.id, "date": rate.date, "from_currency": rate.from_currency, "to_currency": rate.to_currency, "rate": rate.rate, "source": rate.source}), 200
 
 @fx_rates_bp.route('/<int:rate_id>', methods=['DELETE'])
@@ -64,4 +67,5 @@ async def delete_fx_rate(rate_id):
             return jsonify({"error": "Cannot delete auto rate"}), 403
         await session.delete(rate)
         await session.commit()
+        bump_tags(fx_tags())
         return '', 204
\ No newline at end of file
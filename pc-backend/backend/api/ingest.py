@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-from backend.tasks.tasks import process_ingestion
+from backend.tasks.tasks import process_ingestion, process_ingestion_batch
+from backend.schemas.ingestion import IngestionBatchPayload
 from backend.utils.security import require_api_key
 from backend.config import Config
 
@@ -11,4 +12,25 @@ ingest_bp = Blueprint('ingest', __name__, url_prefix='/api/v1/ingest')
 async def ingest_data():
     data = request.json
     task = process_ingestion.delay(data)
-    return jsonify({"message": "Data accepted", "task_id": task.id}), 202
\ No newline at end of file
+    return jsonify({"message": "Data accepted", "task_id": task.id}), 202
+
+@ingest_bp.route('/batch', methods=['POST'])
+@require_api_key({"ingest"}) if Config.ENABLE_API_KEYS else jwt_required()
+async def ingest_batch():
+    data = request.json
+    errors = IngestionBatchPayload().validate(data)
+    if errors:
+        return jsonify({"error": errors}), 400
+    task = process_ingestion_batch.delay(data["items"])
+    return jsonify({"message": "Batch accepted", "items": len(data["items"]), "task_id": task.id}), 202
+
+@ingest_bp.route('/batch/<task_id>', methods=['GET'])
+@require_api_key({"ingest"}) if Config.ENABLE_API_KEYS else jwt_required()
+async def ingest_batch_status(task_id):
+    result = process_ingestion_batch.AsyncResult(task_id)
+    body = {"task_id": task_id, "status": result.status}
+    if result.successful():
+        body["chunks"] = result.result
+    elif result.failed():
+        body["error"] = str(result.result)
+    return jsonify(body), 200
@@ -1,19 +1,26 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
 from datetime import date
-from backend.services.kpi import get_kpi_snapshot
+from backend.services.kpi import KPI_GRAINS, KPI_WATERMARK, get_kpi_snapshot
 from backend.utils.db import get_db_session
+from backend.utils.serialization import rows_response
+from backend.utils.watermark import conditional
 
 kpi_bp = Blueprint('kpi', __name__, url_prefix='/api/v1/kpi')
 
 @kpi_bp.route('/snapshot', methods=['GET'])
 @jwt_required()
+@conditional(*KPI_WATERMARK)
 async def kpi_snapshot():
     start_date = date.fromisoformat(request.args.get('start_date'))
     end_date = date.fromisoformat(request.args.get('end_date'))
     master_store_ids = request.args.getlist('master_store_ids')
     bm_ids = request.args.getlist('bm_ids')
     mode = request.args.get('mode', 'native')
-    async with get_db_session() as session:
-        rows = await get_kpi_snapshot(session, start_date, end_date, master_store_ids, bm_ids, mode)
-        return jsonify([r._asdict() for r in rows]), 200
\ No newline at end of file
+    # day (default) returns daily rows; week and month are summed from the rollups; auto picks by range length.
+    grain = request.args.get('grain', 'day')
+    if grain not in KPI_GRAINS:
+        return jsonify({"error": f"grain must be one of: {', '.join(KPI_GRAINS)}"}), 400
+    async with get_db_session(read_only=True) as session:
+        rows = await get_kpi_snapshot(session, start_date, end_date, master_store_ids, bm_ids, mode, grain)
+        return rows_response(rows)
\ No newline at end of file
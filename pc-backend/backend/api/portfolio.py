@@ -1,15 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
 from flask_jwt_extended import jwt_required
-from backend.services.portfolio import get_bm_health_rows
+from backend.config import Config
+from backend.services.portfolio import PORTFOLIO_WATERMARK, get_bm_health_rows
 from backend.utils.db import get_db_session
+from backend.utils.serialization import rows_response
+from backend.utils.watermark import conditional
 
 portfolio_bp = Blueprint('portfolio', __name__, url_prefix='/api/v1/portfolio')
 
 @portfolio_bp.route('/snapshot', methods=['GET'])
 @jwt_required()
+@conditional(*PORTFOLIO_WATERMARK, bucket=Config.CACHE_PORTFOLIO_TIMEOUT)
 async def portfolio_snapshot():
     region_ids = request.args.getlist('region_ids')
     master_store_ids = request.args.getlist('master_store_ids')
-    async with get_db_session() as session:
+    async with get_db_session(read_only=True) as session:
         rows = await get_bm_health_rows(session, region_ids, master_store_ids)
-        return jsonify([r._asdict() for r in rows]), 200
\ No newline at end of file
+        return rows_response(rows)
\ No newline at end of file
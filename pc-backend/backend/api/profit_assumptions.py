@@ -1,18 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
 from flask_jwt_extended import jwt_required
 from datetime import date
-from backend.services.bm_profit import get_profit_summary
+from backend.services.bm_profit import PROFIT_WATERMARK, get_profit_summary
 from backend.utils.db import get_db_session
+from backend.utils.serialization import rows_response
+from backend.utils.watermark import conditional
 
 profit_bp = Blueprint('profit', __name__, url_prefix='/api/v1/profit_assumptions')
 
 @profit_bp.route('/summary', methods=['GET'])
 @jwt_required()
+@conditional(*PROFIT_WATERMARK)
 async def profit_summary():
     start_date = date.fromisoformat(request.args.get('start_date'))
     end_date = date.fromisoformat(request.args.get('end_date'))
     bm_ids = request.args.getlist('bm_ids')
     mode = request.args.get('mode', 'native')
-    async with get_db_session() as session:
-        rows = await get_profit_summary(session, start_date, end_date, bm_ids)
-        return jsonify([r._asdict() for r in rows]), 200
\ No newline at end of file
+    async with get_db_session(read_only=True) as session:
+        rows = await get_profit_summary(session, start_date, end_date, bm_ids, mode)
+        return rows_response(rows)
\ No newline at end of file
@@ -11,6 +11,7 @@ from webauthn import generate_registration_options, verify_registration_response
 from webauthn.helpers.structs import PublicKeyCredentialCreationOptions, PublicKeyCredentialRequestOptions
 from backend.models.security import ApiKey, WebAuthnCredential
 from backend.models.core import User
+from backend.utils.api_key_cache import revoke_verified
 from backend.utils.db import get_db_session
 from backend.utils.security import mfa_verified, admin_required
 from bcrypt import hashpw, gensalt
@@ -191,7 +192,9 @@ async def rotate_api_key(key_id):
         await session.commit()
         new_data = {"scopes": key.scopes, "ttl_days": (key.expires_at - datetime.utcnow()).days, "bm_id": key.bm_id, "rate_limit": key.rate_limit}
         response = await create_api_key(new_data)
-        current_app.redis.setex(f"ak_grace:{key.key_id}", Config.KEY_GRACE_HOURS * 3600, json.dumps({'key_hash': key.key_hash, 'expires_at': str(key.expires_at)}))
+        current_app.redis.delete(f"ak:{key.key_id}")
+        revoke_verified(key.key_id)
+        current_app.redis.setex(f"ak_grace:{key.key_id}", Config.KEY_GRACE_HOURS * 3600, json.dumps({'key_hash': key.key_hash, 'expires_at': str(key.expires_at), 'scopes': key.scopes}))
         return response
 
 @security_bp.route('/admin/api_keys/<uuid:key_id>', methods=['DELETE'])
@@ -206,4 +209,5 @@ async def revoke_api_key(key_id):
         key.revoked = True
         await session.commit()
         current_app.redis.delete(f"ak:{key.key_id}")
+        revoke_verified(key.key_id)
         return '', 204
\ No newline at end of file
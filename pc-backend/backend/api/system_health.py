@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify
 from backend.utils.health import compute_health_status, compute_freshness_score
 from backend.utils.db import get_db_session
+from backend.utils.rollup import rollup_status
 
 health_bp = Blueprint('health', __name__, url_prefix='/api/v1/system_health')
 
@@ -9,4 +10,8 @@ async def system_health():
     async with get_db_session() as session:
         status = await compute_health_status(session)
         score = await compute_freshness_score(session)
-        return jsonify({"status": status, "freshness_score": score}), 200
\ No newline at end of file
+        return jsonify({"status": status, "freshness_score": score}), 200
+
+@health_bp.route('/rollups', methods=['GET'])
+async def rollup_health():
+    return jsonify(rollup_status()), 200
@@ -1,21 +1,72 @@
 import os
+import secrets
 from datetime import timedelta
 
 class Config:
     FLASK_DEBUG = int(os.getenv("FLASK_DEBUG", 0))
     SECRET_KEY = os.getenv("SECRET_KEY")
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+    API_KEY_HMAC_KEY = os.getenv("API_KEY_HMAC_KEY")  # Keys the verified-secret digests in Redis
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES_HOURS", 4)))
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///performance.db")
+    # Pool settings for blocking engines; the async web engines open one connection per session (utils.db).
     SQLALCHEMY_ENGINE_OPTIONS = {
         "pool_pre_ping": True,
         "pool_size": int(os.getenv("DB_POOL_SIZE", 20)),
         "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
     }
+    # Celery workers run a few tasks at a time; they get their own, smaller blocking pool.
+    SQLALCHEMY_WORKER_ENGINE_OPTIONS = {
+        **SQLALCHEMY_ENGINE_OPTIONS,
+        "pool_size": int(os.getenv("DB_WORKER_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_WORKER_MAX_OVERFLOW", 5)),
+    }
+    # Read-only service calls may go to these; empty keeps every query on DATABASE_URL.
+    DATABASE_REPLICA_URLS = [u for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u]
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+    REPLICA_PROBE_INTERVAL_SECONDS = float(os.getenv("REPLICA_PROBE_INTERVAL_SECONDS", 5))
     INGESTION_TOKEN = os.getenv("INGESTION_TOKEN", "ingest-token-placeholder")
     LEGACY_API_KEY = os.getenv("LEGACY_API_KEY", "legacy_token_placeholder")
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",")
     RETENTION_MONTHS = int(os.getenv("RETENTION_MONTHS", 24))
+    PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+    PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", 5000))
+    PURGE_PAUSE_SECONDS = float(os.getenv("PURGE_PAUSE_SECONDS", 0.2))  # Between batches, so replicas and autovacuum keep up
+    PURGE_LOCK_TIMEOUT_MS = int(os.getenv("PURGE_LOCK_TIMEOUT_MS", 2000))
+    PURGE_MAX_LOCK_TIMEOUTS = int(os.getenv("PURGE_MAX_LOCK_TIMEOUTS", 5))
+    PURGE_TIME_BUDGET_SECONDS = int(os.getenv("PURGE_TIME_BUDGET_SECONDS", 1800))  # Per table per run; the rest resumes next run
+    ROLLUP_DRAIN_INTERVAL_SECONDS = float(os.getenv("ROLLUP_DRAIN_INTERVAL_SECONDS", 30))
+    ROLLUP_DRAIN_BATCH_SIZE = int(os.getenv("ROLLUP_DRAIN_BATCH_SIZE", 5000))
+    ROLLUP_DRAIN_LOCK_SECONDS = int(os.getenv("ROLLUP_DRAIN_LOCK_SECONDS", 300))
+    KPI_CUBE_ENABLED = os.getenv("KPI_CUBE_ENABLED", "false").lower() == "true"  # In-process columnar copy of kpi_daily_snapshot
+    KPI_CUBE_DAYS = int(os.getenv("KPI_CUBE_DAYS", 400))  # Older ranges are read from SQL
+    KPI_CUBE_REFRESH_SECONDS = float(os.getenv("KPI_CUBE_REFRESH_SECONDS", 15))
+    KPI_CUBE_REBUILD_SECONDS = int(os.getenv("KPI_CUBE_REBUILD_SECONDS", 3600))
+    INGEST_BATCH_CHUNK_SIZE = int(os.getenv("INGEST_BATCH_CHUNK_SIZE", 2000))  # Rows per INSERT; stays under the 32767 bind-param limit
+    DASHBOARD_BATCH_MAX_WIDGETS = int(os.getenv("DASHBOARD_BATCH_MAX_WIDGETS", 12))  # Each widget holds its own pooled connection
+    PAGINATION_COUNT_CACHE_SECONDS = int(os.getenv("PAGINATION_COUNT_CACHE_SECONDS", 60))
+    EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", 2000))
+    EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 65536))
+    EXPORT_STORAGE_DIR = os.getenv("EXPORT_STORAGE_DIR", "/data/exports")
+    EXPORT_ARTIFACT_TTL = int(os.getenv("EXPORT_ARTIFACT_TTL", 900))
+    EXPORT_RENDER_TIMEOUT = int(os.getenv("EXPORT_RENDER_TIMEOUT", 3600))  # Hard time limit on one render
+    CACHE_L1_MAX_BYTES = int(os.getenv("CACHE_L1_MAX_BYTES", 64 * 1024 * 1024))  # Per worker process
+    CACHE_STALE_GRACE_SECONDS = int(os.getenv("CACHE_STALE_GRACE_SECONDS", 60))
+    CACHE_LOCK_SECONDS = int(os.getenv("CACHE_LOCK_SECONDS", 30))
+    CACHE_LOCK_POLL_SECONDS = float(os.getenv("CACHE_LOCK_POLL_SECONDS", 0.05))
+    CACHE_TAG_VERSION_TTL = float(os.getenv("CACHE_TAG_VERSION_TTL", 5))  # Fallback if a pub/sub bump is missed
+    CACHE_TAGGED_TIMEOUT = int(os.getenv("CACHE_TAGGED_TIMEOUT", 86400))
+    CACHE_PORTFOLIO_TIMEOUT = int(os.getenv("CACHE_PORTFOLIO_TIMEOUT", 60))
+    CACHE_DIMENSION_TIMEOUT = int(os.getenv("CACHE_DIMENSION_TIMEOUT", 60))  # Entries that also read BM, category or profit-assumption rows
+    COMPRESS_ALGORITHMS = os.getenv("COMPRESS_ALGORITHMS", "br,zstd,gzip").split(",")  # Server preference order
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", 3))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+    COMPRESS_STREAM_BROTLI_QUALITY = int(os.getenv("COMPRESS_STREAM_BROTLI_QUALITY", 4))
+    CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "br")
     REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
     CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL)
     CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", REDIS_URL)
@@ -25,11 +76,16 @@ class Config:
     FX_API_URL = os.getenv("FX_API_URL", "https://api.exchangerate.host")
     BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
     KEY_GRACE_HOURS = int(os.getenv("KEY_GRACE_HOURS", 4))
+    API_KEY_VERIFY_TTL = int(os.getenv("API_KEY_VERIFY_TTL", 300))  # Longest a verified secret skips bcrypt
+    API_KEY_USAGE_FLUSH_SECONDS = int(os.getenv("API_KEY_USAGE_FLUSH_SECONDS", 60))
     OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4317")
     TOTP_ENCRYPTION_KEY = os.getenv("TOTP_ENCRYPTION_KEY", secrets.token_bytes(32))  # KMS in prod
 
     @classmethod
     def validate_for_prod(cls):
+        # Checked in debug too: without it every API-key request fails at its first digest.
+        if not cls.API_KEY_HMAC_KEY:
+            raise RuntimeError("Mandatory secret not set: API_KEY_HMAC_KEY")
         if cls.FLASK_DEBUG == 0:
             missing = [k for k in ("SECRET_KEY", "JWT_SECRET_KEY") if not getattr(cls, k)]
             if missing:
@@ -0,0 +1,27 @@
+"""v26 unique rollup keys for set-based upserts
+
+Revision ID: 20261018_v26_rollup_keys
+Revises: 20250806_v25_security
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+
+revision = '20261018_v26_rollup_keys'
+down_revision = '20250806_v25_security'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Per-message merges left duplicate (bm_id, date) snapshots behind; keep the newest before enforcing uniqueness.
+    op.execute("""
+        DELETE FROM kpi_daily_snapshot a
+        USING kpi_daily_snapshot b
+        WHERE a.bm_id = b.bm_id AND a.date = b.date AND a.id < b.id
+    """)
+    op.drop_index('ix_kpi_daily_snapshot_bm_date', table_name='kpi_daily_snapshot')
+    op.create_index('ix_kpi_daily_snapshot_bm_date', 'kpi_daily_snapshot', ['bm_id', 'date'], unique=True)
+
+def downgrade():
+    op.drop_index('ix_kpi_daily_snapshot_bm_date', table_name='kpi_daily_snapshot')
+    op.create_index('ix_kpi_daily_snapshot_bm_date', 'kpi_daily_snapshot', ['bm_id', 'date'], unique=False)
@@ -0,0 +1,35 @@
+"""v27 campaign to BM attribution
+
+Revision ID: 20261018_v27_campaign_bm_attribution
+Revises: 20261018_v26_rollup_keys
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261018_v27_campaign_bm_attribution'
+down_revision = '20261018_v26_rollup_keys'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('meta_campaign_bm_map',
+        sa.Column('campaign_id', sa.String(length=50), nullable=False),
+        sa.Column('bm_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['bm_id'], ['business_manager_configs.id'], ondelete='CASCADE', onupdate='CASCADE'),
+        sa.PrimaryKeyConstraint('campaign_id')
+    )
+    op.create_index(op.f('ix_meta_campaign_bm_map_bm_id'), 'meta_campaign_bm_map', ['bm_id'], unique=False)
+
+    op.add_column('meta_daily_performance', sa.Column('bm_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_meta_daily_performance_bm_id', 'meta_daily_performance', 'business_manager_configs', ['bm_id'], ['id'], ondelete='SET NULL', onupdate='CASCADE')
+    op.create_index('ix_meta_daily_performance_bm_date', 'meta_daily_performance', ['bm_id', 'date'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_meta_daily_performance_bm_date', table_name='meta_daily_performance')
+    op.drop_constraint('fk_meta_daily_performance_bm_id', 'meta_daily_performance', type_='foreignkey')
+    op.drop_column('meta_daily_performance', 'bm_id')
+    op.drop_index(op.f('ix_meta_campaign_bm_map_bm_id'), table_name='meta_campaign_bm_map')
+    op.drop_table('meta_campaign_bm_map')
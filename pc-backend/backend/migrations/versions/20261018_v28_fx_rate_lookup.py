@@ -0,0 +1,20 @@
+"""v28 fx rate lookup index
+
+Revision ID: 20261018_v28_fx_rate_lookup
+Revises: 20261018_v27_campaign_bm_attribution
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+
+revision = '20261018_v28_fx_rate_lookup'
+down_revision = '20261018_v27_campaign_bm_attribution'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Serves the last-known-rate lookup: one backward index scan per (currency, day) pair.
+    op.create_index('ix_fx_daily_rates_pair_date', 'fx_daily_rates', ['from_currency', 'to_currency', 'date'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_fx_daily_rates_pair_date', table_name='fx_daily_rates')
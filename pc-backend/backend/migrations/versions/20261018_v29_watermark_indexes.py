@@ -0,0 +1,34 @@
+"""v29 watermark indexes
+
+Revision ID: 20261018_v29_watermark_indexes
+Revises: 20261018_v28_fx_rate_lookup
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261018_v29_watermark_indexes'
+down_revision = '20261018_v28_fx_rate_lookup'
+branch_labels = None
+depends_on = None
+
+# max(created_at) / max(updated_at) back every ETag and export fingerprint; each index turns one into a single probe.
+# updated_at is NULL until a row is first updated, so those indexes are partial and max() never walks the NULLs.
+CREATED = ('kpi_daily_snapshot', 'meta_daily_performance', 'meta_campaign_data', 'fx_daily_rates')
+UPDATED = ('kpi_daily_snapshot', 'meta_daily_performance')
+
+def upgrade():
+    # Upserts overwrite meta rows in place, so created_at alone would miss re-ingested days.
+    op.add_column('meta_daily_performance', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    for table in CREATED:
+        op.create_index(f'ix_{table}_created_at', table, ['created_at'], unique=False)
+    for table in UPDATED:
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False, postgresql_where=sa.text('updated_at IS NOT NULL'))
+
+def downgrade():
+    for table in UPDATED:
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+    for table in CREATED:
+        op.drop_index(f'ix_{table}_created_at', table_name=table)
+    op.drop_column('meta_daily_performance', 'updated_at')
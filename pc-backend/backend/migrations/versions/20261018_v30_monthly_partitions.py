@@ -0,0 +1,80 @@
+"""v30 monthly partitions
+
+Revision ID: 20261018_v30_monthly_partitions
+Revises: 20261018_v29_watermark_indexes
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+revision = '20261018_v30_monthly_partitions'
+down_revision = '20261018_v29_watermark_indexes'
+branch_labels = None
+depends_on = None
+
+# Partition keys must be part of every unique index, so the primary keys become (id, <date column>).
+# table -> (partition column, [(index name, columns, unique, where)], [(fk name, column, ondelete)])
+TABLES = {
+    'meta_daily_performance': ('date', [
+        ('ix_meta_daily_performance_campaign_date', ['campaign_id', 'date'], True, None),
+        ('ix_meta_daily_performance_bm_date', ['bm_id', 'date'], False, None),
+        ('ix_meta_daily_performance_created_at', ['created_at'], False, None),
+        ('ix_meta_daily_performance_updated_at', ['updated_at'], False, 'updated_at IS NOT NULL'),
+    ], [('fk_meta_daily_performance_bm_id', 'bm_id', 'SET NULL')]),
+    'shopify_child_daily_sales_summary': ('summary_date', [
+        ('ix_shopify_child_daily_summary_bm_date', ['bm_id', 'summary_date'], True, None),
+    ], [('shopify_child_daily_sales_summary_bm_id_fkey', 'bm_id', 'CASCADE')]),
+    'meta_campaign_data': ('date', [
+        ('ix_meta_campaign_data_campaign_date', ['campaign_id', 'date'], True, None),
+        ('ix_meta_campaign_data_created_at', ['created_at'], False, None),
+    ], []),
+    'fx_daily_rates': ('date', [
+        ('fx_daily_rates_date_from_currency_to_currency_source_key', ['date', 'from_currency', 'to_currency', 'source'], True, None),
+        ('ix_fx_daily_rates_date_from', ['date', 'from_currency'], False, None),
+        ('ix_fx_daily_rates_pair_date', ['from_currency', 'to_currency', 'date'], False, None),
+        ('ix_fx_daily_rates_created_at', ['created_at'], False, None),
+    ], []),
+}
+MONTHS_AHEAD = 3
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def _rebuild(table, old, partition_by):
+    # The new table takes over the serial sequence before the old one, which owns it, is dropped.
+    op.execute(f'ALTER TABLE {table} RENAME TO {old}')
+    op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){partition_by}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+
+def _finish(table, old, key, indexes, fks):
+    op.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+    op.execute(f'DROP TABLE {old}')
+    op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY ({", ".join(key)})')
+    for name, columns, unique, where in indexes:
+        op.create_index(name, table, columns, unique=unique, postgresql_where=sa.text(where) if where else None)
+    for name, column, ondelete in fks:
+        op.create_foreign_key(name, table, 'business_manager_configs', [column], ['id'], ondelete=ondelete, onupdate='CASCADE')
+
+def upgrade():
+    today = date.today().replace(day=1)
+    for table, (column, indexes, fks) in TABLES.items():
+        old = f'{table}_unpartitioned'
+        _rebuild(table, old, f' PARTITION BY RANGE ({column})')
+        first = op.get_bind().execute(sa.text(f'SELECT min({column}) FROM {old}')).scalar() or today
+        month, horizon = first.replace(day=1), today
+        for _ in range(MONTHS_AHEAD):
+            horizon = _next_month(horizon)
+        # Every month holding data through MONTHS_AHEAD gets a partition; maintain_partitions keeps the window moving.
+        while month <= horizon:
+            op.execute(f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} FOR VALUES FROM ('{month}') TO ('{_next_month(month)}')")
+            month = _next_month(month)
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        _finish(table, old, ['id', column], indexes, fks)
+
+def downgrade():
+    for table, (column, indexes, fks) in TABLES.items():
+        old = f'{table}_partitioned'
+        _rebuild(table, old, '')
+        _finish(table, old, ['id'], indexes, fks)
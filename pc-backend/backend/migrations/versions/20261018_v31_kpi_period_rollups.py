@@ -0,0 +1,48 @@
+"""v31 kpi period rollups
+
+Revision ID: 20261018_v31_kpi_period_rollups
+Revises: 20261018_v30_monthly_partitions
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '20261018_v31_kpi_period_rollups'
+down_revision = '20261018_v30_monthly_partitions'
+branch_labels = None
+depends_on = None
+
+GRAINS = {'kpi_weekly_rollup': 'week', 'kpi_monthly_rollup': 'month'}
+
+def upgrade():
+    for table, grain in GRAINS.items():
+        op.create_table(table,
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('bm_id', sa.Integer(), nullable=True),
+            sa.Column('product_category_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.Column('currency_code', sa.String(length=3), nullable=False),
+            sa.Column('period_start', sa.Date(), nullable=False),
+            sa.Column('revenue', sa.DECIMAL(precision=14, scale=2), nullable=False),
+            sa.Column('ad_spend', sa.DECIMAL(precision=14, scale=2), nullable=False),
+            sa.Column('days', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+            sa.ForeignKeyConstraint(['bm_id'], ['business_manager_configs.id'], ondelete='CASCADE', onupdate='CASCADE'),
+            sa.ForeignKeyConstraint(['product_category_id'], ['product_categories.id'], ondelete='CASCADE', onupdate='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        # The drain replaces rows by (bm_id, period_start); reads filter on period_start.
+        op.create_index(f'ix_{table}_bm_period', table, ['bm_id', 'period_start'], unique=False)
+        op.create_index(f'ix_{table}_period', table, ['period_start'], unique=False)
+        op.execute(
+            f"INSERT INTO {table} (bm_id, product_category_id, currency_code, period_start, revenue, ad_spend, days) "
+            f"SELECT bm_id, product_category_id, currency_code, date_trunc('{grain}', date)::date, sum(revenue), sum(ad_spend), count(*) "
+            f"FROM kpi_daily_snapshot GROUP BY 1, 2, 3, 4"
+        )
+
+def downgrade():
+    for table in GRAINS:
+        op.drop_index(f'ix_{table}_period', table_name=table)
+        op.drop_index(f'ix_{table}_bm_period', table_name=table)
+        op.drop_table(table)
@@ -0,0 +1,30 @@
+"""v33 unique kpi rollup keys
+
+Revision ID: 20261018_v33_kpi_rollup_unique
+Revises: 20261018_v31_kpi_period_rollups
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+
+revision = '20261018_v33_kpi_rollup_unique'
+down_revision = '20261018_v31_kpi_period_rollups'
+branch_labels = None
+depends_on = None
+
+TABLES = ('kpi_weekly_rollup', 'kpi_monthly_rollup')
+KEY = ['bm_id', 'period_start', 'product_category_id', 'currency_code']
+
+def upgrade():
+    for table in TABLES:
+        # Concurrent rebuilds could each insert a full copy of a period; keep the first copy of every key.
+        op.execute(
+            f"DELETE FROM {table} a USING {table} b WHERE a.id > b.id AND "
+            + " AND ".join(f"a.{c} IS NOT DISTINCT FROM b.{c}" for c in KEY)
+        )
+        # product_category_id is nullable, and two NULL-category rows of one period are still duplicates.
+        op.create_index(f'ux_{table}_key', table, KEY, unique=True, postgresql_nulls_not_distinct=True)
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(f'ux_{table}_key', table_name=table)
@@ -1,10 +1,4 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
-
-from backend.config import Config
-
-engine = create_async_engine(Config.DATABASE_URL, echo=False)
-async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
 
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, Date, DECIMAL, Float, String, ForeignKey, func
+from sqlalchemy import Column, Integer, Date, DateTime, DECIMAL, Float, String, ForeignKey, func
 from sqlalchemy.dialects.postgresql import UUID
 from . import Base
 from .core import AsyncAttrs
@@ -29,12 +29,40 @@ class KPIDailySnapshot(Base, AsyncAttrs):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+class KPIWeeklyRollup(Base, AsyncAttrs):
+    """kpi_daily_snapshot summed per ISO week (period_start is the Monday); rebuilt by the rollup drain."""
+    __tablename__ = "kpi_weekly_rollup"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    bm_id = Column(Integer, ForeignKey("business_manager_configs.id", ondelete="CASCADE", onupdate="CASCADE"))
+    product_category_id = Column(UUID(as_uuid=True), ForeignKey("product_categories.id", ondelete="CASCADE", onupdate="CASCADE"))
+    currency_code = Column(String(3), nullable=False)
+    period_start = Column(Date, nullable=False)
+    revenue = Column(DECIMAL(precision=14, scale=2), nullable=False)
+    ad_spend = Column(DECIMAL(precision=14, scale=2), nullable=False)
+    days = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class KPIMonthlyRollup(Base, AsyncAttrs):
+    """kpi_daily_snapshot summed per calendar month; rebuilt by the rollup drain."""
+    __tablename__ = "kpi_monthly_rollup"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    bm_id = Column(Integer, ForeignKey("business_manager_configs.id", ondelete="CASCADE", onupdate="CASCADE"))
+    product_category_id = Column(UUID(as_uuid=True), ForeignKey("product_categories.id", ondelete="CASCADE", onupdate="CASCADE"))
+    currency_code = Column(String(3), nullable=False)
+    period_start = Column(Date, nullable=False)
+    revenue = Column(DECIMAL(precision=14, scale=2), nullable=False)
+    ad_spend = Column(DECIMAL(precision=14, scale=2), nullable=False)
+    days = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class FXDailyRate(Base, AsyncAttrs):
     __tablename__ = "fx_daily_rates"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    date = Column(Date, nullable=False)
+    date = Column(Date, primary_key=True, nullable=False)
     from_currency = Column(String(3), nullable=False)
     to_currency = Column(String(3), nullable=False)
     rate = Column(DECIMAL(precision=10, scale=6), nullable=False)
     source = Column(String(50), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = ({"postgresql_partition_by": "RANGE (date)"},)
\ No newline at end of file
@@ -1,7 +1,7 @@
 import json
 from datetime import datetime
-from sqlalchemy import Column, Boolean, DateTime, String, ForeignKey, func
-from sqlalchemy.dialects.postgresql import UUID, ARRAY, LargeBinary
+from sqlalchemy import Column, Boolean, DateTime, Integer, LargeBinary, String, ForeignKey, func
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from . import Base
 from .core import AsyncAttrs
 
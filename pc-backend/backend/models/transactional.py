@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Date, DECIMAL, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Date, DateTime, DECIMAL, ForeignKey, func
 from sqlalchemy.dialects.postgresql import UUID
 from . import Base
 from .core import AsyncAttrs
@@ -8,7 +8,8 @@ class MetaDailyPerformance(Base, AsyncAttrs):
     __tablename__ = "meta_daily_performance"
     id = Column(Integer, primary_key=True, autoincrement=True)
     campaign_id = Column(String(50), nullable=False)
-    date = Column(Date, nullable=False)
+    bm_id = Column(Integer, ForeignKey("business_manager_configs.id", ondelete="SET NULL", onupdate="CASCADE"))
+    date = Column(Date, primary_key=True, nullable=False)  # Partition key; PostgreSQL requires it in the primary key
     spend_raw = Column(DECIMAL(precision=10, scale=2), nullable=False)
     clicks = Column(Integer, nullable=False)
     impressions = Column(Integer, nullable=False)
@@ -16,9 +17,16 @@ class MetaDailyPerformance(Base, AsyncAttrs):
     purchase_conversion_value_meta_raw = Column(DECIMAL(precision=10, scale=2), nullable=False)
     currency_code = Column(String(3), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     __table_args__ = ({"postgresql_partition_by": "RANGE (date)"},)
 
+class CampaignBusinessManager(Base, AsyncAttrs):
+    __tablename__ = "meta_campaign_bm_map"
+    campaign_id = Column(String(50), primary_key=True)
+    bm_id = Column(Integer, ForeignKey("business_manager_configs.id", ondelete="CASCADE", onupdate="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class ShopifyDailySalesSummary(Base, AsyncAttrs):
     __tablename__ = "shopify_daily_sales_summary"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -33,20 +41,24 @@ class ShopifyChildDailySalesSummary(Base, AsyncAttrs):
     __tablename__ = "shopify_child_daily_sales_summary"
     id = Column(Integer, primary_key=True, autoincrement=True)
     bm_id = Column(Integer, ForeignKey("business_manager_configs.id", ondelete="CASCADE", onupdate="CASCADE"), nullable=False)
-    summary_date = Column(Date, nullable=False)
+    summary_date = Column(Date, primary_key=True, nullable=False)
     orders_count = Column(Integer, nullable=False)
     gross_sales_raw = Column(DECIMAL(precision=10, scale=2), nullable=False)
     currency_code = Column(String(3), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = ({"postgresql_partition_by": "RANGE (summary_date)"},)
+
 class MetaCampaignData(Base, AsyncAttrs):
     __tablename__ = "meta_campaign_data"
     id = Column(Integer, primary_key=True, autoincrement=True)
     campaign_id = Column(String(50), nullable=False)
-    date = Column(Date, nullable=False)
+    date = Column(Date, primary_key=True, nullable=False)
     name = Column(String(255), nullable=False)
     status = Column(String(50), nullable=False)
     ad_budget = Column(DECIMAL(precision=10, scale=2), nullable=False)
     reach = Column(Integer, nullable=False)
     landing_page_views = Column(Integer, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = ({"postgresql_partition_by": "RANGE (date)"},)
\ No newline at end of file
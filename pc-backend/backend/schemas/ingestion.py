@@ -4,4 +4,7 @@ class IngestionPayload(Schema):
     bm_id = fields.Int(required=True)
     date = fields.Date(required=True)
     data_type = fields.Str(required=True, validate=validate.OneOf(["meta", "shopify_child"]))
-    payload = fields.Raw(required=True)
\ No newline at end of file
+    payload = fields.Raw(required=True)
+
+class IngestionBatchPayload(Schema):
+    items = fields.List(fields.Nested(IngestionPayload), required=True, validate=validate.Length(min=1))
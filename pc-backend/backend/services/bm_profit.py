@@ -1,20 +1,41 @@
-from sqlalchemy import select, func, nullif
-from backend.models.aggregated import KPIDailySnapshot
+from sqlalchemy import Integer, Numeric, bindparam, column, select, func, desc
+from sqlalchemy.dialects.postgresql import ARRAY
+from backend.config import Config
 from backend.models.core import BMProfitAssumption, BusinessManagerConfig
+from backend.services.kpi import KPI_WATERMARK, kpi_source
+from backend.utils.cache_tags import range_tags
+from backend.utils.caching import cached_rows
+from backend.utils.cube import fresh_cube
 from sqlalchemy.ext.asyncio import AsyncSession
 
-async def get_profit_summary(session: AsyncSession, start_date, end_date, bm_ids=None):
+PROFIT_WATERMARK = KPI_WATERMARK + (
+    BMProfitAssumption.created_at,
+    BMProfitAssumption.updated_at,
+    BusinessManagerConfig.updated_at,
+)
+
+def profit_summary_stmt(start_date, end_date, bm_ids=None, mode="native"):
+    kpi = kpi_source(start_date, end_date, bm_ids=bm_ids, mode=mode)
     kpi_sq = (
         select(
-            KPIDailySnapshot.bm_id,
-            func.sum(KPIDailySnapshot.revenue).label("revenue"),
-            func.sum(KPIDailySnapshot.ad_spend).label("ad_spend"),
+            kpi.c.bm_id,
+            func.sum(kpi.c.revenue).label("revenue"),
+            func.sum(kpi.c.ad_spend).label("ad_spend"),
         )
-        .filter(KPIDailySnapshot.date.between(start_date, end_date))
-        .group_by(KPIDailySnapshot.bm_id)
+        .group_by(kpi.c.bm_id)
         .subquery()
     )
+    return profit_stmt(kpi_sq, bm_ids)
+
+def cube_totals(bm_ids, revenue, ad_spend):
+    # Per-BM sums from the KPI cube, bound as arrays so the assumptions join and arithmetic stay in SQL.
+    return func.unnest(
+        bindparam("cube_bm_ids", bm_ids, type_=ARRAY(Integer)),
+        bindparam("cube_revenue", revenue, type_=ARRAY(Numeric(14, 2))),
+        bindparam("cube_ad_spend", ad_spend, type_=ARRAY(Numeric(14, 2))),
+    ).table_valued(column("bm_id", Integer), column("revenue", Numeric(14, 2)), column("ad_spend", Numeric(14, 2))).render_derived(name="kpi")
 
+def profit_stmt(kpi_sq, bm_ids=None):
     stmt = (
         select(
             BusinessManagerConfig.id.label("bm_id"),
@@ -31,13 +52,26 @@ async def get_profit_summary(session: AsyncSession, start_date, end_date, bm_ids
             ).label("net_profit"),
             (
                 (kpi_sq.c.revenue * BMProfitAssumption.profit_margin_pct / 100)
-                / nullif(kpi_sq.c.ad_spend, 0)
+                / func.nullif(kpi_sq.c.ad_spend, 0)
             ).label("adjusted_roas"),
         )
         .join(kpi_sq, kpi_sq.c.bm_id == BusinessManagerConfig.id)
         .join(BMProfitAssumption, BMProfitAssumption.bm_id == BusinessManagerConfig.id)
         .filter(BusinessManagerConfig.deleted_at.is_(None), BusinessManagerConfig.is_active == True)
         .filter(BusinessManagerConfig.id.in_(bm_ids) if bm_ids else True)
-        .order_by(func.desc("adjusted_roas"))
+        .order_by(desc("adjusted_roas"))
     )
+    return stmt
+
+# BM names, active flags and profit assumptions are edited outside this service and bump no tag, so the
+# entry only lives CACHE_DIMENSION_TIMEOUT; the date and fx tags still retire it at once on KPI and FX writes.
+@cached_rows(
+    timeout=Config.CACHE_DIMENSION_TIMEOUT,
+    tags=lambda start_date, end_date, bm_ids=None, mode="native": range_tags(start_date, end_date, mode),
+)
+async def get_profit_summary(session: AsyncSession, start_date, end_date, bm_ids=None, mode="native"):
+    if (cube := fresh_cube(start_date, end_date, mode)) is not None:
+        stmt = profit_stmt(cube_totals(*cube.bm_totals(start_date, end_date, bm_ids)), bm_ids)
+    else:
+        stmt = profit_summary_stmt(start_date, end_date, bm_ids, mode)
     return (await session.execute(stmt)).all()
\ No newline at end of file
@@ -1,8 +1,11 @@
-from sqlalchemy import select, func
+from sqlalchemy import Numeric, select, func, type_coerce
 from backend.models.transactional import MetaDailyPerformance, MetaCampaignData
-from backend.models.core import BusinessManagerConfig
+from backend.utils.cache_tags import range_tags
+from backend.utils.caching import cached_rows
 from sqlalchemy.ext.asyncio import AsyncSession
 
+CAMPAIGN_COMMAND_WATERMARK = (MetaDailyPerformance.created_at, MetaDailyPerformance.updated_at, MetaCampaignData.created_at)
+
 async def get_campaign_command_data(session: AsyncSession, start_date, end_date, filters):
     stmt = select(
         MetaCampaignData.campaign_id,
@@ -10,18 +13,19 @@ async def get_campaign_command_data(session: AsyncSession, start_date, end_date,
         MetaCampaignData.status,
         func.sum(MetaDailyPerformance.spend_raw).label("spend_raw"),
         func.sum(MetaDailyPerformance.purchase_conversion_value_meta_raw).label("purchase_conversion_value_meta_raw"),
-        func.avg(MetaDailyPerformance.clicks).label("avg_clicks"),
+        type_coerce(func.avg(MetaDailyPerformance.clicks), Numeric).label("avg_clicks"),
     ).join(MetaDailyPerformance, MetaDailyPerformance.campaign_id == MetaCampaignData.campaign_id
     ).filter(MetaDailyPerformance.date.between(start_date, end_date)
     ).group_by(MetaCampaignData.campaign_id, MetaCampaignData.name, MetaCampaignData.status)
 
     if filters.get("status"):
-        stmt = stmt.filter(MetaCampaignData.status == filters["status"])
+        stmt = stmt.filter(MetaCampaignData.status.in_(filters["status"]))
     if filters.get("bm_ids"):
-        stmt = stmt.join(BusinessManagerConfig).filter(BusinessManagerConfig.id.in_(filters["bm_ids"]))
+        stmt = stmt.filter(MetaDailyPerformance.bm_id.in_(filters["bm_ids"]))
 
     return stmt
 
+@cached_rows(tags=lambda start_date, end_date, filters: range_tags(start_date, end_date), one=True)
 async def get_campaign_command_totals(session: AsyncSession, start_date, end_date, filters):
     stmt = select(
         func.sum(MetaDailyPerformance.spend_raw).label("total_spend"),
@@ -29,6 +33,6 @@ async def get_campaign_command_totals(session: AsyncSession, start_date, end_dat
     ).filter(MetaDailyPerformance.date.between(start_date, end_date))
 
     if filters.get("bm_ids"):
-        stmt = stmt.join(BusinessManagerConfig).filter(BusinessManagerConfig.id.in_(filters["bm_ids"]))
+        stmt = stmt.filter(MetaDailyPerformance.bm_id.in_(filters["bm_ids"]))
 
     return (await session.execute(stmt)).first()
\ No newline at end of file
@@ -1,22 +1,31 @@
 from sqlalchemy import select, func
-from backend.models.aggregated import KPIDailySnapshot
+from backend.config import Config
 from backend.models.core import ProductCategory
-from backend.utils.fx_conversion import bulk_convert
+from backend.services.kpi import KPI_WATERMARK, kpi_source
+from backend.utils.cache_tags import range_tags
+from backend.utils.caching import cached_rows
+from backend.utils.cube import fresh_cube
 from sqlalchemy.ext.asyncio import AsyncSession
 
-async def get_category_summary(session: AsyncSession, start_date, end_date, product_category_ids=None, mode="native"):
-    stmt = select(
-        ProductCategory.name,
-        func.sum(KPIDailySnapshot.revenue).label("total_revenue"),
-        func.sum(KPIDailySnapshot.ad_spend).label("total_ad_spend"),
-    ).join(ProductCategory).filter(
-        KPIDailySnapshot.date.between(start_date, end_date)
-    ).group_by(ProductCategory.name)
-
-    if product_category_ids:
-        stmt = stmt.filter(ProductCategory.id.in_(product_category_ids))
+CATEGORY_WATERMARK = KPI_WATERMARK + (ProductCategory.created_at, ProductCategory.updated_at)
 
-    rows = (await session.execute(stmt)).all()
-    if mode == "usd":
-        await bulk_convert(session, [r._asdict() for r in rows], ("total_revenue", "total_ad_spend"), "date", "currency_code")
-    return rows
\ No newline at end of file
+# Category names bump no tag, so the entry only lives CACHE_DIMENSION_TIMEOUT.
+@cached_rows(
+    timeout=Config.CACHE_DIMENSION_TIMEOUT,
+    tags=lambda start_date, end_date, product_category_ids=None, mode="native": range_tags(start_date, end_date, mode),
+)
+async def get_category_summary(session: AsyncSession, start_date, end_date, product_category_ids=None, mode="native"):
+    if (cube := fresh_cube(start_date, end_date, mode)) is not None:
+        return cube.category_rows(start_date, end_date, product_category_ids)
+    kpi = kpi_source(start_date, end_date, product_category_ids=product_category_ids, mode=mode)
+    stmt = (
+        select(
+            ProductCategory.name,
+            func.sum(kpi.c.revenue).label("total_revenue"),
+            func.sum(kpi.c.ad_spend).label("total_ad_spend"),
+        )
+        .select_from(kpi)
+        .join(ProductCategory, ProductCategory.id == kpi.c.product_category_id)
+        .group_by(ProductCategory.name)
+    )
+    return (await session.execute(stmt)).all()
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from datetime import date
+from sqlalchemy import select
+from backend.config import Config
+from backend.models.aggregated import KPIDailySnapshot
+from backend.services.bm_profit import get_profit_summary
+from backend.services.category_summary import get_category_summary
+from backend.services.kpi import KPI_GRAINS, get_kpi_snapshot
+from backend.services.portfolio import get_bm_health_rows
+from backend.utils.db import get_concurrent_session
+from backend.utils.fx import FXRateMatrix, shared_matrix
+from backend.utils.health import compute_freshness_score, compute_health_status
+from backend.utils.serialization import rows_payload
+
+logger = logging.getLogger(__name__)
+
+LIST_FILTERS = ("master_store_ids", "bm_ids", "region_ids", "product_category_ids")
+MODES = ("native", "usd")
+
+class BatchError(ValueError):
+    """The batch request itself is malformed; nothing was run."""
+
+async def _system_health(session):
+    return {"status": await compute_health_status(session), "freshness_score": await compute_freshness_score(session)}
+
+# query -> (service, the filters it takes, in argument order). Called with the same arguments as the GET
+# routes pass, so a widget and its route share cached_rows entries.
+QUERIES = {
+    "kpi": (get_kpi_snapshot, ("start_date", "end_date", "master_store_ids", "bm_ids", "mode", "grain")),
+    "category_summary": (get_category_summary, ("start_date", "end_date", "product_category_ids", "mode")),
+    "profit": (get_profit_summary, ("start_date", "end_date", "bm_ids", "mode")),
+    "portfolio": (get_bm_health_rows, ("region_ids", "master_store_ids")),
+    "system_health": (_system_health, ()),
+}
+
+def _filters(params, base=None):
+    """Parse and validate one set of filters; base supplies whatever params leaves out."""
+    filters = dict(base or {})
+    for key in ("start_date", "end_date"):
+        if params.get(key) is not None:
+            try:
+                filters[key] = date.fromisoformat(params[key])
+            except (TypeError, ValueError):
+                raise BatchError(f"{key} must be an ISO date")
+    for key in LIST_FILTERS:
+        if key in params:
+            value = params[key]
+            filters[key] = [str(v) for v in (value if isinstance(value, list) else [value])]
+    for key, allowed in (("mode", MODES), ("grain", KPI_GRAINS)):
+        if key in params:
+            if params[key] not in allowed:
+                raise BatchError(f"{key} must be one of: {', '.join(allowed)}")
+            filters[key] = params[key]
+    return filters
+
+def parse_batch(body):
+    """(shared filters, [(name, query, filters)]) from a batch request body; raises BatchError."""
+    if not isinstance(body, dict) or not isinstance(body.get("widgets"), list) or not body["widgets"]:
+        raise BatchError("widgets must be a non-empty list")
+    if len(body["widgets"]) > Config.DASHBOARD_BATCH_MAX_WIDGETS:
+        raise BatchError(f"at most {Config.DASHBOARD_BATCH_MAX_WIDGETS} widgets per batch")
+    shared = _filters(body, {"mode": "native", "grain": "day", **{k: [] for k in LIST_FILTERS}})
+    widgets = []
+    for widget in body["widgets"]:
+        if not isinstance(widget, dict):
+            raise BatchError("each widget must be an object")
+        query = widget.get("query")
+        if query not in QUERIES:
+            raise BatchError(f"query must be one of: {', '.join(QUERIES)}")
+        name = widget.get("name") or query
+        if any(name == n for n, _, _ in widgets):
+            raise BatchError(f"duplicate widget name: {name}")
+        filters = _filters(widget.get("params") or {}, shared)
+        wanted = QUERIES[query][1]
+        if "start_date" in wanted and ("start_date" not in filters or "end_date" not in filters):
+            raise BatchError(f"{name}: start_date and end_date are required")
+        widgets.append((name, query, {k: filters[k] for k in wanted}))
+    return shared, widgets
+
+async def _load_matrix(shared, widgets):
+    # USD widgets over the page's date range share one rate lookup instead of resolving rates per statement.
+    if not all(k in shared for k in ("start_date", "end_date")):
+        return None
+    if not any(f.get("mode") == "usd" for _, _, f in widgets):
+        return None
+    start, end = shared["start_date"], shared["end_date"]
+    async with get_concurrent_session() as session:
+        currencies = (await session.execute(
+            select(KPIDailySnapshot.currency_code).filter(KPIDailySnapshot.date.between(start, end)).distinct()
+        )).scalars().all()
+        return await FXRateMatrix.load(session, start, end, currencies)
+
+async def _run(name, query, filters, shape):
+    started = time.perf_counter()
+    service = QUERIES[query][0]
+    try:
+        async with get_concurrent_session() as session:
+            result = await service(session, *filters.values())
+        data = result if isinstance(result, dict) else rows_payload(result, shape)
+        outcome = {"data": data}
+    except Exception as e:
+        # One failing widget should not blank the whole page.
+        logger.exception("dashboard batch widget %s (%s) failed", name, query)
+        outcome = {"error": type(e).__name__}
+    outcome["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return name, outcome
+
+async def run_batch(shared, widgets, shape=None):
+    """Run every widget concurrently, each on its own session; returns {name: {"data"|"error", "ms"}}."""
+    token = shared_matrix.set(await _load_matrix(shared, widgets))
+    try:
+        results = await asyncio.gather(*(_run(name, query, filters, shape) for name, query, filters in widgets))
+    finally:
+        shared_matrix.reset(token)
+    return dict(results)
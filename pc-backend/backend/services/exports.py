@@ -0,0 +1,140 @@
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.config import Config
+from backend.models.transactional import MetaCampaignData
+from backend.services.bm_profit import PROFIT_WATERMARK, get_profit_summary, profit_summary_stmt
+from backend.services.campaign_command import CAMPAIGN_COMMAND_WATERMARK, get_campaign_command_data, get_campaign_command_totals
+from backend.services.kpi import KPI_WATERMARK, kpi_snapshot_stmt
+from backend.services.meta_campaign import META_CAMPAIGN_WATERMARK, meta_campaign_stmt
+from backend.services.portfolio import PORTFOLIO_WATERMARK, bm_health_stmt, get_bm_health_rows
+from backend.utils.columnar import MIMETYPES, write_columnar
+from backend.utils.excel import XLSX_MIMETYPE, write_xlsx
+from backend.utils.watermark import data_watermark
+
+LIST_PARAMS = {"master_store_ids", "bm_ids", "status", "campaign_ids", "region_ids"}
+FORMATS = {"xlsx": XLSX_MIMETYPE, **MIMETYPES}
+
+async def stream_rows(session: AsyncSession, stmt):
+    # Server-side cursor: rows arrive in yield_per batches instead of one fully buffered result.
+    result = await session.stream(stmt.execution_options(yield_per=Config.EXPORT_YIELD_PER))
+    async for row in result:
+        yield row
+
+async def stream_batches(session: AsyncSession, stmt):
+    result = await session.stream(stmt.execution_options(yield_per=Config.EXPORT_YIELD_PER))
+    async for rows in result.partitions():
+        yield rows
+
+def _dates(params):
+    return date.fromisoformat(params["start_date"]), date.fromisoformat(params["end_date"])
+
+async def kpi_snapshot_query(session: AsyncSession, params):
+    start_date, end_date = _dates(params)
+    return kpi_snapshot_stmt(start_date, end_date, params["master_store_ids"], params["bm_ids"], params["mode"] or "native")
+
+async def campaign_command_query(session: AsyncSession, params):
+    start_date, end_date = _dates(params)
+    return await get_campaign_command_data(session, start_date, end_date, {k: params[k] for k in ('master_store_ids', 'bm_ids', 'status')})
+
+async def meta_campaign_data_query(session: AsyncSession, params):
+    start_date, end_date = _dates(params)
+    stmt = meta_campaign_stmt(start_date, end_date, {k: params[k] for k in ('bm_ids', 'campaign_ids')})
+    return stmt.with_only_columns(
+        MetaCampaignData.campaign_id, MetaCampaignData.date, MetaCampaignData.name, MetaCampaignData.status,
+        MetaCampaignData.ad_budget, MetaCampaignData.reach, MetaCampaignData.landing_page_views,
+    )
+
+async def bm_profitability_query(session: AsyncSession, params):
+    start_date, end_date = _dates(params)
+    return profit_summary_stmt(start_date, end_date, params["bm_ids"], params["mode"] or "native")
+
+async def portfolio_snapshot_query(session: AsyncSession, params):
+    return bm_health_stmt(params["region_ids"], params["master_store_ids"])
+
+async def kpi_snapshot_rows(session: AsyncSession, params):
+    yield ['Date', 'Revenue', 'Ad Spend', 'ROAS', 'CPA', 'Currency']
+    async for row in stream_rows(session, await kpi_snapshot_query(session, params)):
+        yield [row.date, row.revenue, row.ad_spend, row.roas, row.cpa, row.currency_code]
+
+async def campaign_command_rows(session: AsyncSession, params):
+    start_date, end_date = _dates(params)
+    filters = {k: params[k] for k in ('master_store_ids', 'bm_ids', 'status')}
+    for k in ("start_date", "end_date", "master_store_ids", "bm_ids", "status", "mode"):
+        yield [k, str(params.get(k))]
+    yield []
+    stmt = await campaign_command_query(session, params)
+    yield list(stmt.selected_columns.keys())
+    async for row in stream_rows(session, stmt):
+        yield list(row)
+    totals = await get_campaign_command_totals(session, start_date, end_date, filters)
+    yield []
+    yield ["TOTALS"]
+    for k, v in totals._asdict().items():
+        yield [k, v]
+
+async def meta_campaign_data_rows(session: AsyncSession, params):
+    yield ['Campaign ID', 'Date', 'Name', 'Status', 'Ad Budget', 'Reach', 'Landing Page Views']
+    async for row in stream_rows(session, await meta_campaign_data_query(session, params)):
+        yield list(row)
+
+# One row per BM: small enough to go through the service cache shared with the JSON endpoints.
+async def bm_profitability_rows(session: AsyncSession, params):
+    start_date, end_date = _dates(params)
+    yield ['BM ID', 'BM Name', 'Revenue', 'Ad Spend', 'Profit Margin %', 'Fixed Costs', 'Variable Costs %', 'Net Profit', 'Adjusted ROAS']
+    for row in await get_profit_summary(session, start_date, end_date, params["bm_ids"], params["mode"] or "native"):
+        yield [row.bm_id, row.bm_name, row.revenue, row.ad_spend, row.profit_margin_pct, row.fixed_costs, row.variable_costs_pct, row.net_profit, row.adjusted_roas]
+
+async def portfolio_snapshot_rows(session: AsyncSession, params):
+    yield ['BM ID', 'BM Name', 'Master Store ID', 'Last Meta Fetch', 'Last Shopify Fetch', 'Token Status', 'Active', 'Age Meta (hours)', 'Age Shopify (hours)']
+    for row in await get_bm_health_rows(session, params["region_ids"], params["master_store_ids"]):
+        yield [row.bm_id, row.bm_name, str(row.master_store_id), row.last_successful_fetch_meta_at, row.last_successful_fetch_shopify_at, row.meta_token_status, row.is_active, row.age_meta_hours, row.age_shopify_hours]
+
+EXPORTS = {
+    "kpi_snapshot": {
+        "params": ("start_date", "end_date", "master_store_ids", "bm_ids", "mode"),
+        "rows": kpi_snapshot_rows,
+        "query": kpi_snapshot_query,
+        "watermark": KPI_WATERMARK,
+    },
+    "campaign_command": {
+        "params": ("start_date", "end_date", "master_store_ids", "bm_ids", "status", "mode"),
+        "rows": campaign_command_rows,
+        "query": campaign_command_query,
+        "watermark": CAMPAIGN_COMMAND_WATERMARK,
+    },
+    "meta_campaign_data": {
+        "params": ("start_date", "end_date", "bm_ids", "campaign_ids"),
+        "rows": meta_campaign_data_rows,
+        "query": meta_campaign_data_query,
+        "watermark": META_CAMPAIGN_WATERMARK,
+    },
+    "bm_profitability": {
+        "params": ("start_date", "end_date", "bm_ids", "mode"),
+        "rows": bm_profitability_rows,
+        "query": bm_profitability_query,
+        "watermark": PROFIT_WATERMARK,
+    },
+    "portfolio_snapshot": {
+        "params": ("region_ids", "master_store_ids"),
+        "rows": portfolio_snapshot_rows,
+        "query": portfolio_snapshot_query,
+        "watermark": PORTFOLIO_WATERMARK,
+    },
+}
+
+def export_params(name, args):
+    return {k: args.getlist(k) if k in LIST_PARAMS else args.get(k) for k in EXPORTS[name]["params"]}
+
+async def export_watermark(session: AsyncSession, name):
+    return await data_watermark(session, EXPORTS[name]["watermark"])
+
+def export_rows(session: AsyncSession, name, params):
+    return EXPORTS[name]["rows"](session, params)
+
+async def write_export(session: AsyncSession, name, params, fmt, fileobj):
+    # XLSX keeps the finance layout; columnar formats carry only the typed query columns.
+    if fmt == "xlsx":
+        await write_xlsx(export_rows(session, name, params), fileobj)
+        return
+    stmt = await EXPORTS[name]["query"](session, params)
+    await write_columnar(stream_batches(session, stmt), stmt.selected_columns, fmt, fileobj)
@@ -1,15 +1,119 @@
-from sqlalchemy import select
+from sqlalchemy import Date, Float, case, cast, func, select, literal, union_all
 from backend.models.aggregated import KPIDailySnapshot
-from backend.utils.fx_conversion import bulk_convert
+from backend.models.core import BusinessManagerConfig
+from backend.utils.cache_tags import fx_tags, range_tags
+from backend.utils.caching import cached_rows
+from backend.utils.cube import fresh_cube
+from backend.utils.fx import resolved_rates, shared_matrix
+from backend.utils.rollup import GRAINS, ROLLUP_MODELS, auto_grain, split_range
+from backend.utils.watermark import Tag
 from sqlalchemy.ext.asyncio import AsyncSession
 
-async def get_kpi_snapshot(session: AsyncSession, start_date, end_date, master_store_ids=None, bm_ids=None, mode="native"):
-    stmt = select(KPIDailySnapshot).filter(
-        KPIDailySnapshot.date.between(start_date, end_date)
-    )
+# Timestamp columns whose max() moves whenever a KPI read could change (see utils.watermark). FX rates are
+# edited, deleted and purged in place, so they are tracked by the fx:* tag version that every FX write bumps.
+KPI_WATERMARK = (KPIDailySnapshot.created_at, KPIDailySnapshot.updated_at, *map(Tag, fx_tags()))
+KPI_GRAINS = GRAINS + ("auto",)
+
+def kpi_scope(model, master_store_ids=None, bm_ids=None, product_category_ids=None):
+    # Filters shared by kpi_daily_snapshot and its rollups, which carry the same bm_id and product_category_id.
+    criteria = []
     if bm_ids:
-        stmt = stmt.filter(KPIDailySnapshot.bm_id.in_(bm_ids))
-    rows = (await session.execute(stmt)).scalars().all()
+        criteria.append(model.bm_id.in_(bm_ids))
+    if master_store_ids:
+        criteria.append(model.bm_id.in_(
+            select(BusinessManagerConfig.id).filter(BusinessManagerConfig.master_store_id.in_(master_store_ids))
+        ))
+    if product_category_ids:
+        criteria.append(model.product_category_id.in_(product_category_ids))
+    return criteria
+
+def kpi_criteria(start_date, end_date, master_store_ids=None, bm_ids=None, product_category_ids=None):
+    return [KPIDailySnapshot.date.between(start_date, end_date)] + kpi_scope(KPIDailySnapshot, master_store_ids, bm_ids, product_category_ids)
+
+def kpi_rates(criteria, start_date=None, end_date=None):
+    matrix = shared_matrix.get()
+    if matrix is not None and start_date is not None and matrix.covers(start_date, end_date, ()):
+        return matrix.table()
+    return resolved_rates(select(KPIDailySnapshot.date, KPIDailySnapshot.currency_code).filter(*criteria).distinct())
+
+def kpi_source(start_date, end_date, master_store_ids=None, bm_ids=None, product_category_ids=None, mode="native", coarsest="month"):
+    """KPI rows for start..end as a subquery of (bm_id, product_category_id, currency_code, date, revenue, ad_spend).
+
+    Native amounts come from whole months, whole weeks and the leftover edge days (see split_range), each row
+    dated by the start of its period. USD amounts are always converted day by day, since rates are daily.
+    """
     if mode == "usd":
-        await bulk_convert(session, [r._asdict() for r in rows], ("revenue", "ad_spend"), "date", "currency_code")
-    return rows
\ No newline at end of file
+        criteria = kpi_criteria(start_date, end_date, master_store_ids, bm_ids, product_category_ids)
+        fx = kpi_rates(criteria, start_date, end_date)
+        return (
+            select(
+                KPIDailySnapshot.bm_id,
+                KPIDailySnapshot.product_category_id,
+                literal("USD").label("currency_code"),
+                KPIDailySnapshot.date,
+                (KPIDailySnapshot.revenue * fx.c.rate).label("revenue"),
+                (KPIDailySnapshot.ad_spend * fx.c.rate).label("ad_spend"),
+            )
+            .join(fx, (fx.c.date == KPIDailySnapshot.date) & (fx.c.currency_code == KPIDailySnapshot.currency_code))
+            .filter(*criteria)
+            .subquery("kpi")
+        )
+    parts = []
+    for grain, starts in split_range(start_date, end_date, coarsest).items():
+        model = ROLLUP_MODELS.get(grain, KPIDailySnapshot)
+        period = KPIDailySnapshot.date if model is KPIDailySnapshot else model.period_start
+        parts.append(
+            select(model.bm_id, model.product_category_id, model.currency_code, period.label("date"), model.revenue, model.ad_spend)
+            .filter(period.in_(starts), *kpi_scope(model, master_store_ids, bm_ids, product_category_ids))
+        )
+    return (parts[0] if len(parts) == 1 else union_all(*parts)).subquery("kpi")
+
+def kpi_snapshot_stmt(start_date, end_date, master_store_ids=None, bm_ids=None, mode="native"):
+    criteria = kpi_criteria(start_date, end_date, master_store_ids, bm_ids)
+    revenue, ad_spend, currency = KPIDailySnapshot.revenue, KPIDailySnapshot.ad_spend, KPIDailySnapshot.currency_code
+    stmt = select(KPIDailySnapshot.bm_id, KPIDailySnapshot.product_category_id, KPIDailySnapshot.date)
+    if mode == "usd":
+        fx = kpi_rates(criteria, start_date, end_date)
+        revenue, ad_spend, currency = revenue * fx.c.rate, ad_spend * fx.c.rate, literal("USD")
+        stmt = stmt.join(fx, (fx.c.date == KPIDailySnapshot.date) & (fx.c.currency_code == KPIDailySnapshot.currency_code))
+    stmt = stmt.add_columns(
+        revenue.label("revenue"),
+        ad_spend.label("ad_spend"),
+        KPIDailySnapshot.roas,
+        KPIDailySnapshot.cpa,
+        currency.label("currency_code"),
+    ).filter(*criteria).order_by(KPIDailySnapshot.date, KPIDailySnapshot.bm_id)
+    return stmt
+
+def kpi_period_stmt(start_date, end_date, master_store_ids=None, bm_ids=None, mode="native", grain="month"):
+    """Same columns as kpi_snapshot_stmt, one row per BM and week or month; date is the period start."""
+    kpi = kpi_source(start_date, end_date, master_store_ids, bm_ids, mode=mode, coarsest=grain)
+    period = cast(func.date_trunc(grain, kpi.c.date), Date)
+    revenue, ad_spend = func.sum(kpi.c.revenue), func.sum(kpi.c.ad_spend)
+    return (
+        select(
+            kpi.c.bm_id,
+            kpi.c.product_category_id,
+            period.label("date"),
+            revenue.label("revenue"),
+            ad_spend.label("ad_spend"),
+            # Ratios are recomputed from the period's totals, the same way the daily snapshot derives them.
+            cast(func.coalesce(revenue / func.nullif(ad_spend, 0), 0), Float).label("roas"),
+            cast(case((revenue > 0, ad_spend / (revenue / 100)), else_=0), Float).label("cpa"),
+            kpi.c.currency_code,
+        )
+        .group_by(kpi.c.bm_id, kpi.c.product_category_id, kpi.c.currency_code, period)
+        .order_by(period, kpi.c.bm_id)
+    )
+
+@cached_rows(tags=lambda start_date, end_date, master_store_ids=None, bm_ids=None, mode="native", grain="day": range_tags(start_date, end_date, mode))
+async def get_kpi_snapshot(session: AsyncSession, start_date, end_date, master_store_ids=None, bm_ids=None, mode="native", grain="day"):
+    if grain == "auto":
+        grain = auto_grain(start_date, end_date)
+    if (cube := fresh_cube(start_date, end_date, mode)) is not None:
+        return cube.kpi_rows(start_date, end_date, master_store_ids, bm_ids, grain)
+    if grain == "day":
+        stmt = kpi_snapshot_stmt(start_date, end_date, master_store_ids, bm_ids, mode)
+    else:
+        stmt = kpi_period_stmt(start_date, end_date, master_store_ids, bm_ids, mode, grain)
+    return (await session.execute(stmt)).all()
@@ -1,9 +1,20 @@
 from datetime import datetime
-from sqlalchemy import select, func
+from sqlalchemy import Numeric, select, func, type_coerce
 from backend.models.core import BusinessManagerConfig, MasterStoreConfig
+from backend.utils.cache_tags import bm_tags
+from backend.utils.caching import cached_rows
+from backend.config import Config
 from sqlalchemy.ext.asyncio import AsyncSession
 
-async def get_bm_health_rows(session: AsyncSession, region_ids=None, master_store_ids=None):
+PORTFOLIO_WATERMARK = (
+    BusinessManagerConfig.created_at,
+    BusinessManagerConfig.updated_at,
+    BusinessManagerConfig.last_successful_fetch_meta_at,
+    BusinessManagerConfig.last_successful_fetch_shopify_at,
+    MasterStoreConfig.updated_at,
+)
+
+def bm_health_stmt(region_ids=None, master_store_ids=None):
     now = datetime.utcnow()
     stmt = select(
         BusinessManagerConfig.id.label("bm_id"),
@@ -13,15 +24,17 @@ async def get_bm_health_rows(session: AsyncSession, region_ids=None, master_stor
         BusinessManagerConfig.last_successful_fetch_shopify_at,
         BusinessManagerConfig.meta_token_status,
         BusinessManagerConfig.is_active,
-        (
+        type_coerce(
             func.coalesce(
                 func.extract('epoch', now - BusinessManagerConfig.last_successful_fetch_meta_at), 86400
-            ) / 3600
+            ) / 3600,
+            Numeric,
         ).label("age_meta_hours"),
-        (
+        type_coerce(
             func.coalesce(
                 func.extract('epoch', now - BusinessManagerConfig.last_successful_fetch_shopify_at), 86400
-            ) / 3600
+            ) / 3600,
+            Numeric,
         ).label("age_shopify_hours"),
     )
 
@@ -29,5 +42,9 @@ async def get_bm_health_rows(session: AsyncSession, region_ids=None, master_stor
         stmt = stmt.filter(BusinessManagerConfig.master_store_id.in_(master_store_ids))
     if region_ids:
         stmt = stmt.join(MasterStoreConfig).filter(MasterStoreConfig.region_id.in_(region_ids))
+    return stmt
 
-    return (await session.execute(stmt)).all()
\ No newline at end of file
+# Ages are measured against now(), so this entry is short-lived whatever the tags say.
+@cached_rows(timeout=Config.CACHE_PORTFOLIO_TIMEOUT, tags=lambda region_ids=None, master_store_ids=None: bm_tags())
+async def get_bm_health_rows(session: AsyncSession, region_ids=None, master_store_ids=None):
+    return (await session.execute(bm_health_stmt(region_ids, master_store_ids))).all()
\ No newline at end of file
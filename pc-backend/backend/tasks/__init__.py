@@ -1,8 +1,14 @@
 from celery import Celery
+from kombu import Queue
 from backend.config import Config
 from celery.schedules import crontab
 
 app = Celery('backend', broker=Config.CELERY_BROKER_URL, backend=Config.CELERY_RESULT_BACKEND)
+# Modules whose tasks beat schedules by name; the web app only imports the ones it enqueues itself.
+app.conf.include = [
+    'backend.tasks.cleanup', 'backend.tasks.fx', 'backend.tasks.partitions', 'backend.tasks.replicas',
+    'backend.tasks.rollups', 'backend.tasks.security', 'backend.tasks.token_updater',
+]
 app.conf.task_default_queue = 'default'
 app.conf.task_acks_late = True
 app.conf.task_reject_on_worker_lost = True
@@ -15,8 +21,16 @@ app.conf.task_retry_backoff_max = 700
 app.conf.task_routes = {
     'backend.tasks.cleanup.cleanup_old_data': {'queue': 'maintenance'},
     'backend.tasks.token_updater.refresh_tokens': {'queue': 'maintenance'},
+    'backend.tasks.backfill.backfill_file': {'queue': 'maintenance'},
+    'backend.tasks.exports.render_export': {'queue': 'exports'},
+    'backend.tasks.exports.purge_export_artifacts': {'queue': 'maintenance'},
+    'backend.tasks.partitions.maintain_partitions': {'queue': 'maintenance'},
 }
 app.conf.beat_schedule = {
+    'maintain-partitions': {
+        'task': 'backend.tasks.partitions.maintain_partitions',
+        'schedule': crontab(hour=1, minute=30),
+    },
     'cleanup-old-data': {
         'task': 'backend.tasks.cleanup.cleanup_old_data',
         'schedule': crontab(hour=2, minute=0),
@@ -33,15 +47,32 @@ app.conf.beat_schedule = {
         'task': 'backend.tasks.fx.fetch_fx_rates',
         'schedule': crontab(minute=0, hour=5),
     },
+    'drain-rollups': {
+        'task': 'backend.tasks.rollups.drain_rollups',
+        'schedule': Config.ROLLUP_DRAIN_INTERVAL_SECONDS,
+    },
+    'purge-export-artifacts': {
+        'task': 'backend.tasks.exports.purge_export_artifacts',
+        'schedule': crontab(minute=30),
+    },
     'purge-expired-keys': {
         'task': 'backend.tasks.security.purge_expired_keys',
         'schedule': crontab(minute=0, hour='*/1'),
     },
+    'probe-replica-lag': {
+        'task': 'backend.tasks.replicas.probe_replica_lag',
+        'schedule': Config.REPLICA_PROBE_INTERVAL_SECONDS,
+    },
+    'flush-api-key-usage': {
+        'task': 'backend.tasks.security.flush_api_key_usage',
+        'schedule': Config.API_KEY_USAGE_FLUSH_SECONDS,
+    },
 }
 
 app.conf.task_queues = (
     Queue('default'),
     Queue('maintenance'),
+    Queue('exports'),
     Queue('dead_letter', exchange='dead_letter', routing_key='dead_letter'),
 )
 app.conf.task_default_exchange = 'tasks'
@@ -0,0 +1,76 @@
+import asyncio
+import csv
+import json
+import click
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from backend.tasks import app
+from backend.models.transactional import CampaignBusinessManager, MetaDailyPerformance
+from backend.utils.copy_loader import TARGETS, load_file
+from backend.utils.db import get_worker_session
+from backend.utils.rollup import mark_dirty_range
+
+def schedule_rollups(report):
+    # Rollups are queued per affected (scope, date range), never per loaded row.
+    for r in report["ranges"]:
+        if report["target"] == "shopify_daily_sales_summary":
+            mark_dirty_range("store", r["scope"], r["start"], r["end"])
+        else:
+            mark_dirty_range("bm", int(r["scope"]), r["start"], r["end"])
+
+def attribute_meta_history(mapping_path=None):
+    """Give Meta rows that predate bm_id a BM through meta_campaign_bm_map and re-mark the days that gained spend.
+
+    mapping_path is an optional CSV of campaign_id,bm_id pairs merged into the map first; nothing in the old
+    schema links a campaign to a BM, so history stays unattributed until someone supplies the pairs.
+    """
+    with get_worker_session() as session:
+        if mapping_path:
+            with open(mapping_path, newline="") as f:
+                pairs = [{"campaign_id": r["campaign_id"], "bm_id": int(r["bm_id"])} for r in csv.DictReader(f)]
+            if pairs:
+                stmt = pg_insert(CampaignBusinessManager).values(pairs)
+                session.execute(stmt.on_conflict_do_update(index_elements=["campaign_id"], set_={"bm_id": stmt.excluded.bm_id}))
+        attributed = (
+            update(MetaDailyPerformance)
+            .where(MetaDailyPerformance.bm_id.is_(None), MetaDailyPerformance.campaign_id == CampaignBusinessManager.campaign_id)
+            .values(bm_id=CampaignBusinessManager.bm_id)
+            .returning(MetaDailyPerformance.bm_id, MetaDailyPerformance.date)
+            .cte("attributed")
+        )
+        ranges = session.execute(
+            select(attributed.c.bm_id, func.min(attributed.c.date), func.max(attributed.c.date)).group_by(attributed.c.bm_id)
+        ).all()
+        unattributed = session.execute(select(func.count()).filter(MetaDailyPerformance.bm_id.is_(None))).scalar()
+        session.commit()
+    report = {
+        "target": "meta_daily_performance",
+        "unattributed": unattributed,
+        "ranges": [{"scope": str(bm_id), "start": start.isoformat(), "end": end.isoformat()} for bm_id, start, end in ranges],
+    }
+    schedule_rollups(report)
+    return report
+
+@app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
+def backfill_file(self, target, path, fmt=None, bm_id=None):
+    report = asyncio.run(load_file(target, path, fmt, bm_id))
+    schedule_rollups(report)
+    return report
+
+@click.command()
+@click.argument("target", type=click.Choice(sorted(TARGETS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default=None, help="Defaults to the file extension.")
+@click.option("--bm-id", type=int, default=None, help="BM for meta rows that carry no bm_id and have no known campaign mapping.")
+@click.option("--enqueue", is_flag=True, help="Run on a Celery worker instead of in this process.")
+def main(target, path, fmt, bm_id, enqueue):
+    if enqueue:
+        task = backfill_file.apply_async(args=(target, path, fmt, bm_id), queue="maintenance")
+        click.echo(f"Enqueued backfill task {task.id}")
+        return
+    report = asyncio.run(load_file(target, path, fmt, bm_id))
+    schedule_rollups(report)
+    click.echo(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
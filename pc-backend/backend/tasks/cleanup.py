@@ -1,7 +1,10 @@
 from datetime import date
 from dateutil.relativedelta import relativedelta
 from backend.tasks import app
-from backend.utils.db import get_db_session
+from backend.utils.cache_tags import bump_tags, fx_tags
+from backend.utils.db import get_worker_session
+from backend.utils.partitions import is_partitioned
+from backend.utils.purge import purge
 from backend.models.transactional import MetaDailyPerformance, ShopifyChildDailySalesSummary
 from backend.models.aggregated import FXDailyRate
 from backend.config import Config
@@ -9,11 +12,17 @@ from backend.config import Config
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True, rate_limit='1/m')
 def cleanup_old_data(self):
     cutoff = date.today() - relativedelta(months=Config.RETENTION_MONTHS)
-    with get_db_session() as session:
+    reports = []
+    with get_worker_session() as session:
         try:
-            for tbl in (MetaDailyPerformance, ShopifyChildDailySalesSummary, FXDailyRate):
-                session.query(tbl).filter(tbl.date < cutoff).delete(synchronize_session=False)
-            session.commit()
+            for column in (MetaDailyPerformance.date, ShopifyChildDailySalesSummary.summary_date, FXDailyRate.date):
+                model = column.class_
+                if is_partitioned(session, model.__tablename__):
+                    continue  # maintain_partitions drops whole months instead
+                reports.append(purge(session, model, column < cutoff, time_budget=Config.PURGE_TIME_BUDGET_SECONDS))
+                if model is FXDailyRate and reports[-1]["deleted"]:
+                    bump_tags(fx_tags())
         except Exception as e:
             session.rollback()
-            raise self.retry(exc=e)
\ No newline at end of file
+            raise self.retry(exc=e)
+    return reports
\ No newline at end of file
@@ -0,0 +1,48 @@
+import asyncio
+import os
+import time
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from backend.tasks import app
+from backend.config import Config
+from backend.services.exports import write_export
+from backend.utils.db import read_url
+from backend.utils.export_jobs import artifact_path, fail_job, get_job, purge_artifacts, update_job
+
+async def _render(name, params, fmt, fileobj):
+    # One connection for the life of the event loop; exports read from a replica when one is healthy.
+    url = read_url()
+    engine = create_async_engine(url, poolclass=NullPool)
+    try:
+        async with AsyncSession(engine, info={"replica": url} if url != Config.DATABASE_URL else {}) as session:
+            await write_export(session, name, params, fmt, fileobj)
+    finally:
+        await engine.dispose()
+
+@app.task(bind=True, max_retries=2, time_limit=Config.EXPORT_RENDER_TIMEOUT)
+def render_export(self, job_id):
+    job = get_job(job_id)
+    if job is None:
+        return None
+    path = artifact_path(job_id, job["format"])
+    part = f"{path}.part"
+    update_job(job_id, status="running", started_at=time.time())
+    try:
+        os.makedirs(Config.EXPORT_STORAGE_DIR, exist_ok=True)
+        with open(part, "wb") as f:
+            asyncio.run(_render(job["export"], job["params"], job["format"], f))
+        os.replace(part, path)
+    except Exception as e:
+        if os.path.exists(part):
+            os.remove(part)
+        if self.request.retries >= self.max_retries:
+            fail_job(job_id, str(e))
+            raise
+        update_job(job_id, status="queued", error=str(e))
+        raise self.retry(exc=e, countdown=2 ** self.request.retries)
+    update_job(job_id, status="done", path=path, size=os.path.getsize(path), finished_at=time.time())
+    return job_id
+
+@app.task
+def purge_export_artifacts():
+    return purge_artifacts()
@@ -2,14 +2,15 @@ from backend.tasks import app
 from requests import get
 from backend.models.aggregated import FXDailyRate
 from backend.config import Config
-from backend.utils.db import get_db_session
+from backend.utils.cache_tags import bump_tags, fx_tags
+from backend.utils.db import get_worker_session
 from datetime import date, timedelta
 from decimal import Decimal
 from sqlalchemy import select
 
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
 def fetch_fx_rates(self):
-    with get_db_session() as session:
+    with get_worker_session() as session:
         try:
             response = get(f"{Config.FX_API_URL}/latest")
             if response.status_code == 200:
@@ -18,6 +19,7 @@ def fetch_fx_rates(self):
                     new_rate = FXDailyRate(date=date.today(), from_currency=from_curr, to_currency='USD', rate=Decimal(rate), source='exchangerate.host')
                     session.add(new_rate)
                 session.commit()
+                bump_tags(fx_tags())
             else:
                 raise Exception("FX API failed")
         except Exception as e:
@@ -27,4 +29,5 @@ def fetch_fx_rates(self):
             for r in last_rates:
                 fallback = FXDailyRate(date=date.today(), from_currency=r.from_currency, to_currency=r.to_currency, rate=r.rate, source='fallback')
                 session.add(fallback)
-            session.commit()
\ No newline at end of file
+            session.commit()
+            bump_tags(fx_tags())
\ No newline at end of file
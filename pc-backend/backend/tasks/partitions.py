@@ -0,0 +1,36 @@
+import json
+from datetime import date
+import click
+from backend.tasks import app
+from backend.config import Config
+from backend.utils.cache_tags import bump_tags, fx_tags
+from backend.utils.db import get_worker_session
+from backend.utils.partitions import PARTITIONED, maintain
+
+def _maintain(session, *args):
+    report = maintain(session, date.today(), *args)
+    # Dropped FX months leave no timestamp behind; retire what was computed from them.
+    if (report.get("fx_daily_rates") or {}).get("dropped"):
+        bump_tags(fx_tags())
+    return report
+
+@app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
+def maintain_partitions(self):
+    with get_worker_session() as session:
+        try:
+            return _maintain(session, Config.PARTITION_MONTHS_AHEAD, Config.RETENTION_MONTHS)
+        except Exception as e:
+            session.rollback()
+            raise self.retry(exc=e)
+
+@click.command()
+@click.option("--table", "tables", multiple=True, type=click.Choice(sorted(PARTITIONED)), help="Defaults to every partitioned table.")
+@click.option("--months-ahead", type=int, default=Config.PARTITION_MONTHS_AHEAD, show_default=True)
+@click.option("--retention-months", type=int, default=Config.RETENTION_MONTHS, show_default=True)
+def main(tables, months_ahead, retention_months):
+    with get_worker_session() as session:
+        report = _maintain(session, months_ahead, retention_months, tables or None)
+    click.echo(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+from backend.tasks import app
+from backend.utils.db import probe_replicas
+
+@app.task(ignore_result=True)
+def probe_replica_lag():
+    return probe_replicas()
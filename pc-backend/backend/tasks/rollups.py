@@ -0,0 +1,19 @@
+from backend.tasks import app
+from backend.utils.db import get_worker_session
+from backend.utils.rollup import acquire_drain_lock, drain_dirty, release_drain_lock
+
+@app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
+def drain_rollups(self):
+    # A fresh token per run: retries reuse the request id, and the lock must name this attempt alone.
+    token = acquire_drain_lock()
+    if token is None:
+        return None
+    try:
+        with get_worker_session() as session:
+            try:
+                return drain_dirty(session)
+            except Exception as e:
+                session.rollback()
+                raise self.retry(exc=e)
+    finally:
+        release_drain_lock(token)
@@ -1,20 +1,27 @@
 from datetime import datetime
 from backend.tasks import app
-from backend.utils.db import get_db_session
+from backend.config import Config
+from backend.utils.db import get_worker_session
 from backend.models.security import ApiKey
+from backend.utils.api_key_cache import flush_usage
+from backend.utils.purge import purge
 from sqlalchemy import or_
 
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
 def purge_expired_keys(self):
     now = datetime.utcnow()
-    with get_db_session() as session:
+    with get_worker_session() as session:
         try:
-            expired = session.query(ApiKey).filter(
-                or_(ApiKey.revoked == True, ApiKey.expires_at < now)
-            ).all()
-            for key in expired:
-                session.delete(key)
-            session.commit()
+            return purge(session, ApiKey, or_(ApiKey.revoked == True, ApiKey.expires_at < now), time_budget=Config.PURGE_TIME_BUDGET_SECONDS)
         except Exception as e:
             session.rollback()
-            raise self.retry(exc=e)
\ No newline at end of file
+            raise self.retry(exc=e)
+
+@app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
+def flush_api_key_usage(self):
+    with get_worker_session() as session:
+        try:
+            return flush_usage(session)
+        except Exception as e:
+            session.rollback()
+            raise self.retry(exc=e)
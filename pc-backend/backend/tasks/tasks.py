@@ -1,49 +1,83 @@
-from datetime import date, datetime
-from celery import chord
+from datetime import date
 from backend.tasks import app
-from backend.utils.db import get_db_session
-from backend.models.transactional import MetaDailyPerformance, ShopifyChildDailySalesSummary, ShopifyDailySalesSummary
-from backend.models.aggregated import MasterStoreDailySummary, KPIDailySnapshot
-from sqlalchemy import select, func
-from flask import current_app
+from backend.utils.db import get_worker_session
+from backend.models.transactional import MetaDailyPerformance, ShopifyChildDailySalesSummary, ShopifyDailySalesSummary, CampaignBusinessManager
+from backend.config import Config
+from backend.utils.bulk import bulk_upsert
+from backend.utils.rollup import bump_cache_tags, mark_dirty, recompute_kpi_rollups, recompute_kpi_snapshots, recompute_master_store_summaries
+
+META_KEY = ("campaign_id", "date")
+SHOPIFY_CHILD_KEY = ("bm_id", "summary_date")
+CAMPAIGN_BM_KEY = ("campaign_id",)
+
+def _meta_rows(data):
+    day = date.fromisoformat(data["date"])
+    return [
+        {
+            "campaign_id": entry["campaign_id"],
+            "bm_id": data["bm_id"],
+            "date": day,
+            "spend_raw": entry["spend"],
+            "clicks": entry["clicks"],
+            "impressions": entry["impressions"],
+            "results": entry.get("results", 0),
+            "purchase_conversion_value_meta_raw": entry.get("purchase_value", 0),
+            "currency_code": entry.get("currency_code", "USD"),
+        }
+        for entry in data["payload"]
+    ]
+
+def _upsert_meta(session, rows):
+    # The campaign -> BM map is maintained from the same payloads so spend stays attributable per BM.
+    campaigns = [{"campaign_id": r["campaign_id"], "bm_id": r["bm_id"]} for r in rows]
+    bulk_upsert(session, CampaignBusinessManager, campaigns, CAMPAIGN_BM_KEY, Config.INGEST_BATCH_CHUNK_SIZE)
+    return bulk_upsert(session, MetaDailyPerformance, rows, META_KEY, Config.INGEST_BATCH_CHUNK_SIZE)
+
+def _shopify_child_row(data):
+    return {
+        "bm_id": data["bm_id"],
+        "summary_date": date.fromisoformat(data["date"]),
+        "orders_count": data["payload"]["orders_count"],
+        "gross_sales_raw": data["payload"]["gross_sales"],
+        "currency_code": data["payload"].get("currency_code", "USD"),
+    }
 
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True, rate_limit='10/m')
 def process_ingestion(self, data):
-    with get_db_session() as session:
+    with get_worker_session() as session:
         try:
             if data["data_type"] == "meta":
-                for entry in data["payload"]:
-                    perf = MetaDailyPerformance(
-                        campaign_id=entry["campaign_id"],
-                        date=date.fromisoformat(data["date"]),
-                        spend_raw=entry["spend"],
-                        clicks=entry["clicks"],
-                        impressions=entry["impressions"],
-                        results=entry.get("results", 0),
-                        purchase_conversion_value_meta_raw=entry.get("purchase_value", 0),
-                        currency_code=entry.get("currency_code", "USD")
-                    )
-                    session.merge(perf)
+                _upsert_meta(session, _meta_rows(data))
                 session.commit()
-                aggregate_master_store_daily_summary.delay(data)  # Full data
+                mark_dirty("bm", [(data["bm_id"], data["date"])])
             elif data["data_type"] == "shopify_child":
-                summary = ShopifyChildDailySalesSummary(
-                    bm_id=data["bm_id"],
-                    summary_date=date.fromisoformat(data["date"]),
-                    orders_count=data["payload"]["orders_count"],
-                    gross_sales_raw=data["payload"]["gross_sales"],
-                    currency_code=data["payload"].get("currency_code", "USD")
-                )
-                session.merge(summary)
+                bulk_upsert(session, ShopifyChildDailySalesSummary, [_shopify_child_row(data)], SHOPIFY_CHILD_KEY, Config.INGEST_BATCH_CHUNK_SIZE)
                 session.commit()
-                upsert_kpi_daily_snapshot.delay(data["bm_id"], data["date"])
+                mark_dirty("bm", [(data["bm_id"], data["date"])])
         except Exception as e:
             session.rollback()
             raise self.retry(exc=e)
 
+@app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
+def process_ingestion_batch(self, items):
+    with get_worker_session() as session:
+        try:
+            meta = [row for item in items if item["data_type"] == "meta" for row in _meta_rows(item)]
+            child = [_shopify_child_row(item) for item in items if item["data_type"] == "shopify_child"]
+            report = {
+                "meta_daily_performance": _upsert_meta(session, meta),
+                "shopify_child_daily_sales_summary": bulk_upsert(session, ShopifyChildDailySalesSummary, child, SHOPIFY_CHILD_KEY, Config.INGEST_BATCH_CHUNK_SIZE),
+            }
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise self.retry(exc=e)
+    mark_dirty("bm", {(item["bm_id"], item["date"]) for item in items})
+    return report
+
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
 def process_master_store_ingestion(self, data):
-    with get_db_session() as session:
+    with get_worker_session() as session:
         try:
             summary = ShopifyDailySalesSummary(
                 master_store_id=data["master_store_id"],
@@ -54,32 +88,16 @@ def process_master_store_ingestion(self, data):
             )
             session.merge(summary)
             session.commit()
-            aggregate_master_store_daily_summary.delay(data)
+            mark_dirty("store", [(data["master_store_id"], data["date"])])
         except Exception as e:
             session.rollback()
             raise self.retry(exc=e)
 
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
 def aggregate_master_store_daily_summary(self, data):
-    with get_db_session() as session:
+    with get_worker_session() as session:
         try:
-            master_id = data["master_store_id"]
-            day = date.fromisoformat(data["date"])
-            revenue = session.query(func.sum(ShopifyDailySalesSummary.gross_sales_raw)).filter_by(
-                master_store_id=master_id, summary_date=day
-            ).scalar() or 0.0
-            ad_spend = session.query(func.sum(MetaDailyPerformance.spend_raw)).filter_by(
-                date=day
-            ).scalar() or 0.0
-            currency = data.get("currency_code", "USD")
-            summary = MasterStoreDailySummary(
-                master_store_id=master_id,
-                date=day,
-                total_revenue=revenue,
-                total_ad_spend=ad_spend,
-                currency_code=currency
-            )
-            session.merge(summary)
+            recompute_master_store_summaries(session, [(data["master_store_id"], date.fromisoformat(data["date"]))])
             session.commit()
         except Exception as e:
             session.rollback()
@@ -87,29 +105,13 @@ def aggregate_master_store_daily_summary(self, data):
 
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
 def upsert_kpi_daily_snapshot(self, bm_id, date_str):
-    day = date.fromisoformat(date_str)
-    with get_db_session() as session:
+    with get_worker_session() as session:
         try:
-            revenue = session.query(func.sum(ShopifyChildDailySalesSummary.gross_sales_raw)).filter_by(
-                bm_id=bm_id, summary_date=day
-            ).scalar() or 0.0
-            ad_spend = session.query(func.sum(MetaDailyPerformance.spend_raw)).filter_by(
-                date=day
-            ).scalar() or 0.0
-            roas = revenue / ad_spend if ad_spend > 0 else 0.0
-            cpa = ad_spend / (revenue / 100) if revenue > 0 else 0.0
-            currency = "USD"
-            snapshot = KPIDailySnapshot(
-                bm_id=bm_id,
-                date=day,
-                revenue=revenue,
-                ad_spend=ad_spend,
-                roas=roas,
-                cpa=cpa,
-                currency_code=currency
-            )
-            session.merge(snapshot)
+            keys = [(bm_id, date.fromisoformat(date_str))]
+            recompute_kpi_snapshots(session, keys)
+            recompute_kpi_rollups(session, keys)
             session.commit()
+            bump_cache_tags("bm", keys)
         except Exception as e:
             session.rollback()
-            raise self.retry(exc=e)
\ No newline at end of file
+            raise self.retry(exc=e)
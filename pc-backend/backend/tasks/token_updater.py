@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from backend.tasks import app
-from backend.utils.db import get_db_session
+from backend.utils.db import get_worker_session
 from backend.models.core import BusinessManagerConfig, MetaTokenStatus
 from flask import current_app
 import requests
@@ -8,7 +8,7 @@ import requests
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
 def update_token_statuses(self):
     soon = datetime.utcnow() + timedelta(days=3)
-    with get_db_session() as session:
+    with get_worker_session() as session:
         try:
             expiring = session.query(BusinessManagerConfig).filter(
                 BusinessManagerConfig.meta_token_expires_at <= soon,
@@ -23,7 +23,7 @@ def update_token_statuses(self):
 
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True)
 def refresh_tokens(self):
-    with get_db_session() as session:
+    with get_worker_session() as session:
         try:
             expiring = session.query(BusinessManagerConfig).filter(
                 BusinessManagerConfig.meta_token_status.in_([MetaTokenStatus.EXPIRING, MetaTokenStatus.EXPIRED])
@@ -3,12 +3,16 @@ from factory.alchemy import SQLAlchemyModelFactory
 from backend.models.core import Region, ProductCategory, User, MasterStoreConfig, BusinessManagerConfig, StoreType, MetaTokenStatus
 from backend.models.aggregated import FXDailyRate
 from backend.models.transactional import MetaDailyPerformance, ShopifyChildDailySalesSummary, MetaCampaignData
-from backend.models import async_session
+from backend.utils.db import worker_sessionmaker
 from flask_bcrypt import generate_password_hash
 
+def worker_session():
+    # Resolved per factory call: the worker engine is created lazily, per process.
+    return worker_sessionmaker()()
+
 class BaseFactory(SQLAlchemyModelFactory):
     class Meta:
-        sqlalchemy_session = async_session
+        sqlalchemy_session_factory = worker_session
         sqlalchemy_session_persistence = "commit"
 
 class RegionFactory(BaseFactory):
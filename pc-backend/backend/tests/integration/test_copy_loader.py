@@ -0,0 +1,62 @@
+import asyncio
+import json
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+import asyncpg
+import pytest
+from backend.config import Config
+from backend.utils import copy_loader
+
+SCHEMA = "copy_loader_test"
+
+pytestmark = pytest.mark.skipif(not Config.DATABASE_URL.startswith("postgresql"), reason="COPY and DISTINCT ON need PostgreSQL")
+
+async def _run(statements, query=None):
+    conn = await asyncpg.connect(copy_loader._dsn())
+    try:
+        for statement in statements:
+            await conn.execute(statement)
+        return await conn.fetch(query) if query else None
+    finally:
+        await conn.close()
+
+@pytest.fixture
+def schema():
+    # Bare copies of the two tables in a schema of their own; the loader's unqualified names resolve there.
+    asyncio.run(_run([
+        f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE",
+        f"CREATE SCHEMA {SCHEMA}",
+        f"CREATE TABLE {SCHEMA}.meta_daily_performance (campaign_id varchar(50) NOT NULL, bm_id integer, date date NOT NULL, "
+        "spend_raw numeric(10, 2) NOT NULL, clicks integer NOT NULL, impressions integer NOT NULL, results integer NOT NULL, "
+        "purchase_conversion_value_meta_raw numeric(10, 2) NOT NULL, currency_code varchar(3) NOT NULL, UNIQUE (campaign_id, date))",
+        f"CREATE TABLE {SCHEMA}.meta_campaign_bm_map (campaign_id varchar(50) PRIMARY KEY, bm_id integer NOT NULL)",
+        f"INSERT INTO {SCHEMA}.meta_campaign_bm_map VALUES ('known', 7)",
+    ]))
+    with patch.object(copy_loader.Config, "DATABASE_URL", f"{Config.DATABASE_URL}?search_path={SCHEMA}"):
+        yield
+    asyncio.run(_run([f"DROP SCHEMA {SCHEMA} CASCADE"]))
+
+def _meta(campaign_id, day, spend, bm_id=None):
+    return {"campaign_id": campaign_id, "bm_id": bm_id, "date": day, "spend_raw": spend, "clicks": 1, "impressions": 10}
+
+def test_meta_load_dedupes_on_merge_and_attributes_bms(schema, tmp_path):
+    path = tmp_path / "meta.ndjson"
+    path.write_text("\n".join(json.dumps(r) for r in [
+        _meta("known", "2026-03-01", "1.00"),
+        _meta("known", "2026-03-01", "2.00"),  # Same key later in the file: the last line wins.
+        _meta("tagged", "2026-03-02", "3.00", bm_id=9),
+        _meta("new", "2026-03-03", "4.00"),
+    ]))
+    report = asyncio.run(copy_loader.load_file("meta_daily_performance", str(path), bm_id=5))
+    assert (report["loaded"], report["merged"], report["unattributed"]) == (4, 3, 0)
+    assert sorted((r["scope"], r["start"]) for r in report["ranges"]) == [("5", "2026-03-03"), ("7", "2026-03-01"), ("9", "2026-03-02")]
+    rows = asyncio.run(_run([], f"SELECT campaign_id, bm_id, date, spend_raw FROM {SCHEMA}.meta_daily_performance ORDER BY campaign_id"))
+    assert [tuple(r) for r in rows] == [
+        ("known", 7, date(2026, 3, 1), Decimal("2.00")),
+        ("new", 5, date(2026, 3, 3), Decimal("4.00")),
+        ("tagged", 9, date(2026, 3, 2), Decimal("3.00")),
+    ]
+    # The map learns the explicit and --bm-id attributions for the next load.
+    mapped = asyncio.run(_run([], f"SELECT campaign_id, bm_id FROM {SCHEMA}.meta_campaign_bm_map ORDER BY campaign_id"))
+    assert [tuple(r) for r in mapped] == [("known", 7), ("new", 5), ("tagged", 9)]
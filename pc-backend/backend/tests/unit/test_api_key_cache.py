@@ -0,0 +1,40 @@
+import time
+from unittest.mock import patch
+import pytest
+from backend.config import Config
+from backend.utils import api_key_cache
+from backend.utils.api_key_cache import cached_scopes, remember_verified, revoke_verified, secret_digest
+
+@pytest.fixture(autouse=True)
+def hmac_key():
+    with patch.object(Config, "API_KEY_HMAC_KEY", "test-hmac-key"):
+        yield
+
+def test_secret_digest_is_keyed_per_key_id():
+    assert secret_digest("ingest_a", "s3cret") == secret_digest("ingest_a", "s3cret")
+    assert secret_digest("ingest_a", "s3cret") != secret_digest("ingest_b", "s3cret")
+    assert secret_digest("ingest_a", "s3cret") != secret_digest("ingest_a", "other")
+    digest = secret_digest("ingest_a", "s3cret")
+    with patch.object(Config, "API_KEY_HMAC_KEY", "another-key"):
+        assert secret_digest("ingest_a", "s3cret") != digest
+
+def test_startup_requires_hmac_key_even_in_debug():
+    with patch.object(Config, "API_KEY_HMAC_KEY", None), patch.object(Config, "FLASK_DEBUG", 1):
+        with pytest.raises(RuntimeError, match="API_KEY_HMAC_KEY"):
+            Config.validate_for_prod()
+
+@patch.object(api_key_cache, "_ensure_listener")
+@patch.object(api_key_cache, "keys_redis")
+def test_verified_secret_skips_bcrypt_until_revoked(mock_redis, _listener):
+    mock_redis.return_value.get.return_value = None
+    remember_verified("ingest_a", "s3cret", ["ingest"], time.time() + 3600)
+    assert cached_scopes("ingest_a", "s3cret") == ["ingest"]
+    assert cached_scopes("ingest_a", "wrong") is None
+    revoke_verified("ingest_a")
+    mock_redis.return_value.publish.assert_called_with(api_key_cache.REVOKE_CHANNEL, "ingest_a")
+    assert cached_scopes("ingest_a", "s3cret") is None
+
+@patch.object(api_key_cache, "keys_redis")
+def test_expired_key_is_not_remembered(mock_redis):
+    remember_verified("ingest_old", "s3cret", ["ingest"], time.time() - 1)
+    mock_redis.return_value.setex.assert_not_called()
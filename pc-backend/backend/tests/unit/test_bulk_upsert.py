@@ -0,0 +1,15 @@
+from datetime import date
+from backend.utils.bulk import chunked, dedupe_rows
+
+def test_chunked_splits_rows():
+    assert [len(c) for c in chunked(range(5), 2)] == [2, 2, 1]
+
+def test_dedupe_rows_keeps_last_write():
+    rows = [
+        {"campaign_id": "c1", "date": date(2025, 8, 5), "spend_raw": 10},
+        {"campaign_id": "c2", "date": date(2025, 8, 5), "spend_raw": 20},
+        {"campaign_id": "c1", "date": date(2025, 8, 5), "spend_raw": 30},
+    ]
+    deduped = dedupe_rows(rows, ("campaign_id", "date"))
+    assert len(deduped) == 2
+    assert {r["campaign_id"]: r["spend_raw"] for r in deduped} == {"c1": 30, "c2": 20}
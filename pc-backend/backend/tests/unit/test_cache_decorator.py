@@ -1,9 +1,14 @@
+import gzip
+import time
 import pytest
-from unittest.mock import patch
-from backend.utils.caching import redis_cached
+from unittest.mock import MagicMock, patch
+from redis.exceptions import ConnectionError
+from backend.utils.cache_tags import apply_versions, range_tags, recently_bumped
+from backend.utils.caching import Entry, LocalCache, _response, _should_refresh, local_cache, redis_cached
 from flask import Flask, jsonify
 
 app = Flask(__name__)
+app.redis = MagicMock()
 
 @redis_cached(timeout=1)
 def cached_func():
@@ -13,17 +18,70 @@ def cached_func():
 def client():
     return app.test_client()
 
-@patch('backend.utils.caching.current_app.redis')
-def test_cache_hit(mock_redis, client):
-    mock_redis.get.return_value = '{"code": 200, "body": {"data": "value"}}'
+@patch('backend.utils.caching._ensure_listener')
+@patch('backend.utils.caching.binary_redis')
+def test_cache_hit(mock_binary, mock_listener, client):
+    local_cache.invalidate("")
+    mock_binary.return_value.pipeline.return_value.__enter__.return_value.get.return_value.ttl.return_value.execute.return_value = [b'200|9999999999|0.0||{"data": "value"}', 1]
     with app.app_context():
         rv = cached_func()
     assert rv.json == {"data": "value"}
     assert rv.status_code == 200
 
-@patch('backend.utils.caching.current_app.redis', side_effect=ConnectionError)
-def test_cache_bypass_on_error(mock_redis, client):
-    with app.app_context():
+def test_compressed_entry_served_by_accept_encoding():
+    body = b'{"data": "value"}'
+    entry = Entry(200, gzip.compress(body), 9999999999.0, 0.0, "gzip")
+    with app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+        rv = _response(entry)
+        assert rv.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(rv.get_data()) == body
+    with app.test_request_context():
+        rv = _response(entry)
+        assert "Content-Encoding" not in rv.headers
+        assert rv.get_data() == body
+
+@patch('backend.utils.caching._ensure_listener')
+@patch('backend.utils.caching.binary_redis', side_effect=ConnectionError)
+def test_cache_bypass_on_error(mock_binary, mock_listener, client):
+    local_cache.invalidate("")
+    with patch.object(app.redis, "set", side_effect=ConnectionError), app.app_context():
         rv = cached_func()
     assert rv.json == {"data": "value"}
-    assert rv.status_code == 200
\ No newline at end of file
+    assert rv.status_code == 200
+
+def test_local_cache_evicts_lru_by_bytes():
+    cache = LocalCache(max_bytes=10)
+    entry = Entry(200, b"12345", 0.0, 0.0)
+    cache.set("a", entry, 60)
+    cache.set("b", entry, 60)
+    cache.get("a")
+    cache.set("c", entry, 60)
+    assert cache.get("b") is None
+    assert cache.get("a") == entry
+    assert cache.size == 10
+
+def test_local_cache_expiry_and_prefix_invalidation():
+    cache = LocalCache(max_bytes=100)
+    cache.set("cache:f:1", Entry(200, b"x", 0.0, 0.0), 60)
+    cache.set("cache:g:1", Entry(200, b"y", 0.0, 0.0), 60)
+    cache.set("cache:h:1", Entry(200, b"z", 0.0, 0.0), 0)
+    cache.invalidate("cache:f:")
+    assert cache.get("cache:f:1") is None
+    assert cache.get("cache:g:1").body == b"y"
+    assert cache.get("cache:h:1") is None
+
+def test_early_refresh_only_near_expiry():
+    now = time.time()
+    assert not _should_refresh(Entry(200, b"", now + 3600, 0.01), beta=1.0)
+    assert _should_refresh(Entry(200, b"", now - 1, 0.01), beta=1.0)
+
+def test_range_tags_cover_days_and_fx():
+    assert range_tags("2026-01-30", "2026-02-01") == ["date:2026-01-30", "date:2026-01-31", "date:2026-02-01"]
+    assert range_tags("2026-01-01", "2026-01-01", "usd") == ["date:2026-01-01", "fx:*"]
+
+def test_recently_bumped_tracks_forward_moves_only():
+    apply_versions({"date:2031-01-01": 1})
+    assert not recently_bumped(["date:2031-01-01"], 60)
+    apply_versions({"date:2031-01-01": 2})
+    assert recently_bumped(["date:2031-01-01"], 60)
+    assert not recently_bumped(["date:2031-01-02"], 60)
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import namedtuple
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+import fakeredis
+import pytest
+from backend.config import Config
+from backend.services.bm_profit import get_profit_summary
+from backend.services.category_summary import get_category_summary
+from backend.utils import cache_tags, caching
+from backend.utils.caching import Entry, _decode, _encode, cached_rows, local_cache
+from backend.utils.row_codec import encode_rows
+
+Row = namedtuple("Row", "bm_id revenue")
+
+@pytest.fixture
+def redis():
+    r = fakeredis.FakeRedis()
+    local_cache.invalidate("")
+    with patch.object(caching, "binary_redis", return_value=r), patch.object(caching, "_ensure_listener"):
+        yield r
+
+def _service(calls, delay=0.0):
+    @cached_rows(timeout=60, grace=30)
+    async def rows_for(session, bm_id):
+        calls.append(bm_id)
+        await asyncio.sleep(delay)
+        return [Row(bm_id, len(calls))]
+    return rows_for
+
+def _session():
+    session = MagicMock()
+    session.info = {}
+    return session
+
+def _key(redis):
+    return next(k for k in redis.keys("cache:rows:*") if not k.endswith(b":lock"))
+
+def test_miss_then_hit_from_l1_and_l2(redis):
+    calls = []
+    rows_for = _service(calls)
+    assert asyncio.run(rows_for(_session(), 1)) == [(1, 1)]
+    assert asyncio.run(rows_for(_session(), 1)) == [(1, 1)]
+    local_cache.invalidate("")
+    assert asyncio.run(rows_for(_session(), 1)) == [(1, 1)]
+    assert calls == [1]
+    assert 60 < redis.ttl(_key(redis)) <= 90
+
+def test_l2_hit_keeps_l1_within_the_redis_ttl(redis):
+    rows_for = _service([])
+    asyncio.run(rows_for(_session(), 1))
+    key = _key(redis)
+    local_cache.invalidate("")
+    redis.expire(key, 5)
+    asyncio.run(rows_for(_session(), 1))
+    # The local copy must not outlive the shared one it was read from.
+    assert local_cache._entries[key.decode()][0] - time.monotonic() <= 5
+
+def test_concurrent_misses_compute_once(redis):
+    calls = []
+    rows_for = _service(calls, delay=0.05)
+
+    async def burst():
+        return await asyncio.gather(*(rows_for(_session(), 1) for _ in range(5)))
+
+    assert all(rows == [(1, 1)] for rows in asyncio.run(burst()))
+    assert calls == [1]
+
+def _seed(redis, key, fresh_until):
+    redis.setex(key, 90, _encode(Entry(200, encode_rows([Row(1, 0)]), fresh_until, 0.01)))
+
+def test_expired_entry_refreshed_by_lock_winner(redis):
+    calls = []
+    rows_for = _service(calls)
+    asyncio.run(rows_for(_session(), 1))
+    key = _key(redis)
+    local_cache.invalidate("")
+    _seed(redis, key, time.time() - 1)
+    assert asyncio.run(rows_for(_session(), 1)) == [(1, 2)]
+    assert _decode(redis.get(key)).fresh_until > time.time() and not redis.exists(key + b":lock")
+
+def test_expired_entry_served_stale_while_peer_refreshes(redis):
+    calls = []
+    rows_for = _service(calls)
+    asyncio.run(rows_for(_session(), 1))
+    key = _key(redis)
+    local_cache.invalidate("")
+    _seed(redis, key, time.time() - 1)
+    redis.set(key + b":lock", 1)
+    assert asyncio.run(rows_for(_session(), 1)) == [(1, 0)]
+    assert calls == [1]
+
+def test_failed_refresh_serves_previous_rows(redis):
+    calls = []
+
+    @cached_rows(timeout=60)
+    async def flaky(session, bm_id):
+        calls.append(bm_id)
+        if len(calls) > 1:
+            raise RuntimeError("db down")
+        return [Row(bm_id, 0)]
+
+    asyncio.run(flaky(_session(), 1))
+    local_cache.invalidate("")
+    _seed(redis, _key(redis), time.time() - 1)
+    assert asyncio.run(flaky(_session(), 1)) == [(1, 0)]
+    assert len(calls) == 2
+
+def test_lookups_start_the_tag_listener():
+    local_cache.invalidate("")
+    with patch.object(caching, "binary_redis", return_value=fakeredis.FakeRedis()), \
+            patch.object(caching, "_ensure_listener") as listener, patch.object(caching, "tags_redis") as tags:
+        asyncio.run(_service([])(_session(), 1))
+    listener.assert_called_with(tags.return_value)
+
+def test_listener_applies_published_tag_versions():
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    with patch.object(caching, "_listener_pid", None):
+        caching._ensure_listener(redis)
+        redis.publish(caching.TAGS_CHANNEL, '{"fx:*": 41}')
+        deadline = time.monotonic() + 5
+        while cache_tags._versions.get("fx:*", (0,))[0] != 41 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    assert cache_tags._versions["fx:*"][0] == 41
+
+@pytest.mark.parametrize("service", [get_category_summary, get_profit_summary])
+def test_summaries_reading_untagged_dimensions_expire_quickly(redis, service):
+    session = _session()
+    session.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=[Row(1, 0)])))
+    with patch.object(cache_tags, "tags_redis", return_value=fakeredis.FakeRedis()):
+        asyncio.run(service(session, date(2026, 3, 1), date(2026, 3, 2)))
+    assert redis.ttl(_key(redis)) <= Config.CACHE_DIMENSION_TIMEOUT + Config.CACHE_STALE_GRACE_SECONDS
@@ -0,0 +1,60 @@
+import asyncio
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.dialects import postgresql
+from backend.tasks import backfill
+from backend.utils.copy_loader import TARGETS, _attribute_campaigns, _merge_sql, _ranges_sql
+
+META = TARGETS["meta_daily_performance"]
+
+def test_merge_keeps_existing_bm_id_when_the_file_has_none():
+    sql = _merge_sql("meta_daily_performance", META, "_staging")
+    assert "bm_id = coalesce(EXCLUDED.bm_id, meta_daily_performance.bm_id)" in sql
+    assert "spend_raw = EXCLUDED.spend_raw" in sql
+
+def test_ranges_skip_unattributed_rows():
+    assert _ranges_sql(META, "_staging").endswith("WHERE bm_id IS NOT NULL GROUP BY 1")
+
+def test_meta_ranges_are_marked_dirty_per_bm():
+    report = {"target": "meta_daily_performance", "ranges": [{"scope": "7", "start": "2026-03-01", "end": "2026-03-04"}]}
+    with patch.object(backfill, "mark_dirty_range") as mark:
+        backfill.schedule_rollups(report)
+    mark.assert_called_once_with("bm", 7, "2026-03-01", "2026-03-04")
+
+def test_attribute_meta_history_loads_pairs_and_marks_the_days_that_gained_spend(tmp_path):
+    mapping = tmp_path / "campaigns.csv"
+    mapping.write_text("campaign_id,bm_id\nc-1,7\nc-2,9\n")
+    session = MagicMock()
+    session.execute.side_effect = [
+        MagicMock(),
+        MagicMock(all=MagicMock(return_value=[(7, date(2025, 1, 1), date(2026, 3, 4)), (9, date(2026, 2, 1), date(2026, 2, 1))])),
+        MagicMock(scalar=MagicMock(return_value=3)),
+    ]
+    with patch.object(backfill, "get_worker_session") as get_session, patch.object(backfill, "mark_dirty_range") as mark:
+        get_session.return_value.__enter__.return_value = session
+        report = backfill.attribute_meta_history(str(mapping))
+    upsert = session.execute.call_args_list[0].args[0]
+    params = upsert.compile(dialect=postgresql.dialect()).params
+    assert upsert.table.name == "meta_campaign_bm_map" and (params["campaign_id_m0"], params["bm_id_m1"]) == ("c-1", 9)
+    assert [c.args for c in mark.call_args_list] == [("bm", 7, "2025-01-01", "2026-03-04"), ("bm", 9, "2026-02-01", "2026-02-01")]
+    assert report["unattributed"] == 3
+    session.commit.assert_called_once()
+
+def test_attribute_meta_history_without_pairs_only_uses_the_existing_map():
+    session = MagicMock()
+    session.execute.side_effect = [MagicMock(all=MagicMock(return_value=[])), MagicMock(scalar=MagicMock(return_value=0))]
+    with patch.object(backfill, "get_worker_session") as get_session, patch.object(backfill, "mark_dirty_range") as mark:
+        get_session.return_value.__enter__.return_value = session
+        assert backfill.attribute_meta_history()["ranges"] == []
+    mark.assert_not_called()
+
+def test_staged_rows_take_the_map_before_the_bm_id_default():
+    conn = MagicMock(execute=AsyncMock(), fetchval=AsyncMock(return_value=2))
+    assert asyncio.run(_attribute_campaigns(conn, "_staging", 5)) == 2
+    statements = [c.args[0] for c in conn.execute.call_args_list]
+    assert "FROM meta_campaign_bm_map m" in statements[0] and conn.execute.call_args_list[1].args[1] == 5
+    assert statements[2].startswith("INSERT INTO meta_campaign_bm_map") and "ORDER BY campaign_id, _line DESC" in statements[2]
+
+def test_merge_keeps_the_last_line_per_key():
+    assert "SELECT DISTINCT ON (campaign_id, date)" in _merge_sql("meta_daily_performance", META, "_staging")
+    assert "ORDER BY campaign_id, date, _line DESC ON CONFLICT (campaign_id, date)" in _merge_sql("meta_daily_performance", META, "_staging")
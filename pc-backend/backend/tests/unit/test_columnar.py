@@ -0,0 +1,38 @@
+import asyncio
+import io
+import uuid
+from datetime import date
+from decimal import Decimal
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Date, Integer, Numeric, String, Uuid, column
+from backend.utils.columnar import _converter, arrow_schema, record_batch, write_arrow
+
+COLUMNS = [column("date", Date), column("spend", Numeric(10, 2)), column("clicks", Integer), column("store", Uuid), column("name", String)]
+ROWS = [
+    (date(2026, 1, 1), Decimal("12.50"), 3, uuid.UUID(int=1), "a"),
+    (date(2026, 1, 2), Decimal("1.234567891"), None, None, "b"),
+]
+
+def test_schema_is_typed():
+    schema = arrow_schema(COLUMNS)
+    assert schema.field("date").type == pa.date32()
+    assert schema.field("spend").type == pa.decimal128(38, 6)
+    assert schema.field("clicks").type == pa.int64()
+    assert schema.field("store").type == pa.string()
+
+def test_record_batch_quantizes_decimals():
+    schema = arrow_schema(COLUMNS)
+    batch = record_batch(schema, ROWS, [_converter(f) for f in schema])
+    assert batch.column("spend").to_pylist() == [Decimal("12.500000"), Decimal("1.234568")]
+    assert batch.column("store").to_pylist() == [str(uuid.UUID(int=1)), None]
+
+async def _batches():
+    yield ROWS
+    yield ROWS
+
+def test_parquet_roundtrip():
+    buf = io.BytesIO()
+    asyncio.run(write_arrow(_batches(), COLUMNS, buf, "parquet"))
+    buf.seek(0)
+    assert pq.read_table(buf).num_rows == 4
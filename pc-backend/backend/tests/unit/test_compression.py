@@ -0,0 +1,26 @@
+import gzip
+from flask import Flask
+from backend.utils.compression import compress_response
+
+app = Flask(__name__)
+
+def test_small_body_left_uncompressed():
+    with app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+        rv = compress_response(app.response_class(b"{}", mimetype="application/json"))
+        assert "Content-Encoding" not in rv.headers
+        assert "Accept-Encoding" in rv.vary
+
+def test_large_body_gzipped():
+    body = b'{"rows": [' + b"1, " * 1000 + b"1]}"
+    with app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+        rv = compress_response(app.response_class(body, mimetype="application/json"))
+        assert rv.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(rv.get_data()) == body
+
+def test_streamed_body_compressed_per_chunk():
+    chunks = [b"a,b\n", b"1,2\n"] * 50
+    with app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+        rv = compress_response(app.response_class(iter(chunks), mimetype="text/csv"))
+        assert rv.headers["Content-Encoding"] == "gzip"
+        assert "Content-Length" not in rv.headers
+        assert gzip.decompress(b"".join(rv.response)) == b"".join(chunks)
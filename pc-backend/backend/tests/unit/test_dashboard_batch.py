@@ -0,0 +1,75 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from backend.services import dashboard_batch
+from backend.services.dashboard_batch import BatchError, parse_batch, run_batch
+from backend.utils.fx import shared_matrix
+
+def test_widgets_take_shared_filters_in_service_argument_order():
+    shared, widgets = parse_batch({
+        "start_date": "2026-09-01",
+        "end_date": "2026-09-30",
+        "bm_ids": [3, 4],
+        "widgets": [
+            {"name": "trend", "query": "kpi", "params": {"grain": "week", "mode": "usd"}},
+            {"query": "portfolio", "params": {"region_ids": 2}},
+            {"query": "system_health"},
+        ],
+    })
+    assert shared["start_date"] == date(2026, 9, 1)
+    name, query, filters = widgets[0]
+    assert (name, query) == ("trend", "kpi")
+    assert list(filters.values()) == [date(2026, 9, 1), date(2026, 9, 30), [], ["3", "4"], "usd", "week"]
+    assert widgets[1] == ("portfolio", "portfolio", {"region_ids": ["2"], "master_store_ids": []})
+    assert widgets[2] == ("system_health", "system_health", {})
+
+@pytest.mark.parametrize("body, message", [
+    ({"widgets": []}, "non-empty"),
+    ({"widgets": [{"query": "nope"}]}, "query must be one of"),
+    ({"widgets": [{"query": "kpi"}]}, "start_date and end_date are required"),
+    ({"start_date": "2026-13-01", "widgets": [{"query": "system_health"}]}, "ISO date"),
+    ({"start_date": "2026-09-01", "end_date": "2026-09-30", "widgets": [{"query": "kpi", "params": {"grain": "hour"}}]}, "grain"),
+    ({"widgets": [{"query": "portfolio"}, {"query": "portfolio"}]}, "duplicate"),
+])
+def test_malformed_batches_are_rejected(body, message):
+    with pytest.raises(BatchError, match=message):
+        parse_batch(body)
+
+@asynccontextmanager
+async def _session():
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=MagicMock(scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=["EUR"])))))
+    yield session
+
+def test_run_batch_isolates_failures_and_loads_fx_once():
+    seen = []
+
+    async def rows(session, start_date, end_date, mode):
+        seen.append(shared_matrix.get())
+        return {"mode": mode}
+
+    async def broken(session, start_date, end_date, mode):
+        raise RuntimeError("db down")
+
+    queries = {"ok": (rows, ("start_date", "end_date", "mode")), "broken": (broken, ("start_date", "end_date", "mode"))}
+    shared = {"start_date": date(2026, 9, 1), "end_date": date(2026, 9, 30)}
+    widgets = [(name, query, {**shared, "mode": "usd"}) for name, query in (("a", "ok"), ("b", "ok"), ("c", "broken"))]
+    matrix = object()
+    with patch.dict(dashboard_batch.QUERIES, queries), patch.object(dashboard_batch, "get_concurrent_session", _session), \
+            patch.object(dashboard_batch.FXRateMatrix, "load", AsyncMock(return_value=matrix)) as load:
+        results = asyncio.run(run_batch(shared, widgets))
+    assert results["a"]["data"] == results["b"]["data"] == {"mode": "usd"}
+    assert results["c"]["error"] == "RuntimeError" and "data" not in results["c"]
+    assert all("ms" in r for r in results.values())
+    # One rate lookup for the page's range, shared by every widget and reset afterwards.
+    load.assert_awaited_once()
+    assert load.await_args.args[1:] == (date(2026, 9, 1), date(2026, 9, 30), ["EUR"])
+    assert seen == [matrix, matrix] and shared_matrix.get() is None
+
+def test_native_batches_skip_the_fx_matrix():
+    shared = {"start_date": date(2026, 9, 1), "end_date": date(2026, 9, 30)}
+    with patch.object(dashboard_batch.FXRateMatrix, "load", AsyncMock()) as load:
+        assert asyncio.run(dashboard_batch._load_matrix(shared, [("a", "kpi", {"mode": "native"})])) is None
+    load.assert_not_awaited()
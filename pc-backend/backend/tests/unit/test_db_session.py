@@ -0,0 +1,97 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+import fakeredis
+from flask import Flask
+from backend.utils import db
+from backend.utils.db import get_db_session, sync_url
+
+def test_sync_url_swaps_async_drivers():
+    assert sync_url("postgresql+asyncpg://u:p@db:5432/perf").drivername == "postgresql+psycopg2"
+    assert sync_url("sqlite+aiosqlite:///performance.db").drivername == "sqlite"
+
+def _app():
+    app = Flask(__name__)
+    session = MagicMock(commit=AsyncMock(), rollback=AsyncMock(), close=AsyncMock())
+    app.async_session = MagicMock(return_value=session)
+    return app, session
+
+def test_nested_blocks_share_one_session_and_commit_once():
+    app, session = _app()
+
+    async def view():
+        async with get_db_session() as outer:
+            async with get_db_session() as inner:
+                assert inner is outer
+            session.commit.assert_not_awaited()
+
+    with app.test_request_context():
+        asyncio.run(view())
+    app.async_session.assert_called_once()
+    session.commit.assert_awaited_once()
+    session.close.assert_awaited_once()
+
+def test_error_rolls_back_and_closes():
+    app, session = _app()
+
+    async def view():
+        async with get_db_session():
+            raise ValueError("boom")
+
+    with app.test_request_context():
+        try:
+            asyncio.run(view())
+        except ValueError:
+            pass
+    session.rollback.assert_awaited_once()
+    session.commit.assert_not_awaited()
+    session.close.assert_awaited_once()
+
+@patch.object(db, "_refresh_lag")
+def test_replica_routing_respects_lag_and_recent_writes(_probe):
+    app, _ = _app()
+    app.replica_sessions = {"fast": MagicMock(), "slow": MagicMock()}
+    app.redis = MagicMock()
+    with patch.dict(db._replica_lag, {"fast": 0.5, "slow": 60.0, "down": None}, clear=True):
+        with app.test_request_context():
+            app.redis.get.return_value = None
+            assert db._pick_replica() == "fast"
+            # Wrote a moment ago: even the fast replica may not have it yet.
+            app.redis.get.return_value = str(time.time())
+            assert db._pick_replica() is None
+
+def test_web_engines_hold_no_connections_between_event_loops():
+    # Each async view runs on a fresh event loop, so a pooled asyncpg connection would be reused on the wrong loop.
+    app = Flask(__name__)
+    app.config.update(DATABASE_URL="postgresql+asyncpg://u:p@db/perf", DATABASE_REPLICA_URLS=["postgresql+asyncpg://u:p@replica/perf"])
+    db.init_db(app)
+    engines = [app.async_engine, *(maker.kw["bind"] for maker in app.replica_sessions.values())]
+    assert all(isinstance(engine.pool, db.NullPool) for engine in engines)
+
+R1, R2, R3 = "postgresql://r1/perf", "postgresql://r2/perf", "postgresql://r3/perf"
+
+def test_web_workers_read_published_lag_instead_of_probing():
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    redis.hset(db.REPLICA_LAG_KEY, mapping={R1: 0.5, R2: -1})
+    with patch.object(db, "db_redis", return_value=redis), patch.object(db, "create_engine") as connect, \
+            patch.object(db.Config, "DATABASE_REPLICA_URLS", [R1, R2, R3]), \
+            patch.object(db, "_lag_read_at", None), patch.dict(db._replica_lag, clear=True):
+        assert db.healthy_replicas() == [R1]
+        # Unreachable and never-probed replicas are both skipped.
+        assert db._replica_lag == {R1: 0.5, R2: None, R3: None}
+        redis.delete(db.REPLICA_LAG_KEY)
+        assert db.healthy_replicas() == [R1]
+    connect.assert_not_called()
+
+def test_probe_publishes_lag_with_expiry():
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    up, down = MagicMock(), MagicMock()
+    up.connect.return_value.__enter__.return_value.execute.return_value.scalar.return_value = 1.5
+    down.connect.side_effect = OSError("connection refused")
+    with patch.object(db, "db_redis", return_value=redis), patch.object(db, "create_engine", side_effect=[up, down]), \
+            patch.object(db.Config, "DATABASE_REPLICA_URLS", [R1, R2]):
+        assert db.probe_replicas() == {R1: 1.5, R2: -1}
+    assert redis.hgetall(db.REPLICA_LAG_KEY) == {R1: "1.5", R2: "-1"}
+    assert 0 < redis.ttl(db.REPLICA_LAG_KEY) <= 3 * db.Config.REPLICA_PROBE_INTERVAL_SECONDS
+    up.dispose.assert_called_once()
+    down.dispose.assert_called_once()
@@ -0,0 +1,33 @@
+import asyncio
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+import pytest
+from openpyxl import load_workbook
+from backend.utils import excel
+from backend.utils.excel import XLSX_MIMETYPE, build_streaming_file_response, write_xlsx
+
+async def _rows():
+    yield ["Date", "Campaign", "Spend"]
+    for i in range(1, 4):
+        yield [date(2026, 3, i), f"cmp_{i}", Decimal(f"{i}.50")]
+
+def test_streamed_workbook_holds_every_row(monkeypatch):
+    monkeypatch.setattr(excel.Config, "EXPORT_CHUNK_SIZE", 512)
+    rv = asyncio.run(build_streaming_file_response(lambda f: write_xlsx(_rows(), f), "out.xlsx", XLSX_MIMETYPE))
+    body = b"".join(rv.response)
+    assert int(rv.headers["Content-Length"]) == len(body)
+    rows = list(load_workbook(BytesIO(body), read_only=True).active.iter_rows(values_only=True))
+    assert rows[0] == ("Date", "Campaign", "Spend")
+    assert [(r[0].date(), r[1], r[2]) for r in rows[1:]] == [(date(2026, 3, i), f"cmp_{i}", i + 0.5) for i in range(1, 4)]
+
+def test_temp_file_closed_when_render_fails():
+    opened = []
+
+    async def write(fileobj):
+        opened.append(fileobj)
+        raise RuntimeError("query failed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(build_streaming_file_response(write, "out.xlsx", XLSX_MIMETYPE))
+    assert opened[0].closed
@@ -0,0 +1,77 @@
+import os
+import time
+from unittest.mock import patch
+import fakeredis
+import pytest
+from backend.tasks import exports as export_tasks
+from backend.utils import export_jobs
+from backend.utils.export_jobs import create_job, fail_job, fingerprint, get_job, owned_by, purge_artifacts
+
+PARAMS = {"start_date": "2026-01-01", "end_date": "2026-01-31", "bm_ids": ["1", "2"], "mode": None}
+
+@pytest.fixture
+def storage(tmp_path):
+    r = fakeredis.FakeRedis(decode_responses=True)
+    with patch.object(export_jobs, "jobs_redis", return_value=r), patch.object(export_jobs.Config, "EXPORT_STORAGE_DIR", str(tmp_path)):
+        yield tmp_path
+
+def _aged(path, seconds):
+    path.write_bytes(b"x")
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+def test_fingerprint_is_stable_across_key_order():
+    reordered = dict(reversed(list(PARAMS.items())))
+    assert fingerprint("kpi_snapshot", PARAMS, "2026-02-01T00:00:00") == fingerprint("kpi_snapshot", reordered, "2026-02-01T00:00:00")
+
+def test_fingerprint_changes_with_watermark_and_export():
+    base = fingerprint("kpi_snapshot", PARAMS, "2026-02-01T00:00:00")
+    assert fingerprint("kpi_snapshot", PARAMS, "2026-02-02T00:00:00") != base
+    assert fingerprint("bm_profitability", PARAMS, "2026-02-01T00:00:00") != base
+
+def test_jobs_are_shared_per_user_only(storage):
+    job, created = create_job("kpi_snapshot", PARAMS, "w1", user="7")
+    again, created_again = create_job("kpi_snapshot", PARAMS, "w1", user="7")
+    other, created_other = create_job("kpi_snapshot", PARAMS, "w1", user="8")
+    assert created and not created_again and created_other
+    assert again["job_id"] == job["job_id"] != other["job_id"]
+    assert owned_by(job, 7) and not owned_by(job, 8) and not owned_by(None, 7)
+
+def test_render_moves_job_from_queued_to_done(storage):
+    job, _ = create_job("kpi_snapshot", PARAMS, "w1", user="7")
+    assert job["status"] == "queued"
+
+    async def render(name, params, fmt, fileobj):
+        assert get_job(job["job_id"])["status"] == "running"
+        fileobj.write(b"workbook")
+
+    with patch.object(export_tasks, "_render", render):
+        export_tasks.render_export.run(job["job_id"])
+    done = get_job(job["job_id"])
+    assert done["status"] == "done" and int(done["size"]) == 8
+    assert os.listdir(storage) == [f"{job['job_id']}.xlsx"]
+
+def test_failed_render_requeues_and_removes_part_file(storage):
+    job, _ = create_job("kpi_snapshot", PARAMS, "w1", user="7")
+
+    async def render(name, params, fmt, fileobj):
+        raise RuntimeError("replica went away")
+
+    with patch.object(export_tasks, "_render", render), pytest.raises(RuntimeError):
+        export_tasks.render_export.run(job["job_id"])
+    assert get_job(job["job_id"])["status"] == "queued"
+    assert os.listdir(storage) == []
+    fail_job(job["job_id"], "replica went away")
+    assert get_job(job["job_id"])["status"] == "failed"
+    # A failed job is not handed to the next identical request.
+    assert create_job("kpi_snapshot", PARAMS, "w1", user="7")[1]
+
+def test_purge_keeps_part_files_of_active_renders(storage):
+    running, _ = create_job("kpi_snapshot", PARAMS, "w1", user="7")
+    export_jobs.update_job(running["job_id"], status="running")
+    _aged(storage / f"{running['job_id']}.xlsx.part", 3600)
+    _aged(storage / "orphan.xlsx.part", 3600)
+    _aged(storage / "old.xlsx", 3600)
+    _aged(storage / "fresh.xlsx", 0)
+    assert purge_artifacts(max_age=900) == 2
+    assert sorted(os.listdir(storage)) == sorted(["fresh.xlsx", f"{running['job_id']}.xlsx.part"])
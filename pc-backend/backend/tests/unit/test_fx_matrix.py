@@ -0,0 +1,62 @@
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import Column, Date, MetaData, String, Table, create_engine, insert, select
+from backend.models.aggregated import FXDailyRate
+from backend.utils.fx import FXRateMatrix, resolved_rates
+
+Row = namedtuple("Row", "from_currency date rate priority")
+
+def _matrix(rows):
+    start, end = date(2025, 8, 1), date(2025, 8, 4)
+    rates = {"USD": [Decimal(1)] * 4}
+    rates.update(FXRateMatrix._resolve(start, end, ["EUR", "GBP"], rows))
+    return FXRateMatrix(start, end, rates)
+
+def test_matrix_precedence_and_forward_fill():
+    matrix = _matrix([
+        Row("EUR", date(2025, 7, 30), Decimal("1.05"), 1),
+        Row("EUR", date(2025, 8, 2), Decimal("1.10"), 1),
+        Row("EUR", date(2025, 8, 2), Decimal("1.50"), 0),
+        Row("EUR", date(2025, 8, 3), Decimal("1.20"), 2),
+    ])
+    days = [date(2025, 8, d) for d in range(1, 5)]
+    assert [matrix.rate(d, "EUR") for d in days] == [Decimal("1.05"), Decimal("1.50"), Decimal("1.50"), Decimal("1.20")]
+    assert matrix.rate(date(2025, 8, 1), "GBP") == Decimal("1.0")
+
+def test_matrix_vectorized_rates():
+    matrix = _matrix([Row("EUR", date(2025, 8, 1), Decimal("1.10"), 0)])
+    rates = matrix.rates([date(2025, 8, 1), date(2025, 8, 4), date(2025, 8, 2)], ["EUR", "USD", "JPY"])
+    assert rates.tolist() == [1.1, 1.0, 1.0]
+
+SOURCES = {0: "manual", 1: "exchangerate.host", 2: "scraper"}
+
+def test_sql_resolution_matches_the_matrix():
+    rows = [
+        Row("EUR", date(2025, 7, 30), Decimal("1.05"), 2),
+        Row("EUR", date(2025, 8, 2), Decimal("1.10"), 1),
+        Row("EUR", date(2025, 8, 2), Decimal("1.50"), 0),
+        Row("EUR", date(2025, 8, 3), Decimal("1.20"), 2),
+        Row("GBP", date(2025, 8, 1), Decimal("1.30"), 2),
+        Row("GBP", date(2025, 8, 3), Decimal("1.25"), 1),
+    ]
+    engine = create_engine("sqlite://")
+    metadata = MetaData()
+    pairs = Table("pairs", metadata, Column("date", Date), Column("currency_code", String(3)))
+    # The columns resolved_rates reads; the real table's partitioned composite key does not exist in SQLite.
+    rates = Table("fx_daily_rates", metadata, *(Column(c.name, c.type) for c in FXDailyRate.__table__.c if c.name not in ("id", "created_at")))
+    metadata.create_all(engine)
+    days = [date(2025, 8, d) for d in range(1, 5)]
+    currencies = ["EUR", "GBP", "USD", "JPY"]
+    with engine.begin() as conn:
+        conn.execute(insert(rates), [
+            {"date": r.date, "from_currency": r.from_currency, "to_currency": "USD", "rate": r.rate, "source": SOURCES[r.priority]}
+            for r in rows
+        ])
+        conn.execute(insert(pairs), [{"date": d, "currency_code": c} for d in days for c in currencies])
+        fx = resolved_rates(select(pairs.c.date, pairs.c.currency_code))
+        sql = {(d, c): Decimal(str(rate)) for d, c, rate in conn.execute(select(fx))}
+    # Same-day rates from trusted sources only, carry-forward from any source, USD and unknown currencies at 1.0.
+    matrix = _matrix(rows)
+    assert sql == {(d, c): matrix.rate(d, c) for d in days for c in currencies}
+    assert sql[(date(2025, 8, 1), "GBP")] == Decimal("1.0") and sql[(date(2025, 8, 2), "GBP")] == Decimal("1.30")
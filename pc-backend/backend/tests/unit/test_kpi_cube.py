@@ -0,0 +1,99 @@
+import asyncio
+import uuid
+from datetime import date
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+from flask import Flask
+from redis.exceptions import ConnectionError
+from backend.utils import cube
+from backend.utils.cube import KPICube
+
+STORE_A, STORE_B = uuid.uuid4(), uuid.uuid4()
+SHOES, HATS = uuid.uuid4(), uuid.uuid4()
+BMS = [(1, STORE_A, 10), (2, STORE_B, 20)]
+CATEGORIES = {SHOES: "Shoes", HATS: "Hats"}
+
+def _row(bm_id, day, revenue, ad_spend, category=SHOES, currency="USD"):
+    revenue, ad_spend = Decimal(revenue), Decimal(ad_spend)
+    return (bm_id, category, currency, day, revenue, ad_spend, float(revenue / ad_spend), float(ad_spend / (revenue / 100)))
+
+def _cube():
+    return KPICube.from_rows(date(2026, 1, 1), [
+        _row(2, date(2026, 3, 2), "100.10", "10.00"),
+        _row(1, date(2026, 3, 2), "50.00", "25.00", HATS),
+        _row(1, date(2026, 3, 3), "150.00", "25.00", HATS),
+        _row(1, date(2026, 3, 9), "80.00", "20.00", HATS),
+    ], BMS, CATEGORIES, watermark=None)
+
+def test_daily_rows_match_sql_order_and_types():
+    rows = _cube().kpi_rows(date(2026, 3, 1), date(2026, 3, 3))
+    assert [(r.date, r.bm_id) for r in rows] == [(date(2026, 3, 2), 1), (date(2026, 3, 2), 2), (date(2026, 3, 3), 1)]
+    assert rows[1].revenue == Decimal("100.10") and rows[1].product_category_id == SHOES and rows[1].currency_code == "USD"
+
+def test_weekly_rows_recompute_ratios_from_totals():
+    rows = _cube().kpi_rows(date(2026, 3, 1), date(2026, 3, 31), bm_ids=["1"], grain="week")
+    assert [(r.date, r.revenue, r.ad_spend) for r in rows] == [
+        (date(2026, 3, 2), Decimal("200.00"), Decimal("50.00")),
+        (date(2026, 3, 9), Decimal("80.00"), Decimal("20.00")),
+    ]
+    assert rows[0].roas == 4.0 and rows[0].cpa == 25.0
+
+def test_filters_by_store_region_and_category():
+    cube = _cube()
+    assert [r.bm_id for r in cube.kpi_rows(date(2026, 3, 1), date(2026, 3, 31), master_store_ids=[str(STORE_B)])] == [2]
+    groups, revenue, _ = cube.slice(date(2026, 3, 1), date(2026, 3, 31), ("region",))
+    assert dict(zip(groups[:, 0].tolist(), revenue.tolist())) == {10: 28000, 20: 10010}
+    assert sorted(cube.category_rows(date(2026, 3, 1), date(2026, 3, 31), [str(HATS)])) == [("Hats", Decimal("280.00"), Decimal("70.00"))]
+
+def test_update_replaces_changed_days_and_slides_window():
+    cube = _cube().updated(date(2026, 3, 3), [_row(1, date(2026, 3, 3), "10.00", "5.00", HATS)], BMS, CATEGORIES, watermark=None)
+    assert cube.size == 2
+    assert cube.bm_totals(date(2026, 3, 1), date(2026, 3, 31)) == ([1], [Decimal("90.00")], [Decimal("25.00")])
+
+def _result(rows):
+    result = MagicMock()
+    result.one.return_value = rows[0]
+    result.all.return_value = rows
+    return result
+
+def test_refresh_loads_through_an_async_session():
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=[
+        _result([(None, None)]),
+        _result([_row(1, date(2026, 3, 2), "50.00", "25.00", HATS)]),
+        _result(BMS),
+        _result(list(CATEGORIES.items())),
+    ])
+    with patch.object(cube, "_cube", None), patch.object(cube, "tag_versions", return_value=[("date:2026-03-02", 4)]) as versions:
+        loaded = asyncio.run(cube.refresh(session, today=date(2026, 3, 10)))
+    assert loaded.size == 1 and loaded.bm_totals(date(2026, 3, 1), date(2026, 3, 31))[0] == [1]
+    # Versions cover the whole window and are read before any row.
+    assert versions.call_args.args[0][-1] == "date:2026-03-10" and loaded.versions == {"date:2026-03-02": 4}
+
+def test_refresher_thread_uses_the_web_async_engine():
+    app = Flask(__name__)
+    app.async_session = MagicMock()
+    with app.app_context(), patch.object(cube, "_refresher_pid", None), patch.object(cube.threading, "Thread") as thread:
+        cube._ensure_refresher()
+    assert thread.call_args.kwargs["args"] == (app.async_session,)
+
+def _fresh(versions, current, mode="native", start=date(2026, 3, 2)):
+    loaded = KPICube.from_rows(date(2026, 1, 1), [], BMS, CATEGORIES, watermark=None, versions=versions)
+    with patch.object(cube.Config, "KPI_CUBE_ENABLED", True), patch.object(cube, "_ensure_refresher"), \
+            patch.object(cube, "_cube", loaded), patch.object(cube, "tag_versions", **current):
+        return cube.fresh_cube(start, date(2026, 3, 3), mode) is loaded
+
+def test_fresh_cube_serves_while_no_day_in_range_was_bumped():
+    seen = {"date:2026-03-02": 3, "date:2026-03-03": 0}
+    assert _fresh(seen, {"return_value": list(seen.items())})
+
+def test_fresh_cube_refuses_after_a_bump_whatever_the_row_timestamps():
+    # A drain that commits rows stamped before the last refresh still bumps date:{d} after its commit.
+    seen = {"date:2026-03-02": 3, "date:2026-03-03": 0}
+    assert not _fresh(seen, {"return_value": [("date:2026-03-02", 3), ("date:2026-03-03", 1)]})
+
+def test_fresh_cube_refuses_usd_uncovered_ranges_and_redis_errors():
+    seen = {"date:2026-03-02": 3, "date:2026-03-03": 0}
+    assert not _fresh(seen, {"return_value": list(seen.items())}, mode="usd")
+    assert not _fresh(seen, {"return_value": list(seen.items())}, start=date(2025, 12, 31))
+    assert not _fresh(seen, {"side_effect": ConnectionError("down")})
@@ -0,0 +1,26 @@
+import base64
+import pytest
+from decimal import Decimal
+from sqlalchemy import Numeric, String, column
+from backend.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_requested
+
+COLUMNS = [column("spend_raw", Numeric), column("campaign_id", String)]
+
+def test_cursor_roundtrip():
+    cursor = encode_cursor([Decimal("125.50"), "cmp_1"])
+    assert decode_cursor(cursor, COLUMNS) == [Decimal("125.50"), "cmp_1"]
+
+def test_cursor_rejects_garbage():
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor", COLUMNS)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor(["cmp_1"]), COLUMNS)
+
+@pytest.mark.parametrize("raw", [b"{}", b'"cmp_1"', b'["not-a-number","cmp_1"]', b"\xff\xfe"])
+def test_cursor_rejects_well_encoded_garbage(raw):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(base64.urlsafe_b64encode(raw).decode(), COLUMNS)
+
+def test_empty_cursor_keeps_offset_paging():
+    assert not keyset_requested({"cursor": ""}) and not keyset_requested({"page": "2"})
+    assert keyset_requested({"pagination": "keyset"}) and keyset_requested({"cursor": encode_cursor([Decimal("1"), "c"])})
@@ -0,0 +1,19 @@
+from datetime import date
+from unittest.mock import MagicMock, patch
+from backend.utils import partitions
+from backend.utils.partitions import maintain, months, partition_name
+
+def test_months_cover_range_by_month_start():
+    assert list(months(date(2026, 11, 15), date(2027, 2, 1))) == [date(2026, 11, 1), date(2026, 12, 1), date(2027, 1, 1), date(2027, 2, 1)]
+    assert partition_name("fx_daily_rates", date(2027, 2, 1)) == "fx_daily_rates_p202702"
+
+@patch.object(partitions, "drop_partitions_before", return_value=["meta_daily_performance_p202408"])
+@patch.object(partitions, "ensure_partitions", return_value=["meta_daily_performance_p202701"])
+@patch.object(partitions, "is_partitioned", side_effect=lambda session, table: table == "meta_daily_performance")
+def test_maintain_window_and_unpartitioned_tables(_partitioned, ensure, drop):
+    session = MagicMock()
+    report = maintain(session, date(2026, 10, 18), months_ahead=3, retention_months=24)
+    ensure.assert_called_once_with(session, "meta_daily_performance", date(2024, 10, 1), date(2027, 1, 1))
+    drop.assert_called_once_with(session, "meta_daily_performance", date(2024, 10, 1))
+    assert report["meta_daily_performance"] == {"created": ["meta_daily_performance_p202701"], "dropped": ["meta_daily_performance_p202408"]}
+    assert report["fx_daily_rates"] is None
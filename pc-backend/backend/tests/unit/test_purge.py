@@ -0,0 +1,41 @@
+from datetime import date, timedelta
+from unittest.mock import patch
+import fakeredis
+from sqlalchemy import Column, Date, Integer, create_engine, func, select
+from sqlalchemy.orm import Session, declarative_base
+from backend.utils import purge as purge_module
+from backend.utils.purge import CHECKPOINT_PREFIX, purge
+
+Base = declarative_base()
+
+class Row(Base):
+    __tablename__ = "purge_rows"
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=False)
+
+def _session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    start = date(2024, 1, 1)
+    session.add_all([Row(id=i, date=start + timedelta(days=i)) for i in range(1, 101)])
+    session.commit()
+    return session
+
+def test_purge_deletes_in_batches_and_clears_checkpoint():
+    session, redis = _session(), fakeredis.FakeRedis(decode_responses=True)
+    with patch.object(purge_module, "purge_redis", return_value=redis):
+        report = purge(session, Row, Row.date < date(2024, 2, 10), batch_size=10, pause=0)
+    assert report["deleted"] == 39 and report["batches"] == 4 and report["complete"]
+    assert session.scalar(select(func.min(Row.date))) == date(2024, 2, 10)
+    assert redis.get(CHECKPOINT_PREFIX + "purge_rows") is None
+
+def test_purge_resumes_from_checkpoint_after_time_budget():
+    session, redis = _session(), fakeredis.FakeRedis(decode_responses=True)
+    with patch.object(purge_module, "purge_redis", return_value=redis):
+        first = purge(session, Row, Row.id <= 50, batch_size=10, pause=0, time_budget=0)
+        assert first["deleted"] == 10 and not first["complete"]
+        assert redis.get(CHECKPOINT_PREFIX + "purge_rows") == "10"
+        rest = purge(session, Row, Row.id <= 50, batch_size=10, pause=0)
+    assert rest["deleted"] == 40 and rest["complete"]
+    assert session.scalar(select(func.count(Row.id))) == 50
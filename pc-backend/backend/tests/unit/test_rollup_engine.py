@@ -0,0 +1,104 @@
+from datetime import date
+from unittest.mock import MagicMock, patch
+import fakeredis
+import pytest
+from sqlalchemy.dialects import postgresql
+from backend.tasks import rollups, tasks
+from backend.utils import rollup
+from backend.utils.cache_tags import TAG_KEY_PREFIX
+
+@pytest.fixture
+def redis():
+    r = fakeredis.FakeRedis(decode_responses=True)
+    with patch.object(rollup, "rollup_redis", return_value=r):
+        yield r
+
+def test_mark_dirty_keeps_first_score_and_bumps_tags(redis):
+    with patch.object(rollup.time, "time", return_value=100.0):
+        rollup.mark_dirty_range("bm", 7, "2026-03-01", "2026-03-02")
+    with patch.object(rollup.time, "time", return_value=200.0):
+        rollup.mark_dirty("bm", [(7, date(2026, 3, 2)), (8, date(2026, 3, 2))])
+    assert redis.zrange(rollup._dirty_key("bm"), 0, -1, withscores=True) == [
+        ("7|2026-03-01", 100.0), ("7|2026-03-02", 100.0), ("8|2026-03-02", 200.0),
+    ]
+    assert redis.get(TAG_KEY_PREFIX + "bm:7") == "2" and redis.get(TAG_KEY_PREFIX + "date:2026-03-02") == "2"
+
+def test_take_dirty_merges_keys_left_by_a_failed_drain(redis):
+    redis.zadd(rollup._draining_key("bm"), {"7|2026-03-01": 50.0})
+    redis.zadd(rollup._dirty_key("bm"), {"7|2026-03-01": 90.0, "8|2026-03-01": 95.0})
+    assert rollup._take_dirty("bm") == {("7", date(2026, 3, 1)): 50.0, ("8", date(2026, 3, 1)): 95.0}
+    assert redis.zcard(rollup._dirty_key("bm")) == 0
+
+def test_drain_derives_store_keys_and_clears_draining_sets(redis):
+    redis.zadd(rollup._dirty_key("bm"), {"7|2026-03-01": 10.0, "8|2026-03-01": 20.0, "9|2026-03-02": 30.0})
+    redis.zadd(rollup._dirty_key("store"), {"s1|2026-03-01": 40.0})
+    session = MagicMock()
+    session.execute.return_value.all.return_value = [(7, "s1"), (8, "s2")]
+    with patch.object(rollup, "recompute_kpi_snapshots") as snapshots, \
+            patch.object(rollup, "recompute_kpi_rollups") as rollups, \
+            patch.object(rollup, "recompute_master_store_summaries") as summaries, \
+            patch.object(rollup.time, "time", return_value=100.0):
+        stats = rollup.drain_dirty(session)
+    bm_keys = [("7", date(2026, 3, 1)), ("8", date(2026, 3, 1)), ("9", date(2026, 3, 2))]
+    snapshots.assert_called_once_with(session, bm_keys)
+    rollups.assert_called_once_with(session, bm_keys)
+    # BM 9 has no master store; s1 keeps the earlier of its own score and BM 7's.
+    summaries.assert_called_once_with(session, [("s1", date(2026, 3, 1)), ("s2", date(2026, 3, 1))])
+    session.commit.assert_called_once()
+    assert stats["bm:keys"] == 3 and stats["bm:latency"] == 90.0 and stats["store:latency"] == 90.0
+    assert not redis.exists(rollup._draining_key("bm"), rollup._draining_key("store"))
+
+def test_drain_chunks_by_batch_size(redis):
+    redis.zadd(rollup._dirty_key("bm"), {f"{i}|2026-03-01": 1.0 for i in range(1, 6)})
+    session = MagicMock()
+    session.execute.return_value.all.return_value = []
+    with patch.object(rollup.Config, "ROLLUP_DRAIN_BATCH_SIZE", 2), \
+            patch.object(rollup, "recompute_kpi_snapshots") as snapshots, \
+            patch.object(rollup, "recompute_kpi_rollups"), \
+            patch.object(rollup, "recompute_master_store_summaries"):
+        rollup.drain_dirty(session)
+    assert [len(call.args[1]) for call in snapshots.call_args_list] == [2, 2, 1]
+
+def test_collector_reads_status_once_per_scrape():
+    status = {kind: {"backlog": 3, "oldest_age_seconds": 1.5, "last_drain_latency_seconds": 2.0} for kind in rollup.KINDS}
+    with patch.object(rollup, "rollup_status", return_value=status) as read:
+        families = rollup.RollupCollector().collect()
+    read.assert_called_once()
+    samples = {(f.name, s.labels["kind"]): s.value for f in families for s in f.samples}
+    assert samples[("rollup_dirty_keys", "bm")] == 3 and samples[("rollup_drain_latency_seconds", "store")] == 2.0
+
+def test_rollup_rebuild_locks_each_period_before_deleting():
+    session = MagicMock()
+    rollup.recompute_kpi_rollups(session, [(8, date(2026, 3, 3)), (7, date(2026, 3, 2))])
+    statements = [str(call.args[0].compile(dialect=postgresql.dialect())) for call in session.execute.call_args_list]
+    assert [s.split()[0] for s in statements] == ["SELECT", "DELETE", "INSERT"] * 2
+    assert "pg_advisory_xact_lock" in statements[0] and "ORDER BY dirty_keys.id, dirty_keys.date" in statements[0]
+
+def test_single_key_snapshot_task_bumps_cache_tags():
+    session = MagicMock()
+    with patch.object(tasks, "get_worker_session") as worker_session, \
+            patch.object(tasks, "recompute_kpi_snapshots"), patch.object(tasks, "recompute_kpi_rollups"), \
+            patch.object(tasks, "bump_cache_tags") as bump:
+        worker_session.return_value.__enter__.return_value = session
+        tasks.upsert_kpi_daily_snapshot.run(7, "2026-03-02")
+    session.commit.assert_called_once()
+    bump.assert_called_once_with("bm", [(7, date(2026, 3, 2))])
+
+def test_drain_lock_is_released_only_by_its_holder(redis):
+    token = rollup.acquire_drain_lock()
+    assert token and rollup.acquire_drain_lock() is None
+    assert 0 < redis.ttl(rollup.DRAIN_LOCK_KEY) <= rollup.Config.ROLLUP_DRAIN_LOCK_SECONDS
+    client = MagicMock()
+    with patch.object(rollup, "rollup_redis", return_value=client):
+        rollup.release_drain_lock(token)
+    client.eval.assert_called_once_with(rollup.RELEASE_LOCK_SCRIPT, 1, rollup.DRAIN_LOCK_KEY, token)
+    assert "== ARGV[1]" in rollup.RELEASE_LOCK_SCRIPT
+
+def test_drain_task_releases_with_its_own_token():
+    with patch.object(rollups, "acquire_drain_lock", return_value="t1"), patch.object(rollups, "release_drain_lock") as release, \
+            patch.object(rollups, "get_worker_session"), patch.object(rollups, "drain_dirty", return_value={"bm:keys": 0}):
+        assert rollups.drain_rollups.run() == {"bm:keys": 0}
+    release.assert_called_once_with("t1")
+    with patch.object(rollups, "acquire_drain_lock", return_value=None), patch.object(rollups, "drain_dirty") as drain:
+        assert rollups.drain_rollups.run() is None
+    drain.assert_not_called()
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+from backend.utils.rollup import auto_grain, split_range
+
+def _days(periods):
+    # Every day each period covers, to check the pieces tile the range exactly.
+    days = []
+    for grain, starts in periods.items():
+        for start in starts:
+            if grain == "day":
+                days.append(start)
+            elif grain == "week":
+                days.extend(start + timedelta(days=i) for i in range(7))
+            else:
+                day = start
+                while day.month == start.month:
+                    days.append(day)
+                    day += timedelta(days=1)
+    return sorted(days)
+
+def test_split_range_uses_whole_months_then_weeks_then_days():
+    periods = split_range(date(2026, 1, 12), date(2026, 4, 15))
+    assert periods["month"] == [date(2026, 2, 1), date(2026, 3, 1)]
+    assert periods["week"] == [date(2026, 1, 12), date(2026, 1, 19), date(2026, 4, 6)]
+    # Jan 26 starts a week that ends in February, so its January days are read one by one.
+    assert periods["day"] == [date(2026, 1, d) for d in range(26, 32)] + [date(2026, 4, d) for d in (1, 2, 3, 4, 5, 13, 14, 15)]
+
+def test_split_range_tiles_the_range_without_crossing_months():
+    start, end = date(2025, 10, 18), date(2026, 10, 17)
+    periods = split_range(start, end)
+    assert _days(periods) == [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    for monday in periods["week"]:
+        assert (monday + timedelta(days=6)).month == monday.month
+    assert sum(len(starts) for starts in periods.values()) < 40
+
+def test_split_range_respects_coarsest_grain():
+    assert set(split_range(date(2026, 1, 1), date(2026, 3, 31), "week")) == {"week", "day"}
+    assert split_range(date(2026, 1, 5), date(2026, 1, 11), "day") == {"day": [date(2026, 1, 5) + timedelta(days=i) for i in range(7)]}
+
+def test_auto_grain_by_range_length():
+    assert auto_grain(date(2026, 1, 1), date(2026, 1, 31)) == "day"
+    assert auto_grain(date(2026, 1, 1), date(2026, 3, 1)) == "week"
+    assert auto_grain(date(2025, 1, 1), date(2025, 12, 31)) == "month"
@@ -0,0 +1,17 @@
+import uuid
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from backend.models.core import MetaTokenStatus
+from backend.utils.row_codec import decode_rows, encode_rows
+
+Row = namedtuple("Row", "bm_id day revenue store status refreshed_at")
+
+def test_rows_roundtrip_with_types():
+    rows = [Row(1, date(2026, 1, 1), Decimal("10.25"), uuid.UUID(int=7), list(MetaTokenStatus)[0], datetime(2026, 1, 1, 12, 30))]
+    decoded = decode_rows(encode_rows(rows))
+    assert decoded[0]._asdict() == {**rows[0]._asdict(), "status": list(MetaTokenStatus)[0].value}
+    assert isinstance(decoded[0].revenue, Decimal)
+
+def test_empty_rows():
+    assert decode_rows(encode_rows([])) == []
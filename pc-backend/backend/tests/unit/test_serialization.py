@@ -0,0 +1,32 @@
+import uuid
+from collections import namedtuple
+from datetime import date, datetime, timezone
+from decimal import Decimal
+import orjson
+from flask import Flask
+from backend.utils.serialization import dumps, rows_payload
+
+Row = namedtuple("Row", "date revenue store")
+ROWS = [Row(date(2026, 1, 1), Decimal("10.50"), uuid.UUID(int=1)), Row(date(2026, 1, 2), Decimal("3"), None)]
+
+def test_rows_serialize_like_jsonify():
+    payload = rows_payload(ROWS)
+    assert orjson.loads(dumps(payload)) == [
+        {"date": "Thu, 01 Jan 2026 00:00:00 GMT", "revenue": "10.50", "store": str(uuid.UUID(int=1))},
+        {"date": "Fri, 02 Jan 2026 00:00:00 GMT", "revenue": "3", "store": None},
+    ]
+    app = Flask(__name__)
+    with app.app_context():
+        assert orjson.loads(dumps(payload)) == orjson.loads(app.json.dumps(payload))
+
+def test_datetimes_match_jsonify():
+    stamp = datetime(2026, 1, 1, 12, 30, tzinfo=timezone.utc)
+    with Flask(__name__).app_context() as ctx:
+        assert orjson.loads(dumps({"at": stamp})) == orjson.loads(ctx.app.json.dumps({"at": stamp}))
+
+def test_columnar_shape():
+    assert orjson.loads(dumps(rows_payload(ROWS, "columns"))) == {
+        "columns": ["date", "revenue", "store"],
+        "data": [["Thu, 01 Jan 2026 00:00:00 GMT", "10.50", str(uuid.UUID(int=1))], ["Fri, 02 Jan 2026 00:00:00 GMT", "3", None]],
+    }
+    assert rows_payload([], "columns") == {"columns": [], "data": []}
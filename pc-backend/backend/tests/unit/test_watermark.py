@@ -0,0 +1,32 @@
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+import fakeredis
+from backend.services.kpi import KPI_WATERMARK
+from backend.utils import cache_tags, watermark
+from backend.utils.cache_tags import bump_tags, fx_tags
+from backend.utils.watermark import Tag, data_watermark
+
+def _session(latest):
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=MagicMock(scalar=MagicMock(return_value=latest)))
+    return session
+
+def test_kpi_watermark_tracks_fx_by_tag_version():
+    assert [c for c in KPI_WATERMARK if isinstance(c, Tag)] == fx_tags()
+
+def test_fx_delete_moves_the_watermark_without_any_new_timestamp():
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    latest = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    with patch.object(cache_tags, "tags_redis", return_value=redis), patch.object(cache_tags, "_versions", {}):
+        before = asyncio.run(data_watermark(_session(latest), KPI_WATERMARK))
+        # What delete_fx_rate, the purge and partition drops do after removing rates.
+        bump_tags(fx_tags())
+        after = asyncio.run(data_watermark(_session(latest), KPI_WATERMARK))
+    assert before == "2026-03-01T00:00:00+00:00|fx:*=0"
+    assert after == "2026-03-01T00:00:00+00:00|fx:*=1"
+
+def test_columns_only_watermark_unchanged():
+    with patch.object(watermark, "tag_versions") as versions:
+        assert asyncio.run(data_watermark(_session(None), KPI_WATERMARK[:2])) is None
+    versions.assert_not_called()
@@ -0,0 +1,133 @@
+import atexit
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from redis import Redis
+from sqlalchemy import bindparam, func, update
+from backend.config import Config
+from backend.models.security import ApiKey
+
+VERIFIED_PREFIX = "ak_ok:"
+REVOKE_CHANNEL = "ak:revoke"
+USAGE_KEY = "ak:last_used"
+USAGE_DRAINING_KEY = "ak:last_used:draining"
+
+_redis = None
+_verified = {}  # key_id -> (digest, scopes, valid_until)
+_verified_lock = threading.Lock()
+_listener_pid = None
+_usage = {}  # key_id -> latest use (epoch seconds) not yet pushed to Redis
+_usage_lock = threading.Lock()
+_usage_pushed = 0.0
+
+def keys_redis():
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(Config.REDIS_URL, decode_responses=True)
+    return _redis
+
+def epoch(value):
+    # Stored expiries are a mix of aware (from the DB) and naive UTC (from the admin API).
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def secret_digest(key_id, secret):
+    # Keyed with API_KEY_HMAC_KEY, so a Redis dump is not a list of usable secrets or an offline-guessable hash.
+    return hmac.new(Config.API_KEY_HMAC_KEY.encode(), f"{key_id}.{secret}".encode(), hashlib.sha256).hexdigest()
+
+def _forget(key_id):
+    with _verified_lock:
+        _verified.pop(key_id, None)
+
+def _ensure_listener(redis):
+    # One subscriber per worker process; started lazily so it survives gunicorn's fork.
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    _listener_pid = os.getpid()
+    pubsub = redis.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{REVOKE_CHANNEL: lambda message: _forget(message["data"])})
+    pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+def cached_scopes(key_id, secret):
+    """Scopes of a key whose secret was verified recently, or None when bcrypt has to run."""
+    redis = keys_redis()
+    _ensure_listener(redis)
+    with _verified_lock:
+        entry = _verified.get(key_id)
+    if entry is None:
+        blob = redis.get(VERIFIED_PREFIX + key_id)
+        if blob is None:
+            return None
+        entry = tuple(json.loads(blob))
+        with _verified_lock:
+            _verified[key_id] = entry
+    digest, scopes, valid_until = entry
+    if valid_until <= time.time() or not hmac.compare_digest(digest, secret_digest(key_id, secret)):
+        return None
+    return scopes
+
+def remember_verified(key_id, secret, scopes, valid_until):
+    # Bounded by the key's own expiry and by API_KEY_VERIFY_TTL, so a missed revocation message cannot outlive it.
+    valid_until = min(valid_until, time.time() + Config.API_KEY_VERIFY_TTL)
+    ttl = int(valid_until - time.time())
+    if ttl <= 0:
+        return
+    entry = (secret_digest(key_id, secret), list(scopes or []), valid_until)
+    with _verified_lock:
+        _verified[key_id] = entry
+    keys_redis().setex(VERIFIED_PREFIX + key_id, ttl, json.dumps(entry))
+
+def revoke_verified(key_id, redis=None):
+    """Drop a key's verified secret everywhere; every worker's in-process copy goes via pub/sub."""
+    redis = redis or keys_redis()
+    redis.delete(VERIFIED_PREFIX + key_id)
+    redis.publish(REVOKE_CHANNEL, key_id)
+    _forget(key_id)
+
+def push_usage():
+    global _usage_pushed
+    with _usage_lock:
+        pending = dict(_usage)
+        _usage.clear()
+        _usage_pushed = time.time()
+    if pending:
+        # GT keeps the latest use when several workers report the same key.
+        keys_redis().zadd(USAGE_KEY, pending, gt=True)
+
+def record_use(key_id):
+    """Buffer last_used_at in process; pushed to Redis at most every API_KEY_USAGE_FLUSH_SECONDS."""
+    now = time.time()
+    with _usage_lock:
+        _usage[key_id] = now
+        due = now - _usage_pushed >= Config.API_KEY_USAGE_FLUSH_SECONDS
+    if due:
+        push_usage()
+
+atexit.register(push_usage)
+
+def flush_usage(session):
+    """Write buffered uses to api_keys.last_used_at in one statement; returns the number of keys updated."""
+    r = keys_redis()
+    with r.pipeline() as pipe:
+        # Uses left in the draining set by a failed flush are merged back in.
+        pipe.zunionstore(USAGE_DRAINING_KEY, [USAGE_DRAINING_KEY, USAGE_KEY], aggregate="MAX")
+        pipe.delete(USAGE_KEY)
+        pipe.zrange(USAGE_DRAINING_KEY, 0, -1, withscores=True)
+        used = pipe.execute()[-1]
+    if used:
+        table = ApiKey.__table__
+        session.execute(
+            update(table)
+            .where(table.c.key_id == bindparam("b_key_id"))
+            .values(last_used_at=func.greatest(table.c.last_used_at, bindparam("b_used_at"))),
+            [{"b_key_id": k, "b_used_at": datetime.fromtimestamp(ts, timezone.utc)} for k, ts in used],
+        )
+        session.commit()
+    r.delete(USAGE_DRAINING_KEY)
+    return len(used)
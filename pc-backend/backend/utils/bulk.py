@@ -0,0 +1,30 @@
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+def chunked(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(rows)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+def dedupe_rows(rows: Iterable[Dict[str, Any]], key_columns: Sequence[str]) -> List[Dict[str, Any]]:
+    # ON CONFLICT DO UPDATE cannot touch the same row twice in one statement; last write wins.
+    unique = {}
+    for row in rows:
+        unique[tuple(row[c] for c in key_columns)] = row
+    return list(unique.values())
+
+def bulk_upsert(session, model, rows: Iterable[Dict[str, Any]], key_columns: Sequence[str], chunk_size: int) -> List[Dict[str, int]]:
+    report = []
+    for n, chunk in enumerate(chunked(dedupe_rows(rows, key_columns), chunk_size)):
+        stmt = pg_insert(model).values(chunk)
+        set_ = {c: stmt.excluded[c] for c in chunk[0] if c not in key_columns}
+        if "updated_at" in model.__table__.c:
+            # ON CONFLICT bypasses the ORM onupdate, and the data watermarks read updated_at.
+            set_["updated_at"] = func.now()
+        stmt = stmt.on_conflict_do_update(index_elements=list(key_columns), set_=set_).returning(literal_column("(xmax = 0)").label("inserted"))
+        flags = session.execute(stmt).scalars().all()
+        inserted = sum(1 for f in flags if f)
+        report.append({"chunk": n, "rows": len(flags), "inserted": inserted, "updated": len(flags) - inserted})
+    return report
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import date, timedelta
+from redis import Redis
+from backend.config import Config
+
+TAG_KEY_PREFIX = "cache:tag:"
+TAGS_CHANNEL = "cache:tags"
+# A bump of bm:{id} or store:{id} also bumps the wildcard, which unfiltered queries depend on.
+WILDCARDS = ("bm", "store")
+
+_redis = None
+_versions = {}  # tag -> (version, fetched_at)
+_moved = {}  # tag -> when this process last saw its version move forward
+_versions_lock = threading.Lock()
+
+def tags_redis():
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(Config.REDIS_URL, decode_responses=True)
+    return _redis
+
+def _days(start, end):
+    day, end = date.fromisoformat(str(start)), date.fromisoformat(str(end))
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+def bm_tags(bm_ids=None):
+    return [f"bm:{i}" for i in bm_ids] if bm_ids else ["bm:*"]
+
+def store_tags(store_ids=None):
+    return [f"store:{i}" for i in store_ids] if store_ids else ["store:*"]
+
+def date_tags(start, end):
+    return [f"date:{d}" for d in _days(start, end)]
+
+def fx_tags():
+    # Rates are forward-filled, so one write can move every later day's conversion up to the next rate of
+    # that currency; a single version covers them all. FX writes are daily, about as often as entries expire.
+    return ["fx:*"]
+
+def range_tags(start, end, mode="native"):
+    # Day-keyed data: any write under a BM or store on day d bumps date:{d}, so filters need no tags of their own.
+    return date_tags(start, end) + (fx_tags() if mode == "usd" else [])
+
+def _expand(tags):
+    expanded = set(tags)
+    for tag in tags:
+        kind, _, _ = tag.partition(":")
+        if kind in WILDCARDS:
+            expanded.add(f"{kind}:*")
+    return sorted(expanded)
+
+def apply_versions(versions):
+    now = time.monotonic()
+    with _versions_lock:
+        for tag, version in versions.items():
+            if tag in _versions and int(version) > _versions[tag][0]:
+                _moved[tag] = now
+            _versions[tag] = (int(version), now)
+
+def recently_bumped(tags, window):
+    cutoff = time.monotonic() - window
+    with _versions_lock:
+        return any(_moved.get(t, 0) > cutoff for t in tags)
+
+def tag_versions(tags, redis=None):
+    """Current version of each tag. Recently read versions come from process memory, kept current by pub/sub."""
+    tags = sorted(set(tags))
+    now = time.monotonic()
+    with _versions_lock:
+        known = {t: v for t in tags if (v := _versions.get(t)) and now - v[1] < Config.CACHE_TAG_VERSION_TTL}
+    missing = [t for t in tags if t not in known]
+    if missing:
+        fetched = dict(zip(missing, (int(v or 0) for v in (redis or tags_redis()).mget([TAG_KEY_PREFIX + t for t in missing]))))
+        apply_versions(fetched)
+        known.update({t: (v, now) for t, v in fetched.items()})
+    return [(t, known[t][0]) for t in tags]
+
+def tags_fingerprint(tags, redis=None):
+    return hashlib.md5(json.dumps(tag_versions(tags, redis)).encode()).hexdigest()
+
+def bump_tags(tags, redis=None):
+    """Invalidate every cache entry keyed on any of these tags by moving their versions forward."""
+    tags = _expand(tags)
+    if not tags:
+        return {}
+    redis = redis or tags_redis()
+    with redis.pipeline() as pipe:
+        for tag in tags:
+            pipe.incr(TAG_KEY_PREFIX + tag)
+        versions = dict(zip(tags, pipe.execute()))
+    apply_versions(versions)
+    redis.publish(TAGS_CHANNEL, json.dumps(versions))
+    return versions
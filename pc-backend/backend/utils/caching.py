@@ -1,27 +1,364 @@
-import json
+import asyncio
 import hashlib
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
 from functools import wraps
+from prometheus_client import Counter
+from redis import Redis
 from redis.exceptions import ConnectionError
-from flask import current_app, jsonify
+from flask import copy_current_request_context, current_app, has_request_context
+from backend.config import Config
+from backend.utils.cache_tags import TAGS_CHANNEL, apply_versions, recently_bumped, tags_fingerprint, tags_redis
+from backend.utils.compression import compress, decompress, negotiate
+from backend.utils.db import replica_staleness_bound
+from backend.utils.row_codec import decode_rows, encode_rows
+
+logger = logging.getLogger(__name__)
+
+INVALIDATE_CHANNEL = "cache:invalidate"
+
+CACHE_REQUESTS = Counter("cache_requests_total", "redis_cached and cached_rows lookups by outcome", ["fn", "result"])
+
+# fresh_until is the soft expiry (epoch seconds); delta is how long the last recompute took;
+# encoding is the Content-Encoding body is stored in ("" for identity).
+Entry = namedtuple("Entry", "status body fresh_until delta encoding", defaults=("",))
+
+class LocalCache:
+    """Per-process LRU of pre-serialized responses, bounded by total body bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (expires_at, Entry)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, entry, ttl):
+        if ttl <= 0 or len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + ttl, entry)
+            self.size += len(entry.body)
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def invalidate(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._pop(key)
+
+    def _pop(self, key):
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self.size -= len(item[1].body)
+
+local_cache = LocalCache(Config.CACHE_L1_MAX_BYTES)
+_listener_pid = None
+_binary_redis = None
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def _ensure_listener(redis):
+    # One subscriber per worker process; started lazily so it survives gunicorn's fork.
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    _listener_pid = os.getpid()
+    pubsub = redis.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{
+        INVALIDATE_CHANNEL: lambda message: local_cache.invalidate(message["data"]),
+        TAGS_CHANNEL: lambda message: apply_versions(json.loads(message["data"])),
+    })
+    pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+def invalidate(prefix, redis=None):
+    """Drop every cached entry whose key starts with prefix, in Redis and in every worker's L1."""
+    redis = redis or current_app.redis
+    local_cache.invalidate(prefix)
+    keys = list(redis.scan_iter(match=f"{prefix}*", count=500))
+    if keys:
+        redis.delete(*keys)
+    redis.publish(INVALIDATE_CHANNEL, prefix)
+
+def binary_redis():
+    # Cached bodies are compressed or msgpack bytes, which the app's decode_responses client cannot read back.
+    global _binary_redis
+    if _binary_redis is None:
+        _binary_redis = Redis.from_url(Config.REDIS_URL)
+    return _binary_redis
+
+def _response(entry):
+    response = current_app.response_class(entry.body, status=entry.status, mimetype="application/json")
+    if entry.encoding:
+        response.vary.add("Accept-Encoding")
+        if negotiate([entry.encoding]):
+            # Stored pre-compressed: a hit that the client can take as-is costs no compression CPU.
+            response.headers["Content-Encoding"] = entry.encoding
+        else:
+            response.set_data(decompress(entry.body, entry.encoding))
+    return response
+
+def _encode(entry):
+    # "<status>|<fresh_until>|<delta>|<encoding>|<body>": a Redis hit is a split, not a JSON parse.
+    return f"{entry.status}|{entry.fresh_until}|{entry.delta}|{entry.encoding}|".encode() + entry.body
+
+def _decode(blob):
+    status, fresh_until, delta, encoding, body = blob.split(b"|", 4)
+    return Entry(int(status), body, float(fresh_until), float(delta), encoding.decode())
+
+def _load(key):
+    if (entry := local_cache.get(key)) is not None:
+        return entry
+    try:
+        _ensure_listener(tags_redis())
+        with binary_redis().pipeline() as pipe:
+            blob, ttl = pipe.get(key).ttl(key).execute()
+    except ConnectionError:
+        logger.warning("Redis down – bypassing cache.")
+        return None
+    if not blob:
+        return None
+    entry = _decode(blob)
+    local_cache.set(key, entry, ttl)
+    return entry
+
+def _store(key, entry, ttl):
+    local_cache.set(key, entry, ttl)
+    try:
+        binary_redis().setex(key, ttl, _encode(entry))
+    except ConnectionError:
+        pass
+
+def _should_refresh(entry, beta):
+    # Probabilistic early expiration (XFetch): the closer to fresh_until and the slower the
+    # recompute, the likelier one caller refreshes ahead of time, so keys never expire in unison.
+    now = time.time()
+    return now >= entry.fresh_until or now - entry.delta * beta * math.log(1.0 - random.random()) >= entry.fresh_until
+
+def _acquire(key):
+    try:
+        return bool(binary_redis().set(f"{key}:lock", os.getpid(), nx=True, ex=Config.CACHE_LOCK_SECONDS))
+    except ConnectionError:
+        return True
+
+def _release(key):
+    try:
+        binary_redis().delete(f"{key}:lock")
+    except ConnectionError:
+        pass
+
+def _compute(key, fn, a, kw, timeout, grace):
+    started = time.time()
+    rv = current_app.make_response(fn(*a, **kw))
+    body = rv.get_data()
+    entry = Entry(rv.status_code, body, 0.0, time.time() - started)
+    if rv.status_code < 300:
+        if len(body) >= Config.COMPRESS_MIN_SIZE:
+            # Compressed once per recompute with the strongest codec, not once per hit.
+            entry = entry._replace(body=compress(body, Config.CACHE_COMPRESSION), encoding=Config.CACHE_COMPRESSION)
+        entry = entry._replace(fresh_until=time.time() + timeout)
+        _store(key, entry, timeout + grace)
+    return entry
+
+def _wait_for_peer(key):
+    # Another worker holds the recompute lock: poll for its result rather than running the query too.
+    deadline = time.monotonic() + Config.CACHE_LOCK_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(Config.CACHE_LOCK_POLL_SECONDS)
+        if (entry := _load(key)) is not None and entry.fresh_until > time.time():
+            return entry
+    return None
+
+def redis_cached(timeout=300, grace=None, beta=1.0, tags=None):
+    """Cache a JSON view for timeout seconds.
+
+    tags, if given, is called with the view's arguments and returns the cache tags (bm:{id}, date:{d}, ...)
+    the result depends on. Their versions are part of the key, so bump_tags() retires the entry at once
+    and tagged views can use long timeouts.
+
+    Expired entries are kept for a further grace seconds and served stale while one worker refreshes
+    them in the background. Misses are single-flight: one computation per key across the cluster
+    (Redis lock) and per process (shared in-flight future).
+    """
+    grace = Config.CACHE_STALE_GRACE_SECONDS if grace is None else grace
 
-def redis_cached(timeout=300):
     def decorator(fn):
+        def refresh(app, key, a, kw):
+            with app.app_context():
+                try:
+                    _compute(key, fn, a, kw, timeout, grace)
+                except Exception:
+                    app.logger.exception("Background cache refresh failed for %s", key)
+                finally:
+                    _release(key)
+
         @wraps(fn)
         def inner(*a, **kw):
             key = f"cache:{fn.__name__}:{hashlib.md5(str((a,kw)).encode()).hexdigest()}"
+            if tags is not None:
+                try:
+                    key = f"{key}:{tags_fingerprint(tags(*a, **kw), current_app.redis)}"
+                except ConnectionError:
+                    current_app.logger.warning("Redis down – bypassing cache.")
+                    return fn(*a, **kw)
+            entry = _load(key)
+            if entry is not None:
+                if not _should_refresh(entry, beta):
+                    CACHE_REQUESTS.labels(fn.__name__, "hit").inc()
+                    return _response(entry)
+                # Still within timeout + grace (or picked for early refresh): serve it, refresh behind it.
+                if _acquire(key):
+                    task = copy_current_request_context(refresh) if has_request_context() else refresh
+                    threading.Thread(target=task, args=(current_app._get_current_object(), key, a, kw), daemon=True).start()
+                CACHE_REQUESTS.labels(fn.__name__, "stale").inc()
+                return _response(entry)
+
+            with _inflight_lock:
+                future = _inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = _inflight[key] = Future()
+            if not leader:
+                CACHE_REQUESTS.labels(fn.__name__, "coalesced").inc()
+                return _response(future.result(timeout=Config.CACHE_LOCK_SECONDS))
+
+            try:
+                acquired = _acquire(key)
+                if not acquired and (entry := _wait_for_peer(key)) is not None:
+                    CACHE_REQUESTS.labels(fn.__name__, "coalesced").inc()
+                else:
+                    CACHE_REQUESTS.labels(fn.__name__, "miss").inc()
+                    try:
+                        entry = _compute(key, fn, a, kw, timeout, grace)
+                    finally:
+                        if acquired:
+                            _release(key)
+                future.set_result(entry)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with _inflight_lock:
+                    _inflight.pop(key, None)
+            return _response(entry)
+        return inner
+    return decorator
+
+
+def _rows(entry, one):
+    rows = decode_rows(entry.body)
+    return (rows[0] if rows else None) if one else rows
+
+async def _wait_for_peer_async(key):
+    deadline = time.monotonic() + Config.CACHE_LOCK_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(Config.CACHE_LOCK_POLL_SECONDS)
+        if (entry := _load(key)) is not None and entry.fresh_until > time.time():
+            return entry
+    return None
+
+def cached_rows(timeout=None, tags=None, one=False, grace=None, beta=1.0):
+    """Cache an async service function's rows, keyed on its arguments (the session excluded).
+
+    Rows are stored msgpack-encoded with Decimal, date and UUID intact and come back as namedtuples,
+    so a JSON view and an export calling the service with the same arguments share one entry.
+    tags works as for redis_cached; one=True caches a single row (or None) instead of a list.
+
+    Entries go through the same L1, XFetch and single-flight machinery as redis_cached. The refresh of an
+    expiring entry runs in the caller that wins the recompute lock, on its own session, while every other
+    caller keeps getting the old rows for up to grace seconds.
+    """
+    timeout = Config.CACHE_TAGGED_TIMEOUT if timeout is None else timeout
+    grace = Config.CACHE_STALE_GRACE_SECONDS if grace is None else grace
+
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__name__}"
+
+        async def compute(session, key, a, kw, tag_list):
+            started = time.time()
+            result = await fn(session, *a, **kw)
+            if one:
+                result = [] if result is None else [result]
+            ttl, keep = timeout, grace
+            if session.info.get("replica") and recently_bumped(tag_list, replica_staleness_bound()):
+                # The replica may not have replayed the write behind the new tag version yet; don't pin its answer to it.
+                ttl, keep = min(timeout, max(int(replica_staleness_bound()), 1)), 0
+            entry = Entry(200, encode_rows(result), time.time() + ttl, time.time() - started)
+            _store(key, entry, ttl + keep)
+            return entry
+
+        @wraps(fn)
+        async def inner(session, *a, **kw):
+            key = f"cache:rows:v2:{name}:{hashlib.md5(repr((a, sorted(kw.items()))).encode()).hexdigest()}"
+            tag_list = tags(*a, **kw) if tags is not None else []
             try:
-                if (blob := current_app.redis.get(key)):
-                    cached = json.loads(blob)
-                    return jsonify(cached["body"]), cached["code"]
+                if tags is not None:
+                    key = f"{key}:{tags_fingerprint(tag_list)}"
             except ConnectionError:
-                current_app.logger.warning("Redis down – bypassing cache.")
-            rv = fn(*a, **kw)
-            if rv.status_code < 300:
+                return await fn(session, *a, **kw)
+            entry = _load(key)
+            if entry is not None:
+                if not _should_refresh(entry, beta):
+                    CACHE_REQUESTS.labels(fn.__name__, "hit").inc()
+                    return _rows(entry, one)
+                if not _acquire(key):
+                    CACHE_REQUESTS.labels(fn.__name__, "stale").inc()
+                    return _rows(entry, one)
+                CACHE_REQUESTS.labels(fn.__name__, "refresh").inc()
                 try:
-                    payload = {"code": rv.status_code, "body": rv.get_json()}
-                    current_app.redis.setex(key, timeout, json.dumps(payload))
-                except ConnectionError:
-                    pass
-            return rv
+                    entry = await compute(session, key, a, kw, tag_list)
+                except Exception:
+                    logger.exception("Cache refresh failed for %s; serving the previous rows", key)
+                finally:
+                    _release(key)
+                return _rows(entry, one)
+
+            with _inflight_lock:
+                future = _inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = _inflight[key] = Future()
+            if not leader:
+                CACHE_REQUESTS.labels(fn.__name__, "coalesced").inc()
+                return _rows(await asyncio.wait_for(asyncio.wrap_future(future), Config.CACHE_LOCK_SECONDS), one)
+
+            try:
+                acquired = _acquire(key)
+                if not acquired and (entry := await _wait_for_peer_async(key)) is not None:
+                    CACHE_REQUESTS.labels(fn.__name__, "coalesced").inc()
+                else:
+                    CACHE_REQUESTS.labels(fn.__name__, "miss").inc()
+                    try:
+                        entry = await compute(session, key, a, kw, tag_list)
+                    finally:
+                        if acquired:
+                            _release(key)
+                future.set_result(entry)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with _inflight_lock:
+                    _inflight.pop(key, None)
+            # Misses hand back decoded rows too, so callers never see two row shapes.
+            return _rows(entry, one)
         return inner
-    return decorator
\ No newline at end of file
+    return decorator
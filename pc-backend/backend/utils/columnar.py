@@ -0,0 +1,89 @@
+import csv
+import enum
+import io
+import uuid
+from decimal import Decimal
+from typing import Any, AsyncIterable, BinaryIO, Callable, List, Sequence
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import types as sqltypes
+
+MIMETYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+# Computed numerics (sums, FX products, averages) carry no reliable scale, so every decimal gets at least this one.
+DECIMAL_SCALE = 6
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+def arrow_field(col) -> pa.Field:
+    t = col.type
+    if isinstance(t, sqltypes.Boolean):
+        return pa.field(col.key, pa.bool_())
+    if isinstance(t, sqltypes.Float):
+        return pa.field(col.key, pa.float64())
+    if isinstance(t, sqltypes.Numeric):
+        return pa.field(col.key, pa.decimal128(38, max(t.scale or 0, DECIMAL_SCALE)))
+    if isinstance(t, sqltypes.Integer):
+        return pa.field(col.key, pa.int64())
+    if isinstance(t, sqltypes.DateTime):
+        return pa.field(col.key, pa.timestamp("us", tz="UTC" if t.timezone else None))
+    if isinstance(t, sqltypes.Date):
+        return pa.field(col.key, pa.date32())
+    # UUIDs, enums, strings and anything untyped are written as text.
+    return pa.field(col.key, pa.string())
+
+def _converter(field: pa.Field) -> Callable[[Any], Any]:
+    t = field.type
+    if pa.types.is_decimal(t):
+        quantum = Decimal(1).scaleb(-t.scale)
+        return lambda v: None if v is None else Decimal(v).quantize(quantum)
+    if pa.types.is_floating(t):
+        return lambda v: None if v is None else float(v)
+    if pa.types.is_integer(t):
+        return lambda v: None if v is None else int(v)
+    if pa.types.is_string(t):
+        return lambda v: None if v is None else str(_plain(v))
+    return lambda v: v
+
+def arrow_schema(columns) -> pa.Schema:
+    return pa.schema([arrow_field(c) for c in columns])
+
+def record_batch(schema: pa.Schema, rows: Sequence[Sequence[Any]], converters: List[Callable[[Any], Any]]) -> pa.RecordBatch:
+    values = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = [pa.array([conv(v) for v in col], type=f.type) for col, f, conv in zip(values, schema, converters)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+async def write_csv(batches: AsyncIterable[Sequence[Sequence[Any]]], columns, fileobj: BinaryIO) -> None:
+    text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow([c.key for c in columns])
+    async for rows in batches:
+        writer.writerows([_plain(v) for v in row] for row in rows)
+    text.flush()
+    text.detach()
+
+async def write_arrow(batches: AsyncIterable[Sequence[Sequence[Any]]], columns, fileobj: BinaryIO, fmt: str) -> None:
+    # One RecordBatch per cursor partition: memory is bounded by EXPORT_YIELD_PER, not the result size.
+    schema = arrow_schema(columns)
+    converters = [_converter(f) for f in schema]
+    writer = pq.ParquetWriter(fileobj, schema) if fmt == "parquet" else pa.ipc.new_file(fileobj, schema)
+    try:
+        async for rows in batches:
+            writer.write_batch(record_batch(schema, rows, converters))
+    finally:
+        writer.close()
+
+async def write_columnar(batches: AsyncIterable[Sequence[Sequence[Any]]], columns, fmt: str, fileobj: BinaryIO) -> None:
+    if fmt == "csv":
+        await write_csv(batches, columns, fileobj)
+    else:
+        await write_arrow(batches, columns, fileobj, fmt)
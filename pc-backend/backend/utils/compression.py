@@ -0,0 +1,77 @@
+import gzip
+import zlib
+import brotli
+import zstandard
+from flask import request
+from backend.config import Config
+
+COMPRESSIBLE = ("application/json", "text/csv", "text/plain", "text/html", "application/vnd.apache.arrow.file")
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=Config.COMPRESS_BROTLI_QUALITY)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=Config.COMPRESS_ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=Config.COMPRESS_GZIP_LEVEL)
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.decompress(data)
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def _stream_compressor(encoding):
+    # (compress, finish) pair for one response body fed in chunks.
+    if encoding == "br":
+        c = brotli.Compressor(quality=Config.COMPRESS_STREAM_BROTLI_QUALITY)
+        return c.process, c.finish
+    if encoding == "zstd":
+        c = zstandard.ZstdCompressor(level=Config.COMPRESS_ZSTD_LEVEL).compressobj()
+        return c.compress, c.flush
+    c = zlib.compressobj(Config.COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    return c.compress, c.flush
+
+def _compress_stream(chunks, encoding):
+    process, finish = _stream_compressor(encoding)
+    try:
+        for chunk in chunks:
+            if out := process(chunk):
+                yield out
+        yield finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+def negotiate(offered=None):
+    """Best encoding the client accepts, in the server's preference order; None for identity."""
+    offered = offered or Config.COMPRESS_ALGORITHMS
+    return request.accept_encodings.best_match(offered) if request.accept_encodings else None
+
+def _compressible(response):
+    return (
+        response.status_code == 200
+        and "Content-Encoding" not in response.headers
+        and not response.direct_passthrough  # send_file: Range requests need the identity bytes
+        and response.mimetype in COMPRESSIBLE
+    )
+
+def compress_response(response):
+    if not _compressible(response):
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.is_streamed:
+        if (encoding := negotiate()) is None:
+            return response
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < Config.COMPRESS_MIN_SIZE or (encoding := negotiate()) is None:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -0,0 +1,138 @@
+import csv
+import gzip
+import json
+from datetime import date
+from decimal import Decimal
+from uuid import UUID
+import asyncpg
+from backend.config import Config
+
+TARGETS = {
+    "meta_daily_performance": {
+        "columns": {
+            "campaign_id": str,
+            "bm_id": int,
+            "date": date.fromisoformat,
+            "spend_raw": Decimal,
+            "clicks": int,
+            "impressions": int,
+            "results": int,
+            "purchase_conversion_value_meta_raw": Decimal,
+            "currency_code": str,
+        },
+        "key": ("campaign_id", "date"),
+        "defaults": {"results": "0", "purchase_conversion_value_meta_raw": "0", "currency_code": "'USD'"},
+        "date_column": "date",
+        "scope_column": "bm_id",
+        "keep_existing": ("bm_id",),
+    },
+    "shopify_daily_sales_summary": {
+        "columns": {
+            "master_store_id": UUID,
+            "summary_date": date.fromisoformat,
+            "orders_count": int,
+            "gross_sales_raw": Decimal,
+            "currency_code": str,
+        },
+        "key": ("master_store_id", "summary_date"),
+        "defaults": {"currency_code": "'USD'"},
+        "date_column": "summary_date",
+        "scope_column": "master_store_id",
+    },
+    "shopify_child_daily_sales_summary": {
+        "columns": {
+            "bm_id": int,
+            "summary_date": date.fromisoformat,
+            "orders_count": int,
+            "gross_sales_raw": Decimal,
+            "currency_code": str,
+        },
+        "key": ("bm_id", "summary_date"),
+        "defaults": {"currency_code": "'USD'"},
+        "date_column": "summary_date",
+        "scope_column": "bm_id",
+    },
+}
+
+def _dsn():
+    return Config.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+
+def _open(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def detect_format(path):
+    return "csv" if path.removesuffix(".gz").endswith(".csv") else "ndjson"
+
+def _ndjson_records(f, spec):
+    columns = spec["columns"]
+    for line in f:
+        if not line.strip():
+            continue
+        doc = json.loads(line)
+        yield tuple(None if doc.get(c) is None else cast(doc[c]) for c, cast in columns.items())
+
+def _merge_sql(table, spec, staging):
+    cols = list(spec["columns"])
+    key = ", ".join(spec["key"])
+    select_cols = ", ".join(f"coalesce({c}, {spec['defaults'][c]})" if c in spec["defaults"] else c for c in cols)
+    keep = spec.get("keep_existing", ())
+    updates = ", ".join(
+        f"{c} = coalesce(EXCLUDED.{c}, {table}.{c})" if c in keep else f"{c} = EXCLUDED.{c}"
+        for c in cols if c not in spec["key"]
+    )
+    return (
+        f"INSERT INTO {table} ({', '.join(cols)}) "
+        f"SELECT DISTINCT ON ({key}) {select_cols} FROM {staging} ORDER BY {key}, _line DESC "
+        f"ON CONFLICT ({key}) DO UPDATE SET {updates}"
+    )
+
+def _ranges_sql(spec, staging):
+    day = spec["date_column"]
+    scope = spec["scope_column"]
+    return f"SELECT {scope}::text AS scope, min({day}) AS first_day, max({day}) AS last_day FROM {staging} WHERE {scope} IS NOT NULL GROUP BY 1"
+
+async def _attribute_campaigns(conn, staging, bm_id):
+    # Rows without a bm_id take the known campaign mapping, then the --bm-id default; the map learns from the rest.
+    await conn.execute(
+        f"UPDATE {staging} s SET bm_id = m.bm_id FROM meta_campaign_bm_map m "
+        f"WHERE s.bm_id IS NULL AND m.campaign_id = s.campaign_id"
+    )
+    if bm_id is not None:
+        await conn.execute(f"UPDATE {staging} SET bm_id = $1 WHERE bm_id IS NULL", bm_id)
+    await conn.execute(
+        f"INSERT INTO meta_campaign_bm_map (campaign_id, bm_id) "
+        f"SELECT DISTINCT ON (campaign_id) campaign_id, bm_id FROM {staging} WHERE bm_id IS NOT NULL ORDER BY campaign_id, _line DESC "
+        f"ON CONFLICT (campaign_id) DO UPDATE SET bm_id = EXCLUDED.bm_id"
+    )
+    return await conn.fetchval(f"SELECT count(*) FROM {staging} WHERE bm_id IS NULL")
+
+async def load_file(target, path, fmt=None, bm_id=None):
+    spec = TARGETS[target]
+    fmt = fmt or detect_format(path)
+    staging = f"_backfill_{target}"
+    conn = await asyncpg.connect(_dsn())
+    try:
+        async with conn.transaction():
+            await conn.execute(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {', '.join(spec['columns'])} FROM {target} WITH NO DATA")
+            await conn.execute(f"ALTER TABLE {staging} ADD COLUMN _line bigserial")
+            with _open(path) as f:
+                if fmt == "csv":
+                    header = next(csv.reader([f.readline().decode()]))
+                    unknown = set(header) - set(spec["columns"])
+                    if unknown:
+                        raise ValueError(f"Unknown columns for {target}: {', '.join(sorted(unknown))}")
+                    status = await conn.copy_to_table(staging, source=f, columns=header, format="csv")
+                else:
+                    status = await conn.copy_records_to_table(staging, records=_ndjson_records(f, spec), columns=list(spec["columns"]))
+            unattributed = await _attribute_campaigns(conn, staging, bm_id) if target == "meta_daily_performance" else 0
+            merged = await conn.execute(_merge_sql(target, spec, staging))
+            ranges = await conn.fetch(_ranges_sql(spec, staging))
+    finally:
+        await conn.close()
+    return {
+        "target": target,
+        "loaded": int(status.split()[-1]),
+        "merged": int(merged.split()[-1]),
+        "unattributed": unattributed,
+        "ranges": [{"scope": r["scope"], "start": r["first_day"].isoformat(), "end": r["last_day"].isoformat()} for r in ranges],
+    }
@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+import numpy as np
+from prometheus_client import Counter, Gauge
+from flask import current_app
+from sqlalchemy import func, or_, select
+from redis.exceptions import RedisError
+from backend.config import Config
+from backend.models.aggregated import KPIDailySnapshot
+from backend.models.core import BusinessManagerConfig, MasterStoreConfig, ProductCategory
+from backend.utils.cache_tags import date_tags, tag_versions
+
+CUBE_ROWS = Gauge("kpi_cube_rows", "Daily KPI rows held in this process's cube")
+CUBE_AGE = Gauge("kpi_cube_age_seconds", "Seconds since this process's cube last refreshed")
+CUBE_QUERIES = Counter("kpi_cube_queries_total", "KPI service reads by whether the cube could answer", ["result"])
+
+SOURCE = (
+    KPIDailySnapshot.bm_id,
+    KPIDailySnapshot.product_category_id,
+    KPIDailySnapshot.currency_code,
+    KPIDailySnapshot.date,
+    KPIDailySnapshot.revenue,
+    KPIDailySnapshot.ad_spend,
+    KPIDailySnapshot.roas,
+    KPIDailySnapshot.cpa,
+)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+WATERMARK = select(func.max(KPIDailySnapshot.created_at), func.max(KPIDailySnapshot.updated_at))
+
+# Field names match the SQL statements they stand in for, so cached rows look the same whichever path ran.
+KPIRow = namedtuple("KPIRow", "bm_id product_category_id date revenue ad_spend roas cpa currency_code")
+CategoryRow = namedtuple("CategoryRow", "name total_revenue total_ad_spend")
+
+logger = logging.getLogger(__name__)
+_cube = None
+_refresher_pid = None
+
+class Dictionary:
+    """Append-only value <-> code mapping. Codes never change, so every cube generation can share one."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+        self._lock = threading.Lock()
+
+    def encode(self, values) -> np.ndarray:
+        with self._lock:
+            return np.fromiter((self._code(v) for v in values), dtype=np.int32)
+
+    def _code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, values) -> np.ndarray:
+        # Codes of the values seen so far; an unknown value matches no row, as it would in SQL.
+        return np.array([self.codes[v] for v in values if v in self.codes], dtype=np.int32)
+
+BMS, STORES, CATEGORIES, CURRENCIES = Dictionary(), Dictionary(), Dictionary(), Dictionary()
+
+def _money(cents) -> Decimal:
+    return Decimal(int(cents)).scaleb(-2)
+
+def _latest(row):
+    return max((v for v in row if v is not None), default=None)
+
+def _columns(rows) -> dict:
+    bm, category, currency, day, revenue, ad_spend, roas, cpa = zip(*rows) if rows else ((),) * 8
+    # Amounts are kept in integer cents: sums stay exact, and come back as the same Decimals SQL returns.
+    return {
+        "bm": BMS.encode(int(b) for b in bm),
+        "category": CATEGORIES.encode(category),
+        "currency": CURRENCIES.encode(currency),
+        "day": np.array(day, dtype="datetime64[D]"),
+        "revenue": np.fromiter((round(v * 100) for v in revenue), dtype=np.int64),
+        "ad_spend": np.fromiter((round(v * 100) for v in ad_spend), dtype=np.int64),
+        "roas": np.array(roas, dtype=np.float64),
+        "cpa": np.array(cpa, dtype=np.float64),
+    }
+
+def _keys(columns) -> np.ndarray:
+    # kpi_daily_snapshot is unique on (bm_id, date).
+    return (columns["bm"].astype(np.int64) << 32) | columns["day"].astype(np.int64)
+
+def _period(days, grain) -> np.ndarray:
+    if grain == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    # 1970-01-01, day 0, was a Thursday.
+    return days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+
+class KPICube:
+    """One immutable generation of kpi_daily_snapshot rows dated start or later, stored column by column.
+
+    bm, category and currency are dictionary codes. Master store and region are not stored per row: they
+    are looked up through the BM, so reassigning a BM only needs a refresh of the small per-BM arrays.
+    """
+
+    def __init__(self, start, columns, bms, categories, watermark, built_at=None, versions=None):
+        self.start = start
+        self.columns = columns
+        self.size = len(columns["day"])
+        self.watermark = watermark
+        # date:{d} tag versions read before this generation's rows; see fresh_cube.
+        self.versions = versions or {}
+        self.refreshed_at = time.time()
+        self.built_at = built_at or self.refreshed_at
+        BMS.encode(bm_id for bm_id, _, _ in bms)
+        # Indexed by BM code: the BM's id, its store's code and its region id (-1 when unknown).
+        self.bm_ids = np.array(BMS.values, dtype=np.int64)
+        self.bm_store = np.full(len(self.bm_ids), -1, dtype=np.int32)
+        self.bm_region = np.full(len(self.bm_ids), -1, dtype=np.int64)
+        for bm_id, store_id, region_id in bms:
+            code = BMS.codes[bm_id]
+            self.bm_store[code] = STORES.encode([store_id])[0]
+            self.bm_region[code] = region_id
+        self.category_names = categories
+
+    @classmethod
+    def from_rows(cls, start, rows, bms, categories, watermark, versions=None):
+        return cls(start, _columns(rows), bms, categories, watermark, versions=versions)
+
+    def updated(self, start, rows, bms, categories, watermark, versions=None):
+        """A new generation with rows replacing those for the same (bm_id, date); rows before start are dropped."""
+        changed = _columns(rows)
+        keep = ~np.isin(_keys(self.columns), _keys(changed)) & (self.columns["day"] >= np.datetime64(start))
+        columns = {name: np.concatenate([values[keep], changed[name]]) for name, values in self.columns.items()}
+        return KPICube(start, columns, bms, categories, watermark, self.built_at, versions)
+
+    def mask(self, start_date, end_date, bm_ids=None, master_store_ids=None, region_ids=None, product_category_ids=None):
+        c = self.columns
+        mask = (c["day"] >= np.datetime64(start_date)) & (c["day"] <= np.datetime64(end_date))
+        if bm_ids:
+            mask &= np.isin(c["bm"], BMS.lookup(int(b) for b in bm_ids))
+        if master_store_ids:
+            mask &= np.isin(self.bm_store[c["bm"]], STORES.lookup(uuid.UUID(str(s)) for s in master_store_ids))
+        if region_ids:
+            mask &= np.isin(self.bm_region[c["bm"]], [int(r) for r in region_ids])
+        if product_category_ids:
+            mask &= np.isin(c["category"], CATEGORIES.lookup(uuid.UUID(str(p)) for p in product_category_ids))
+        return mask
+
+    def group(self, mask, keys):
+        """Revenue and ad_spend cents summed over the masked rows for each distinct combination of keys.
+
+        keys are full-length integer columns. Returns the distinct combinations (one row each) and both sums.
+        """
+        if not mask.any():
+            return np.empty((0, len(keys)), dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        groups, inverse = np.unique(np.stack([k[mask].astype(np.int64) for k in keys], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        # float64 sums are exact below 2**53 cents.
+        sums = [np.rint(np.bincount(inverse, weights=self.columns[m][mask], minlength=len(groups))).astype(np.int64) for m in ("revenue", "ad_spend")]
+        return groups, sums[0], sums[1]
+
+    def slice(self, start_date, end_date, by, **filters):
+        """Totals over start..end grouped by any of bm, store, region, category, currency, day, week, month."""
+        c = self.columns
+        columns = {
+            "bm": lambda: self.bm_ids[c["bm"]],
+            "store": lambda: self.bm_store[c["bm"]],
+            "region": lambda: self.bm_region[c["bm"]],
+            "category": lambda: c["category"],
+            "currency": lambda: c["currency"],
+            "day": lambda: c["day"].astype(np.int64),
+            "week": lambda: _period(c["day"], "week").astype(np.int64),
+            "month": lambda: _period(c["day"], "month").astype(np.int64),
+        }
+        return self.group(self.mask(start_date, end_date, **filters), [columns[d]() for d in by])
+
+    def kpi_rows(self, start_date, end_date, master_store_ids=None, bm_ids=None, grain="day"):
+        """get_kpi_snapshot's rows for native mode: daily rows, or one per BM and week or month."""
+        c = self.columns
+        mask = self.mask(start_date, end_date, bm_ids=bm_ids, master_store_ids=master_store_ids)
+        if grain == "day":
+            idx = np.flatnonzero(mask)
+            idx = idx[np.lexsort((self.bm_ids[c["bm"][idx]], c["day"][idx]))]
+            return [
+                KPIRow(int(self.bm_ids[bm]), CATEGORIES.values[category], day, _money(revenue), _money(ad_spend), float(roas), float(cpa), CURRENCIES.values[currency])
+                for bm, category, day, revenue, ad_spend, roas, cpa, currency in zip(
+                    c["bm"][idx], c["category"][idx], c["day"][idx].tolist(), c["revenue"][idx], c["ad_spend"][idx],
+                    c["roas"][idx], c["cpa"][idx], c["currency"][idx],
+                )
+            ]
+        period = _period(c["day"], grain).astype(np.int64)
+        groups, revenue, ad_spend = self.group(mask, [self.bm_ids[c["bm"]], c["category"], c["currency"], period])
+        rows = []
+        for i in np.lexsort((groups[:, 0], groups[:, 3])):
+            bm_id, category, currency, day = groups[i].tolist()
+            rev, ads = int(revenue[i]), int(ad_spend[i])
+            rows.append(KPIRow(
+                bm_id, CATEGORIES.values[category], date.fromordinal(EPOCH_ORDINAL + day),
+                _money(rev), _money(ads), rev / ads if ads else 0.0, ads * 100 / rev if rev > 0 else 0.0, CURRENCIES.values[currency],
+            ))
+        return rows
+
+    def category_rows(self, start_date, end_date, product_category_ids=None):
+        """get_category_summary's rows for native mode; rows without a known category are left out, as by the join."""
+        groups, revenue, ad_spend = self.group(self.mask(start_date, end_date, product_category_ids=product_category_ids), [self.columns["category"]])
+        rows = []
+        for (category,), rev, ads in zip(groups.tolist(), revenue, ad_spend):
+            name = self.category_names.get(CATEGORIES.values[category])
+            if name is not None:
+                rows.append(CategoryRow(name, _money(rev), _money(ads)))
+        return rows
+
+    def bm_totals(self, start_date, end_date, bm_ids=None):
+        """Per-BM revenue and ad_spend over start..end, as three parallel lists."""
+        groups, revenue, ad_spend = self.group(self.mask(start_date, end_date, bm_ids=bm_ids), [self.bm_ids[self.columns["bm"]]])
+        return groups[:, 0].tolist(), [_money(r) for r in revenue], [_money(a) for a in ad_spend]
+
+async def _dimensions(session):
+    bms = (await session.execute(
+        select(BusinessManagerConfig.id, BusinessManagerConfig.master_store_id, MasterStoreConfig.region_id)
+        .join(MasterStoreConfig, MasterStoreConfig.id == BusinessManagerConfig.master_store_id)
+    )).all()
+    return [tuple(b) for b in bms], dict((await session.execute(select(ProductCategory.id, ProductCategory.name))).all())
+
+async def refresh(session, today=None):
+    """Bring this process's cube up to date: a full load every KPI_CUBE_REBUILD_SECONDS, changed rows otherwise."""
+    global _cube
+    today = today or date.today()
+    start = today - timedelta(days=Config.KPI_CUBE_DAYS)
+    previous = _cube
+    if previous is not None and time.time() - previous.built_at >= Config.KPI_CUBE_REBUILD_SECONDS:
+        # Only a full load notices deleted rows.
+        previous = None
+    # Both read before the rows, so the cube never claims writes it may have missed.
+    versions = dict(tag_versions(date_tags(start, today)))
+    watermark = _latest((await session.execute(WATERMARK)).one())
+    stmt = select(*SOURCE).filter(KPIDailySnapshot.date >= start)
+    if previous is not None and previous.watermark is not None:
+        # A drain's rows carry its transaction's start time and can commit after later-stamped rows; re-read that long.
+        since = previous.watermark - timedelta(seconds=Config.ROLLUP_DRAIN_LOCK_SECONDS)
+        stmt = stmt.filter(or_(KPIDailySnapshot.created_at > since, KPIDailySnapshot.updated_at > since))
+    rows = (await session.execute(stmt)).all()
+    bms, categories = await _dimensions(session)
+    if previous is None:
+        _cube = KPICube.from_rows(start, rows, bms, categories, watermark, versions)
+    else:
+        _cube = previous.updated(start, rows, bms, categories, watermark, versions)
+    return _cube
+
+async def _refresh_once(async_session):
+    async with async_session() as session:
+        await refresh(session)
+
+def _refresh_loop(async_session):
+    # Reads go through the web's asyncpg engine, whose sockets gevent can switch away from; a blocking
+    # psycopg2 load here would stall every request on the worker. The engine does not pool, so each
+    # refresh can run on an event loop of its own.
+    while True:
+        try:
+            asyncio.run(_refresh_once(async_session))
+        except Exception:
+            logger.exception("KPI cube refresh failed")
+        time.sleep(Config.KPI_CUBE_REFRESH_SECONDS)
+
+def _ensure_refresher():
+    # One refresh thread per process, started on first use so it runs in the forked worker.
+    global _refresher_pid
+    if _refresher_pid == os.getpid():
+        return
+    _refresher_pid = os.getpid()
+    threading.Thread(target=_refresh_loop, args=(current_app.async_session,), daemon=True).start()
+
+def fresh_cube(start_date, end_date, mode="native"):
+    """This process's cube if it can answer for start..end exactly as SQL would now, else None.
+
+    Stale means a date:{d} tag in the range has moved since the cube's last refresh read it. Writers bump
+    after they commit, so an unmoved tag means no write to that day has landed since; row timestamps cannot
+    say that, because they hold the writing transaction's start time. USD mode always goes to SQL, since the
+    cube holds native amounts only.
+    """
+    if not Config.KPI_CUBE_ENABLED:
+        return None
+    _ensure_refresher()
+    cube = _cube
+    if cube is None or mode != "native" or start_date < cube.start:
+        CUBE_QUERIES.labels("cold" if cube is None else "uncovered").inc()
+        return None
+    try:
+        current = tag_versions(date_tags(start_date, end_date))
+    except RedisError:
+        current = None
+    if current is None or any(cube.versions.get(tag) != version for tag, version in current):
+        CUBE_QUERIES.labels("stale").inc()
+        return None
+    CUBE_QUERIES.labels("hit").inc()
+    return cube
+
+CUBE_ROWS.set_function(lambda: _cube.size if _cube is not None else 0)
+CUBE_AGE.set_function(lambda: time.time() - _cube.refreshed_at if _cube is not None else float("nan"))
@@ -1,12 +1,250 @@
-from contextlib import contextmanager
-from flask import g, current_app
+import os
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from flask import g, current_app, request
+from flask_jwt_extended import get_jwt_identity
+from prometheus_client import Gauge, Histogram
+from redis import Redis
+from redis.exceptions import ConnectionError
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
+from backend.config import Config
 
-@contextmanager
-def get_db_session():
-    if not hasattr(g, 'db_session'):
-        g.db_session = current_app.async_session()
+# Workers talk to the same database through a blocking driver.
+SYNC_DRIVERS = {"postgresql+asyncpg": "postgresql+psycopg2", "sqlite+aiosqlite": "sqlite"}
+
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool", ["engine"])
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond pool_size", ["engine"])
+POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ["engine"])
+REPLICA_LAG = Gauge("db_replica_lag_seconds", "Replication lag per replica at the last probe; -1 when unreachable", ["replica"])
+
+# Seconds behind the primary; 0 when the replica has replayed everything it received.
+LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+WROTE_KEY = "db:wrote:"
+REPLICA_LAG_KEY = "db:replica_lag"  # replica url -> seconds behind at the last probe, -1 when unreachable
+
+_worker_engine = None
+_worker_session = None
+_worker_pid = None
+_replica_lag = {}  # replica url -> seconds behind, None when the last probe failed
+_lag_read_at = None
+_redis = None
+
+def _timed_pool(base, name):
+    # recreate() after dispose() builds the same class, so the timing survives pool resets.
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return base._do_get(self)
+        finally:
+            POOL_WAIT.labels(name).observe(time.perf_counter() - started)
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get})
+
+def _instrument(engine, name):
+    POOL_CHECKED_OUT.labels(name).set_function(lambda: engine.pool.checkedout())
+    POOL_OVERFLOW.labels(name).set_function(lambda: max(engine.pool.overflow(), 0))
+    return engine
+
+def _web_engine(url, name):
+    # Flask runs every async view on an event loop of its own, and an asyncpg connection only works on the loop
+    # that opened it, so a pooled connection handed to the next request would fail. Web engines keep no idle
+    # connections: each session connects on its request's loop and closes there. POOL_WAIT is the connect time.
+    engine = create_async_engine(url, poolclass=_timed_pool(NullPool, name))
+    event.listen(engine.sync_engine, "checkout", lambda *_: POOL_CHECKED_OUT.labels(name).inc())
+    event.listen(engine.sync_engine, "checkin", lambda *_: POOL_CHECKED_OUT.labels(name).dec())
+    return engine
+
+def sync_url(url):
+    url = make_url(url)
+    return url.set(drivername=SYNC_DRIVERS.get(url.drivername, url.drivername))
+
+def init_db(app):
+    engine = app.async_engine = _web_engine(app.config['DATABASE_URL'], "web")
+    app.async_session = async_sessionmaker(engine, expire_on_commit=False)
+    app.replica_sessions = {}
+    for i, url in enumerate(app.config['DATABASE_REPLICA_URLS']):
+        replica = _web_engine(url, f"replica{i}")
+        app.replica_sessions[url] = async_sessionmaker(replica, expire_on_commit=False, info={"replica": url})
+
+def db_redis():
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(Config.REDIS_URL, decode_responses=True)
+    return _redis
+
+def _probe_drift():
+    # A published lag is up to one interval old when read, and is then used for up to one more.
+    return 2 * Config.REPLICA_PROBE_INTERVAL_SECONDS
+
+def replica_staleness_bound():
+    # Worst case behind the primary for a replica we route to: the lag limit plus the drift since its probe.
+    return Config.REPLICA_MAX_LAG_SECONDS + _probe_drift()
+
+def probe_replicas():
+    """Measure every replica's lag and publish it to Redis; run from Celery beat, never in a web worker."""
+    lags = {}
+    for url in Config.DATABASE_REPLICA_URLS:
+        engine = create_engine(sync_url(url), poolclass=NullPool, connect_args={"connect_timeout": 2})
+        try:
+            with engine.connect() as conn:
+                lags[url] = float(conn.execute(LAG_SQL).scalar() or 0)
+        except Exception:
+            lags[url] = -1
+        finally:
+            engine.dispose()
+    if lags:
+        with db_redis().pipeline() as pipe:
+            pipe.delete(REPLICA_LAG_KEY)
+            pipe.hset(REPLICA_LAG_KEY, mapping=lags)
+            # No fresh probe means no replica is trusted: reads fall back to the primary.
+            pipe.expire(REPLICA_LAG_KEY, max(int(3 * Config.REPLICA_PROBE_INTERVAL_SECONDS), 1))
+            pipe.execute()
+    return lags
+
+def _refresh_lag():
+    # Read the published lags at most once per probe interval; a missing entry counts as unreachable.
+    global _lag_read_at
+    if not Config.DATABASE_REPLICA_URLS:
+        return
+    now = time.monotonic()
+    if _lag_read_at is not None and now - _lag_read_at < Config.REPLICA_PROBE_INTERVAL_SECONDS:
+        return
+    _lag_read_at = now
     try:
+        published = db_redis().hgetall(REPLICA_LAG_KEY)
+    except ConnectionError:
+        published = {}
+    for url in Config.DATABASE_REPLICA_URLS:
+        lag = float(published.get(url, -1))
+        _replica_lag[url] = lag if lag >= 0 else None
+        REPLICA_LAG.labels(make_url(url).host).set(lag)
+
+def healthy_replicas(max_lag=None):
+    _refresh_lag()
+    max_lag = Config.REPLICA_MAX_LAG_SECONDS if max_lag is None else max_lag
+    return [url for url, lag in _replica_lag.items() if lag is not None and lag <= max_lag]
+
+def read_url():
+    """A healthy replica's URL for work outside a request (export tasks), else the primary's."""
+    replicas = healthy_replicas()
+    return random.choice(replicas) if replicas else Config.DATABASE_URL
+
+def _client_key():
+    # The JWT subject when the view verified one, otherwise the caller's address.
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:
+        identity = None
+    return f"{WROTE_KEY}user:{identity}" if identity is not None else f"{WROTE_KEY}addr:{request.remote_addr}"
+
+def _mark_written():
+    # Read-your-writes: for a while after this caller writes, its reads avoid replicas that may not have the write yet.
+    try:
+        current_app.redis.setex(_client_key(), int(replica_staleness_bound()) + 1, time.time())
+    except ConnectionError:
+        pass
+
+def _pick_replica():
+    if not current_app.replica_sessions or getattr(g, 'db_session', None) is not None:
+        return None
+    max_lag = Config.REPLICA_MAX_LAG_SECONDS
+    try:
+        wrote = current_app.redis.get(_client_key())
+    except ConnectionError:
+        return None
+    if wrote:
+        # A replica is only safe if its lag, plus drift since the probe, is shorter than the time since the write.
+        max_lag = min(max_lag, time.time() - float(wrote) - _probe_drift())
+    replicas = healthy_replicas(max_lag)
+    return random.choice(replicas) if replicas else None
+
+@asynccontextmanager
+async def _read_session(url):
+    if getattr(g, 'db_read_session', None) is not None:
+        yield g.db_read_session
+        return
+    session = g.db_read_session = current_app.replica_sessions[url]()
+    try:
+        yield session
+    except (OperationalError, InterfaceError, OSError):
+        # Take the replica out of rotation now instead of at the next probe.
+        _replica_lag[url] = None
+        raise
+    finally:
+        await session.close()
+        g.pop('db_read_session', None)
+
+@asynccontextmanager
+async def get_db_session(read_only=False):
+    """Request-scoped AsyncSession: nested blocks share it; the outermost one commits or rolls back and closes it.
+
+    read_only=True may route to a healthy replica within REPLICA_MAX_LAG_SECONDS, unless the caller wrote recently.
+    """
+    if read_only and (url := _pick_replica()):
+        async with _read_session(url) as session:
+            yield session
+        return
+    if getattr(g, 'db_session', None) is not None:
         yield g.db_session
+        return
+    # Closed here rather than at teardown: asyncpg connections belong to the event loop the view ran on.
+    session = g.db_session = current_app.async_session()
+    try:
+        yield session
+        await session.commit()
+        if not read_only and request.method not in ("GET", "HEAD", "OPTIONS"):
+            _mark_written()
+    except BaseException:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+        g.pop('db_session', None)
+
+@asynccontextmanager
+async def get_concurrent_session():
+    """A read-only session of its own, outside the request-scoped one, so several can query at the same time."""
+    url = _pick_replica()
+    session = current_app.replica_sessions[url]() if url else current_app.async_session()
+    try:
+        yield session
+    except (OperationalError, InterfaceError, OSError):
+        if url:
+            _replica_lag[url] = None
+        raise
+    finally:
+        await session.close()
+
+def worker_engine():
+    # One engine per process; a pool inherited across Celery's fork would share sockets with the parent.
+    global _worker_engine, _worker_session, _worker_pid
+    if _worker_pid != os.getpid():
+        _worker_engine = _instrument(create_engine(
+            sync_url(Config.DATABASE_URL),
+            poolclass=_timed_pool(QueuePool, "worker"),
+            **Config.SQLALCHEMY_WORKER_ENGINE_OPTIONS,
+        ), "worker")
+        _worker_session = sessionmaker(_worker_engine, expire_on_commit=False)
+        _worker_pid = os.getpid()
+    return _worker_engine
+
+def worker_sessionmaker():
+    worker_engine()
+    return _worker_session
+
+@contextmanager
+def get_worker_session():
+    """Blocking Session for Celery tasks and scripts; callers commit, and it is always closed."""
+    session = worker_sessionmaker()()
+    try:
+        yield session
     finally:
-        g.db_session.close()
-        del g.db_session
\ No newline at end of file
+        session.close()
@@ -1,26 +1,45 @@
+import tempfile
+from contextlib import ExitStack
 from io import BytesIO
 from flask import Response
 from openpyxl import Workbook
-from typing import List, Dict
+from typing import Any, AsyncIterable, Awaitable, BinaryIO, Callable, Iterator, List
+from backend.config import Config
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
 def build_excel_response(wb: Workbook, filename: str) -> Response:
     output = BytesIO()
     wb.save(output)
     output.seek(0)
-    return Response(output, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": f"attachment;filename={filename}"})
+    return Response(output, mimetype=XLSX_MIMETYPE, headers={"Content-Disposition": f"attachment;filename={filename}"})
+
+async def write_xlsx(rows: AsyncIterable[List[Any]], fileobj: BinaryIO) -> None:
+    # Write-only sheets spool rows to disk as they arrive, so memory does not grow with the row count.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    async for row in rows:
+        ws.append(row)
+    wb.save(fileobj)
+
+def iter_file(fileobj: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    try:
+        while chunk := fileobj.read(chunk_size):
+            yield chunk
+    finally:
+        fileobj.close()
 
-def _build_campaign_command_workbook(rows: List[Dict], totals: Dict, args: Dict) -> Workbook:
-    wb = Workbook()
-    ws = wb.active
-    for k in ("start_date", "end_date", "master_store_ids", "bm_ids", "status", "mode"):
-        ws.append([k, str(args.get(k))])
-    ws.append([])
-    if rows:
-        ws.append(list(rows[0].keys()))
-        for r in rows:
-            ws.append(list(r.values()))
-    ws.append([])
-    ws.append(["TOTALS"])
-    for k, v in totals.items():
-        ws.append([k, v])
-    return wb
\ No newline at end of file
+async def build_streaming_file_response(write: Callable[[BinaryIO], Awaitable[None]], filename: str, mimetype: str) -> Response:
+    # Render into a spooled temp file, then hand it back in EXPORT_CHUNK_SIZE chunks with a known length.
+    with ExitStack() as stack:
+        fileobj = stack.enter_context(tempfile.TemporaryFile())
+        await write(fileobj)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        # From here iter_file owns the file and closes it once the body is sent.
+        stack.pop_all()
+    return Response(
+        iter_file(fileobj, Config.EXPORT_CHUNK_SIZE),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment;filename={filename}", "Content-Length": str(size)},
+    )
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from redis import Redis
+from backend.config import Config
+
+STATUSES = ("queued", "running", "done", "failed")
+ACTIVE = ("queued", "running")
+
+_redis = None
+
+def jobs_redis():
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(Config.REDIS_URL, decode_responses=True)
+    return _redis
+
+def _job_key(job_id):
+    return f"export:job:{job_id}"
+
+def _artifact_key(fingerprint):
+    return f"export:artifact:{fingerprint}"
+
+def fingerprint(name, params, watermark, fmt="xlsx", user=None):
+    # Scoped to the requester: a job and its artifact are only ever handed back to the user who asked for them.
+    raw = json.dumps({"export": name, "params": params, "watermark": watermark, "format": fmt, "user": user}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def artifact_path(job_id, ext="xlsx"):
+    return os.path.join(Config.EXPORT_STORAGE_DIR, f"{job_id}.{ext}")
+
+def get_job(job_id):
+    job = jobs_redis().hgetall(_job_key(job_id))
+    if not job:
+        return None
+    job["params"] = json.loads(job["params"])
+    return job
+
+def owned_by(job, user):
+    return job is not None and job.get("requested_by") == str(user)
+
+def update_job(job_id, **fields):
+    # Every status change restarts the TTL, so a long render cannot expire while clients poll it. A running
+    # job outlives its render's time limit, so purge_artifacts never sees its .part file without a live job.
+    ttl = Config.EXPORT_ARTIFACT_TTL + (Config.EXPORT_RENDER_TIMEOUT if fields.get("status") == "running" else 0)
+    with jobs_redis().pipeline() as pipe:
+        pipe.hset(_job_key(job_id), mapping={k: "" if v is None else v for k, v in fields.items()})
+        pipe.expire(_job_key(job_id), ttl)
+        pipe.execute()
+
+def create_job(name, params, watermark, user=None, fmt="xlsx"):
+    """Returns (job, created). Identical requests within EXPORT_ARTIFACT_TTL share one job and artifact."""
+    r = jobs_redis()
+    key = _artifact_key(fingerprint(name, params, watermark, fmt, user))
+    existing = r.get(key)
+    if existing and (job := get_job(existing)) and job["status"] != "failed":
+        return job, False
+    job_id = uuid.uuid4().hex
+    with r.pipeline() as pipe:
+        pipe.hset(_job_key(job_id), mapping={
+            "job_id": job_id,
+            "export": name,
+            "params": json.dumps(params),
+            "format": fmt,
+            "watermark": watermark or "",
+            "fingerprint": key,
+            "status": "queued",
+            "requested_by": user or "",
+            "created_at": time.time(),
+        })
+        pipe.expire(_job_key(job_id), Config.EXPORT_ARTIFACT_TTL)
+        pipe.execute()
+    # Losing the race to a concurrent identical request means using its job instead.
+    if not r.set(key, job_id, nx=True, ex=Config.EXPORT_ARTIFACT_TTL):
+        winner = r.get(key)
+        if winner and (job := get_job(winner)) and job["status"] != "failed":
+            r.delete(_job_key(job_id))
+            return job, False
+        r.set(key, job_id, ex=Config.EXPORT_ARTIFACT_TTL)
+    return get_job(job_id), True
+
+def fail_job(job_id, error):
+    job = get_job(job_id)
+    update_job(job_id, status="failed", error=error, finished_at=time.time())
+    # A failed render must not be handed out to the next identical request.
+    if job and jobs_redis().get(job["fingerprint"]) == job_id:
+        jobs_redis().delete(job["fingerprint"])
+
+def purge_artifacts(max_age=None):
+    max_age = Config.EXPORT_ARTIFACT_TTL if max_age is None else max_age
+    cutoff = time.time() - max_age
+    removed = 0
+    if not os.path.isdir(Config.EXPORT_STORAGE_DIR):
+        return removed
+    for entry in os.scandir(Config.EXPORT_STORAGE_DIR):
+        if not entry.is_file() or entry.stat().st_mtime >= cutoff:
+            continue
+        # A .part file is a render in progress until its job stops being queued or running.
+        if entry.name.endswith(".part") and (job := get_job(entry.name.split(".", 1)[0])) and job["status"] in ACTIVE:
+            continue
+        os.remove(entry.path)
+        removed += 1
+    return removed
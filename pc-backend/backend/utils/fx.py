@@ -1,14 +1,127 @@
 from decimal import Decimal
-from datetime import date
-from sqlalchemy import select
+from datetime import date, timedelta
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional
+import numpy as np
+from sqlalchemy import Date, Numeric, String, and_, bindparam, case, column, func, or_, select, union_all
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.models.aggregated import FXDailyRate
 
-async def get_rate(session: AsyncSession, day: date, from_ccy: str, to_ccy: str = "USD") -> Decimal:
-    rate = (await session.execute(select(FXDailyRate.rate).filter_by(date=day, from_currency=from_ccy, to_currency=to_ccy, source="manual"))).scalar()
-    if rate is None:
-        rate = (await session.execute(select(FXDailyRate.rate).filter_by(date=day, from_currency=from_ccy, to_currency=to_ccy, source="exchangerate.host"))).scalar()
-    if rate is None:
-        last_rate_stmt = select(FXDailyRate.rate).filter(FXDailyRate.date < day, FXDailyRate.from_currency == from_ccy, FXDailyRate.to_currency == to_ccy).order_by(FXDailyRate.date.desc()).limit(1)
-        rate = (await session.execute(last_rate_stmt)).scalar() or Decimal("1.0")
-    return rate
\ No newline at end of file
+DEFAULT_RATE = Decimal("1.0")
+TRUSTED_SOURCES = ("manual", "exchangerate.host")
+# A matrix loaded once for several queries (a dashboard batch); kpi_rates uses it when it covers the range.
+shared_matrix: ContextVar[Optional["FXRateMatrix"]] = ContextVar("shared_fx_matrix", default=None)
+SOURCE_PRIORITY = case((FXDailyRate.source == "manual", 0), (FXDailyRate.source == "exchangerate.host", 1), else_=2)
+
+class FXRateMatrix:
+    """Rates for a set of currencies over a date range, resolved manual > exchangerate.host > last known."""
+
+    def __init__(self, start: date, end: date, rates: Dict[str, list], to_ccy: str = "USD"):
+        self.start = start
+        self.end = end
+        self.to_ccy = to_ccy
+        self.currencies = {ccy: i for i, ccy in enumerate(rates)}
+        days = (end - start).days + 1
+        self.exact = np.array([rates[ccy] for ccy in rates], dtype=object).reshape(len(rates), days)
+        self.values = self.exact.astype(np.float64)
+
+    @classmethod
+    async def load(cls, session: AsyncSession, start: date, end: date, currencies: Iterable[str], to_ccy: str = "USD"):
+        currencies = sorted({c for c in currencies if c and c != to_ccy})
+        rates = {to_ccy: [Decimal(1)] * ((end - start).days + 1)}
+        if currencies:
+            rows = (await session.execute(cls._query(start, end, currencies, to_ccy))).all()
+            rates.update(cls._resolve(start, end, currencies, rows))
+        return cls(start, end, rates, to_ccy)
+
+    @staticmethod
+    def _query(start, end, currencies, to_ccy):
+        cols = (FXDailyRate.from_currency, FXDailyRate.date, FXDailyRate.rate, SOURCE_PRIORITY.label("priority"))
+        pair = (FXDailyRate.from_currency.in_(currencies), FXDailyRate.to_currency == to_ccy)
+        in_range = select(*cols).filter(*pair, FXDailyRate.date.between(start, end))
+        # Seed for the forward-fill: the last rate each currency had before the range starts.
+        last_known = (
+            select(*cols).filter(*pair, FXDailyRate.date < start)
+            .distinct(FXDailyRate.from_currency)
+            .order_by(FXDailyRate.from_currency, FXDailyRate.date.desc(), SOURCE_PRIORITY)
+            .subquery()
+        )
+        return union_all(in_range, select(last_known))
+
+    @staticmethod
+    def _resolve(start, end, currencies, rows):
+        best = {}
+        seed = {}
+        for ccy, day, rate, priority in sorted(rows, key=lambda r: r.priority, reverse=True):
+            if day < start:
+                seed[ccy] = rate
+            else:
+                best[(ccy, day)] = (rate, priority)
+        resolved = {}
+        for ccy in currencies:
+            last = seed.get(ccy)
+            series = []
+            day = start
+            while day <= end:
+                rate, priority = best.get((ccy, day), (None, None))
+                # Same-day rates only count from the two trusted sources; any source can carry forward.
+                series.append(rate if priority is not None and priority < 2 else (last or DEFAULT_RATE))
+                if rate is not None:
+                    last = rate
+                day += timedelta(days=1)
+            resolved[ccy] = series
+        return resolved
+
+    def covers(self, start: date, end: date, currencies: Iterable[str]) -> bool:
+        return self.start <= start and end <= self.end and all(c in self.currencies for c in currencies if c)
+
+    def index(self, days, currencies):
+        offsets = np.fromiter((d.toordinal() for d in days), dtype=np.int64) - self.start.toordinal()
+        if offsets.size and (offsets.min() < 0 or offsets.max() > (self.end - self.start).days):
+            raise ValueError(f"FX matrix covers {self.start}..{self.end} only")
+        # Unknown currencies (and rows with no currency) convert at 1.0, like get_rate's default.
+        rows = np.fromiter((self.currencies.get(c, -1) for c in currencies), dtype=np.int64)
+        return rows, offsets
+
+    def rates(self, days, currencies, exact: bool = False) -> np.ndarray:
+        rows, offsets = self.index(days, currencies)
+        grid = self.exact if exact else self.values
+        out = grid[np.maximum(rows, 0), offsets]
+        out[rows < 0] = DEFAULT_RATE if exact else 1.0
+        return out
+
+    def rate(self, day: date, from_ccy: str) -> Decimal:
+        return self.rates([day], [from_ccy], exact=True)[0]
+
+    def table(self):
+        """The exact rates as a (date, currency_code, rate) derived table, interchangeable with resolved_rates()."""
+        days = [self.start + timedelta(days=i) for i in range((self.end - self.start).days + 1)]
+        # Row-major like self.exact: every day of the first currency, then the next.
+        return func.unnest(
+            bindparam("fx_dates", days * len(self.currencies), type_=ARRAY(Date)),
+            bindparam("fx_currencies", [c for c in self.currencies for _ in days], type_=ARRAY(String(3))),
+            bindparam("fx_rates", self.exact.ravel().tolist(), type_=ARRAY(Numeric(10, 6))),
+        ).table_valued(column("date", Date), column("currency_code", String(3)), column("rate", Numeric(10, 6))).render_derived(name="fx_rates")
+
+async def get_rate(session: AsyncSession, day: date, from_ccy: str, to_ccy: str = "USD", matrix: Optional[FXRateMatrix] = None) -> Decimal:
+    if matrix is None or not matrix.covers(day, day, [from_ccy]):
+        matrix = await FXRateMatrix.load(session, day, day, [from_ccy], to_ccy)
+    return matrix.rate(day, from_ccy)
+
+def resolved_rates(pairs, to_ccy: str = "USD"):
+    """Resolve one rate per distinct (date, currency_code) row of ``pairs``, in SQL, with get_rate's precedence."""
+    pairs = pairs.subquery("fx_pairs")
+    best = (
+        select(FXDailyRate.rate)
+        .filter(
+            FXDailyRate.from_currency == pairs.c.currency_code,
+            FXDailyRate.to_currency == to_ccy,
+            or_(and_(FXDailyRate.date == pairs.c.date, FXDailyRate.source.in_(TRUSTED_SOURCES)), FXDailyRate.date < pairs.c.date),
+        )
+        .order_by(FXDailyRate.date.desc(), SOURCE_PRIORITY)
+        .limit(1)
+        .scalar_subquery()
+    )
+    rate = case((pairs.c.currency_code == to_ccy, DEFAULT_RATE), else_=func.coalesce(best, DEFAULT_RATE))
+    return select(pairs.c.date, pairs.c.currency_code, rate.label("rate")).subquery("fx_rates")
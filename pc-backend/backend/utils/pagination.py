@@ -1,16 +1,115 @@
-from typing import Any, Dict, List, Tuple
-from sqlalchemy import select, func
+import base64
+import binascii
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import InvalidOperation
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from flask import current_app
+from redis.exceptions import RedisError
+from sqlalchemy import and_, or_, select, func, text
 from sqlalchemy.ext.asyncio import AsyncSession
+from backend.config import Config
 
 async def paginate(session: AsyncSession, stmt: select, page: int, page_size: int) -> Tuple[List[Any], Dict[str, int]]:
     total_stmt = select(func.count()).select_from(stmt.subquery())
     total_items = (await session.execute(total_stmt)).scalar()
     items_stmt = stmt.offset((page - 1) * page_size).limit(page_size)
-    items = (await session.execute(items_stmt)).scalars().all()
+    items = (await session.execute(items_stmt)).all()
     total_pages = (total_items + page_size - 1) // page_size
     return items, {
         "page": page,
         "page_size": page_size,
         "total_items": total_items,
         "total_pages": total_pages
-    }
\ No newline at end of file
+    }
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else str(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def keyset_requested(args) -> bool:
+    """Keyset paging for a non-empty cursor, or pagination=keyset for the first page; offset paging otherwise.
+
+    An empty ``cursor=`` is not a request for keyset paging, so it cannot switch the response shape on its own.
+    """
+    return bool(args.get("cursor")) or args.get("pagination") == "keyset"
+
+def decode_cursor(cursor: str, columns) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise InvalidCursor("Cursor does not match the sort order")
+        return [_load(v, c.type.python_type) for v, c in zip(values, columns)]
+    except InvalidCursor:
+        raise
+    # Bad base64, JSON, UTF-8, or a value that does not parse as its column's type.
+    except (binascii.Error, ValueError, TypeError, InvalidOperation) as e:
+        raise InvalidCursor("Malformed cursor") from e
+
+def _load(value, python_type):
+    if python_type in (date, datetime):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+def _after(columns, descending, values):
+    # (a, b, ...) strictly after the cursor row, with a per-column sort direction.
+    clauses = []
+    for i, (column, desc, value) in enumerate(zip(columns, descending, values)):
+        ties = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(and_(*ties, column < value if desc else column > value))
+    return or_(*clauses)
+
+async def estimate_count(session: AsyncSession, stmt) -> int:
+    sql = stmt.compile(dialect=session.bind.dialect, compile_kwargs={"literal_binds": True})
+    plan = (await session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+async def cached_count(session: AsyncSession, stmt) -> int:
+    sql = str(stmt.compile(dialect=session.bind.dialect, compile_kwargs={"literal_binds": True}))
+    key = f"pagination:count:{hashlib.sha1(sql.encode()).hexdigest()}"
+    try:
+        if (cached := current_app.redis.get(key)) is not None:
+            return int(cached)
+    except RedisError:
+        current_app.logger.warning("Redis down – counting without the cache.")
+    total = (await session.execute(select(func.count()).select_from(stmt.subquery()))).scalar()
+    try:
+        current_app.redis.setex(key, Config.PAGINATION_COUNT_CACHE_SECONDS, total)
+    except RedisError:
+        current_app.logger.warning("Redis down – count not cached.")
+    return total
+
+COUNTERS = {"approximate": estimate_count, "cached": cached_count}
+
+async def keyset_paginate(
+    session: AsyncSession,
+    stmt: select,
+    sort: Sequence[Tuple[str, bool]],
+    cursor: Optional[str],
+    page_size: int,
+    count: Optional[str] = None,
+) -> Tuple[List[Any], Dict[str, Any]]:
+    """``sort`` is (column name, descending) pairs of ``stmt``'s output and must identify a row uniquely."""
+    sq = stmt.subquery()
+    columns = [sq.c[name] for name, _ in sort]
+    descending = [desc for _, desc in sort]
+    page_stmt = select(sq).order_by(*(c.desc() if d else c.asc() for c, d in zip(columns, descending)))
+    if cursor:
+        page_stmt = page_stmt.filter(_after(columns, descending, decode_cursor(cursor, columns)))
+    items = (await session.execute(page_stmt.limit(page_size + 1))).all()
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    pagination = {
+        "page_size": page_size,
+        "next_cursor": encode_cursor([getattr(items[-1], name) for name, _ in sort]) if has_more else None,
+    }
+    if count in COUNTERS:
+        pagination["total_items"] = await COUNTERS[count](session, stmt)
+        pagination["count"] = count
+    return items, pagination
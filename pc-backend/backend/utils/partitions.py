@@ -0,0 +1,88 @@
+import re
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Range-partitioned by month on these columns (migration v30).
+PARTITIONED = {
+    "meta_daily_performance": "date",
+    "shopify_child_daily_sales_summary": "summary_date",
+    "meta_campaign_data": "date",
+    "fx_daily_rates": "date",
+}
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+def default_partition(table: str) -> str:
+    return f"{table}_default"
+
+def months(start: date, end: date):
+    month = month_start(start)
+    while month <= end:
+        yield month
+        month += relativedelta(months=1)
+
+def is_partitioned(session: Session, table: str) -> bool:
+    # relkind 'p': the migration has run; dev databases built by create_all on SQLite never are.
+    if session.get_bind().dialect.name != "postgresql":
+        return False
+    return session.execute(text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table}).scalar() or False
+
+def existing_partitions(session: Session, table: str) -> dict:
+    """Monthly partitions attached to table, as {month: name}; the default partition is left out."""
+    names = session.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:t)"
+    ), {"t": table}).scalars()
+    pattern = re.compile(rf"^{re.escape(table)}_p(\d{{4}})(\d{{2}})$")
+    return {date(int(m[1]), int(m[2]), 1): name for name in names if (m := pattern.match(name))}
+
+def create_partition(session: Session, table: str, month: date) -> str:
+    """Add the partition for month; rows already sitting in the default partition for that range move into it."""
+    column = PARTITIONED[table]
+    name, default = partition_name(table, month), default_partition(table)
+    bounds = {"lo": month, "hi": month + relativedelta(months=1)}
+    # Built detached and attached afterwards: ATTACH only scans the default partition, and never blocks readers of the parent.
+    session.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    session.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE {column} >= :lo AND {column} < :hi RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    session.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{bounds['lo']}') TO ('{bounds['hi']}')"))
+    return name
+
+def ensure_partitions(session: Session, table: str, start: date, end: date) -> list:
+    existing = existing_partitions(session, table)
+    return [create_partition(session, table, m) for m in months(start, end) if m not in existing]
+
+def drop_partitions_before(session: Session, table: str, cutoff: date) -> list:
+    """Detach and drop every monthly partition lying wholly before cutoff, then trim the default partition."""
+    dropped = []
+    for month, name in sorted(existing_partitions(session, table).items()):
+        if month + relativedelta(months=1) > cutoff:
+            break
+        session.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        session.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    column = PARTITIONED[table]
+    session.execute(text(f"DELETE FROM {default_partition(table)} WHERE {column} < :cutoff"), {"cutoff": cutoff})
+    return dropped
+
+def maintain(session: Session, today: date, months_ahead: int, retention_months: int, tables=None) -> dict:
+    """Partitions from the retention cutoff through months_ahead exist, and nothing older remains; one commit per table."""
+    cutoff = month_start(today - relativedelta(months=retention_months))
+    horizon = month_start(today) + relativedelta(months=months_ahead)
+    report = {}
+    for table in tables or PARTITIONED:
+        if not is_partitioned(session, table):
+            report[table] = None
+            continue
+        created = ensure_partitions(session, table, cutoff, horizon)
+        dropped = drop_partitions_before(session, table, cutoff)
+        session.commit()
+        report[table] = {"created": created, "dropped": dropped}
+    return report
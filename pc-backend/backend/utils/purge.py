@@ -0,0 +1,96 @@
+import logging
+import time
+from prometheus_client import Counter, Gauge
+from redis import Redis
+from sqlalchemy import delete, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from backend.config import Config
+
+CHECKPOINT_PREFIX = "purge:checkpoint:"
+LOCK_NOT_AVAILABLE = "55P03"
+
+PURGE_DELETED = Counter("purge_rows_deleted_total", "Rows removed by the purge engine", ["table"])
+PURGE_RATE = Gauge("purge_rows_per_second", "Delete throughput of the last purge run", ["table"])
+
+logger = logging.getLogger(__name__)
+_redis = None
+
+def purge_redis():
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(Config.REDIS_URL, decode_responses=True)
+    return _redis
+
+def _lock_timeout(session, ms):
+    if ms and session.get_bind().dialect.name == "postgresql":
+        # SET LOCAL: the timeout ends with the batch's transaction.
+        session.execute(text(f"SET LOCAL lock_timeout = {int(ms)}"))
+
+def purge(session: Session, model, *criteria, name=None, batch_size=None, pause=None, lock_timeout_ms=None, time_budget=None) -> dict:
+    """Delete rows of model matching criteria in primary-key order, one committed batch at a time.
+
+    Each batch waits at most lock_timeout_ms for its locks and is followed by `pause` seconds of sleep.
+    A batch that times out is retried after a longer pause, and repeated timeouts raise.
+    The last deleted key is checkpointed in Redis under name. A run that stops early, whether by error
+    or by going past time_budget seconds, resumes there next time. A run that finishes clears it.
+    """
+    table = model.__table__
+    pk = table.c.id
+    name = name or table.name
+    batch_size = batch_size or Config.PURGE_BATCH_SIZE
+    pause = Config.PURGE_PAUSE_SECONDS if pause is None else pause
+    lock_timeout_ms = Config.PURGE_LOCK_TIMEOUT_MS if lock_timeout_ms is None else lock_timeout_ms
+    checkpoint_key = CHECKPOINT_PREFIX + name
+    r = purge_redis()
+
+    after = r.get(checkpoint_key)
+    after = pk.type.python_type(after) if after is not None else None
+    started = time.monotonic()
+    deleted = batches = timeouts = 0
+    complete = False
+    while True:
+        batch = select(pk).where(*criteria).order_by(pk).limit(batch_size)
+        if after is not None:
+            batch = batch.where(pk > after)
+        try:
+            _lock_timeout(session, lock_timeout_ms)
+            keys = session.execute(delete(table).where(pk.in_(batch.scalar_subquery())).returning(pk)).scalars().all()
+            session.commit()
+        except OperationalError as e:
+            session.rollback()
+            if getattr(e.orig, "pgcode", None) != LOCK_NOT_AVAILABLE:
+                raise
+            # lock_timeout expired: give the blocking writer room, then retry the same batch.
+            timeouts += 1
+            if timeouts > Config.PURGE_MAX_LOCK_TIMEOUTS:
+                raise
+            time.sleep((pause or 1) * 2 ** timeouts)
+            continue
+        timeouts = 0
+        if not keys:
+            complete = True
+            break
+        after = max(keys)
+        r.set(checkpoint_key, str(after))
+        deleted += len(keys)
+        batches += 1
+        PURGE_DELETED.labels(name).inc(len(keys))
+        if time_budget is not None and time.monotonic() - started >= time_budget:
+            break
+        time.sleep(pause)
+    if complete:
+        r.delete(checkpoint_key)
+
+    elapsed = time.monotonic() - started
+    report = {
+        "table": name,
+        "deleted": deleted,
+        "batches": batches,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(deleted / elapsed, 1) if elapsed else 0.0,
+        "complete": complete,
+    }
+    PURGE_RATE.labels(name).set(report["rows_per_second"])
+    logger.info("purge %s", report)
+    return report
@@ -0,0 +1,336 @@
+import time
+from datetime import date, timedelta
+from uuid import UUID as PyUUID, uuid4
+from prometheus_client.core import REGISTRY, GaugeMetricFamily
+from redis import Redis
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import Date, Integer, and_, bindparam, case, column, delete, func, insert, literal_column, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert as pg_insert
+from backend.config import Config
+from backend.utils.cache_tags import bump_tags
+from backend.models.aggregated import KPIDailySnapshot, KPIMonthlyRollup, KPIWeeklyRollup, MasterStoreDailySummary
+from backend.models.core import BusinessManagerConfig
+from backend.models.transactional import MetaDailyPerformance, ShopifyChildDailySalesSummary, ShopifyDailySalesSummary
+
+KINDS = ("bm", "store")
+STATS_KEY = "rollup:stats"
+DRAIN_LOCK_KEY = "rollup:drain:lock"
+# Frees the lock only while it still holds the caller's token: a drain that outlived ROLLUP_DRAIN_LOCK_SECONDS
+# must not free the lock a later drain has taken since.
+RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+ROLLUP_MODELS = {"week": KPIWeeklyRollup, "month": KPIMonthlyRollup}
+GRAINS = ("day", "week", "month")
+
+# metric name -> (help, rollup_status field)
+ROLLUP_METRICS = {
+    "rollup_dirty_keys": ("Dirty rollup keys waiting to be drained", "backlog"),
+    "rollup_oldest_dirty_age_seconds": ("Age of the oldest undrained rollup key", "oldest_age_seconds"),
+    "rollup_drain_latency_seconds": ("Mark-to-recompute latency of the oldest key in the last drain", "last_drain_latency_seconds"),
+}
+
+_redis = None
+
+def rollup_redis():
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(Config.REDIS_URL, decode_responses=True)
+    return _redis
+
+def acquire_drain_lock():
+    """A token for the drain lock, or None if another drain holds it."""
+    token = uuid4().hex
+    return token if rollup_redis().set(DRAIN_LOCK_KEY, token, nx=True, ex=Config.ROLLUP_DRAIN_LOCK_SECONDS) else None
+
+def release_drain_lock(token):
+    rollup_redis().eval(RELEASE_LOCK_SCRIPT, 1, DRAIN_LOCK_KEY, token)
+
+def _dirty_key(kind):
+    return f"rollup:dirty:{kind}"
+
+def _draining_key(kind):
+    return f"rollup:draining:{kind}"
+
+def days_between(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+def period_start(grain, day):
+    if grain == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1) if grain == "month" else day
+
+def split_range(start, end, coarsest="month"):
+    """Cover start..end with as few rollup rows as possible: {grain: [period starts]}.
+
+    Whole calendar months come from the monthly rollup. Whole ISO weeks inside the remaining partial months
+    come from the weekly rollup. The edge days left over come from kpi_daily_snapshot. No period crosses a
+    month boundary, so every piece can still be bucketed by month. coarsest caps the grain used.
+    """
+    limit = GRAINS.index(coarsest)
+    periods = {grain: [] for grain in GRAINS}
+    month = start.replace(day=1)
+    while month <= end:
+        month_end = month + relativedelta(months=1) - timedelta(days=1)
+        lo, hi = max(start, month), min(end, month_end)
+        if limit >= 2 and (lo, hi) == (month, month_end):
+            periods["month"].append(month)
+        else:
+            day = lo
+            while day <= hi:
+                if limit >= 1 and day.weekday() == 0 and day + timedelta(days=6) <= hi:
+                    periods["week"].append(day)
+                    day += timedelta(days=7)
+                else:
+                    periods["day"].append(day)
+                    day += timedelta(days=1)
+        month += relativedelta(months=1)
+    return {grain: starts for grain, starts in periods.items() if starts}
+
+def auto_grain(start, end):
+    # Coarsest bucket that still leaves a readable number of points on a chart.
+    days = (end - start).days + 1
+    return "month" if days > 92 else "week" if days > 31 else "day"
+
+def bump_cache_tags(kind, keys):
+    # Cached results keyed on these BMs/stores or days stop matching as soon as the data under them changes.
+    keys = list(keys)
+    bump_tags({f"{kind}:{k}" for k, _ in keys} | {f"date:{d}" for _, d in keys}, rollup_redis())
+
+def mark_dirty(kind, keys):
+    # Score is the first time a key went dirty (NX), which is what drain latency is measured from.
+    members = {f"{k}|{d}": time.time() for k, d in keys}
+    if members:
+        rollup_redis().zadd(_dirty_key(kind), members, nx=True)
+        bump_cache_tags(kind, (m.split("|") for m in members))
+
+def mark_dirty_range(kind, key, start, end):
+    mark_dirty(kind, ((key, day) for day in days_between(date.fromisoformat(str(start)), date.fromisoformat(str(end)))))
+
+def _take_dirty(kind):
+    with rollup_redis().pipeline() as pipe:
+        # Keys left in the draining set by a failed drain are merged back in, keeping their original scores.
+        pipe.zunionstore(_draining_key(kind), [_draining_key(kind), _dirty_key(kind)], aggregate="MIN")
+        pipe.delete(_dirty_key(kind))
+        pipe.zrange(_draining_key(kind), 0, -1, withscores=True)
+        members = pipe.execute()[-1]
+    keys = {}
+    for member, score in members:
+        key, _, day = member.partition("|")
+        keys[(key, date.fromisoformat(day))] = score
+    return keys
+
+def _dirty_keys(id_type, keys):
+    # Two array binds instead of a VALUES list: typed, and independent of the bind-parameter limit.
+    return func.unnest(
+        bindparam("dirty_ids", [k for k, _ in keys], type_=ARRAY(id_type)),
+        bindparam("dirty_dates", [d for _, d in keys], type_=ARRAY(Date)),
+    ).table_valued(column("id", id_type), column("date", Date)).render_derived(name="dirty_keys")
+
+def recompute_kpi_snapshots(session, keys):
+    keys = [(int(bm_id), day) for bm_id, day in keys]
+    if not keys:
+        return 0
+    k = _dirty_keys(Integer, keys)
+    spend = (
+        select(MetaDailyPerformance.bm_id, MetaDailyPerformance.date, func.sum(MetaDailyPerformance.spend_raw).label("ad_spend"))
+        .filter(
+            MetaDailyPerformance.bm_id.in_({bm_id for bm_id, _ in keys}),
+            MetaDailyPerformance.date.in_(sorted({day for _, day in keys})),
+        )
+        .group_by(MetaDailyPerformance.bm_id, MetaDailyPerformance.date)
+        .subquery()
+    )
+    revenue = func.coalesce(func.sum(ShopifyChildDailySalesSummary.gross_sales_raw), 0)
+    ad_spend = func.coalesce(func.max(spend.c.ad_spend), 0)
+    rows = (
+        select(
+            k.c.id,
+            BusinessManagerConfig.current_product_category_id,
+            k.c.date,
+            revenue,
+            ad_spend,
+            func.coalesce(revenue / func.nullif(ad_spend, 0), 0),
+            case((revenue > 0, ad_spend / (revenue / 100)), else_=0),
+            func.coalesce(func.max(ShopifyChildDailySalesSummary.currency_code), "USD"),
+        )
+        .select_from(k)
+        .join(BusinessManagerConfig, BusinessManagerConfig.id == k.c.id)
+        .outerjoin(ShopifyChildDailySalesSummary, and_(
+            ShopifyChildDailySalesSummary.bm_id == k.c.id,
+            ShopifyChildDailySalesSummary.summary_date == k.c.date,
+        ))
+        .outerjoin(spend, and_(spend.c.bm_id == k.c.id, spend.c.date == k.c.date))
+        .group_by(k.c.id, k.c.date, BusinessManagerConfig.current_product_category_id)
+    )
+    columns = ["bm_id", "product_category_id", "date", "revenue", "ad_spend", "roas", "cpa", "currency_code"]
+    stmt = pg_insert(KPIDailySnapshot).from_select(columns, rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["bm_id", "date"],
+        set_={**{c: stmt.excluded[c] for c in columns[3:] + ["product_category_id"]}, "updated_at": func.now()},
+    )
+    return session.execute(stmt).rowcount
+
+def recompute_kpi_rollups(session, keys):
+    """Rebuild the weekly and monthly rollup rows that contain these (bm_id, day) keys from kpi_daily_snapshot."""
+    count = 0
+    for grain, model in ROLLUP_MODELS.items():
+        periods = sorted({(int(bm_id), period_start(grain, day)) for bm_id, day in keys})
+        if not periods:
+            continue
+        k = _dirty_keys(Integer, periods)
+        # Replace rather than upsert: a period holds one row per category and currency, and either may be NULL or change.
+        # The drain and upsert_kpi_daily_snapshot can rebuild the same period at once; serialize them per period so
+        # neither inserts next to rows the other has not deleted yet. Locks are taken in key order to avoid deadlocks.
+        session.execute(
+            select(func.pg_advisory_xact_lock(func.hashtextextended(func.concat_ws("|", model.__tablename__, k.c.id, k.c.date), 0)))
+            .select_from(k).order_by(k.c.id, k.c.date)
+        ).all()
+        session.execute(delete(model).where(tuple_(model.bm_id, model.period_start).in_(select(k.c.id, k.c.date))))
+        rows = (
+            select(
+                KPIDailySnapshot.bm_id,
+                KPIDailySnapshot.product_category_id,
+                KPIDailySnapshot.currency_code,
+                k.c.date,
+                func.sum(KPIDailySnapshot.revenue),
+                func.sum(KPIDailySnapshot.ad_spend),
+                func.count(),
+            )
+            .select_from(k)
+            .join(KPIDailySnapshot, and_(
+                KPIDailySnapshot.bm_id == k.c.id,
+                KPIDailySnapshot.date >= k.c.date,
+                KPIDailySnapshot.date < k.c.date + literal_column(f"interval '1 {grain}'"),
+            ))
+            .group_by(KPIDailySnapshot.bm_id, KPIDailySnapshot.product_category_id, KPIDailySnapshot.currency_code, k.c.date)
+        )
+        columns = ["bm_id", "product_category_id", "currency_code", "period_start", "revenue", "ad_spend", "days"]
+        count += session.execute(insert(model).from_select(columns, rows)).rowcount
+    return count
+
+def recompute_master_store_summaries(session, keys):
+    keys = [(PyUUID(str(store_id)), day) for store_id, day in keys]
+    if not keys:
+        return 0
+    k = _dirty_keys(UUID(as_uuid=True), keys)
+    # A store's spend is the spend of the BMs it owns; unattributed rows (bm_id NULL) count nowhere.
+    spend = (
+        select(
+            BusinessManagerConfig.master_store_id,
+            MetaDailyPerformance.date,
+            func.sum(MetaDailyPerformance.spend_raw).label("ad_spend"),
+        )
+        .join(BusinessManagerConfig, BusinessManagerConfig.id == MetaDailyPerformance.bm_id)
+        .filter(
+            BusinessManagerConfig.master_store_id.in_({store_id for store_id, _ in keys}),
+            MetaDailyPerformance.date.in_(sorted({day for _, day in keys})),
+        )
+        .group_by(BusinessManagerConfig.master_store_id, MetaDailyPerformance.date)
+        .subquery()
+    )
+    rows = (
+        select(
+            k.c.id,
+            k.c.date,
+            func.coalesce(func.sum(ShopifyDailySalesSummary.gross_sales_raw), 0),
+            func.coalesce(func.max(spend.c.ad_spend), 0),
+            func.coalesce(func.max(ShopifyDailySalesSummary.currency_code), "USD"),
+        )
+        .select_from(k)
+        .outerjoin(ShopifyDailySalesSummary, and_(
+            ShopifyDailySalesSummary.master_store_id == k.c.id,
+            ShopifyDailySalesSummary.summary_date == k.c.date,
+        ))
+        .outerjoin(spend, and_(spend.c.master_store_id == k.c.id, spend.c.date == k.c.date))
+        .group_by(k.c.id, k.c.date)
+    )
+    columns = ["master_store_id", "date", "total_revenue", "total_ad_spend", "currency_code"]
+    stmt = pg_insert(MasterStoreDailySummary).from_select(columns, rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["master_store_id", "date"],
+        set_={**{c: stmt.excluded[c] for c in columns[2:]}, "updated_at": func.now()},
+    )
+    return session.execute(stmt).rowcount
+
+def _chunks(keys):
+    keys = sorted(keys)
+    for i in range(0, len(keys), Config.ROLLUP_DRAIN_BATCH_SIZE):
+        yield keys[i:i + Config.ROLLUP_DRAIN_BATCH_SIZE]
+
+def drain_dirty(session):
+    started = time.time()
+    bm_keys = _take_dirty("bm")
+    store_keys = _take_dirty("store")
+    if bm_keys:
+        # A BM's numbers feed its master store, so every dirty BM day also dirties the store day.
+        owners = dict(session.execute(
+            select(BusinessManagerConfig.id, BusinessManagerConfig.master_store_id)
+            .filter(BusinessManagerConfig.id.in_({int(bm_id) for bm_id, _ in bm_keys}))
+        ).all())
+        for (bm_id, day), score in bm_keys.items():
+            store = owners.get(int(bm_id))
+            if store is not None:
+                key = (str(store), day)
+                store_keys[key] = min(score, store_keys.get(key, score))
+    for chunk in _chunks(bm_keys):
+        recompute_kpi_snapshots(session, chunk)
+        recompute_kpi_rollups(session, chunk)
+    for chunk in _chunks(store_keys):
+        recompute_master_store_summaries(session, chunk)
+    session.commit()
+    bump_cache_tags("bm", bm_keys)
+    bump_cache_tags("store", store_keys)
+
+    finished = time.time()
+    stats = {"drained_at": finished, "duration": finished - started}
+    for kind, keys in (("bm", bm_keys), ("store", store_keys)):
+        stats[f"{kind}:keys"] = len(keys)
+        stats[f"{kind}:latency"] = finished - min(keys.values()) if keys else 0
+    r = rollup_redis()
+    with r.pipeline() as pipe:
+        for kind in KINDS:
+            pipe.delete(_draining_key(kind))
+        pipe.hset(STATS_KEY, mapping=stats)
+        pipe.execute()
+    return stats
+
+def rollup_status():
+    r = rollup_redis()
+    stats = r.hgetall(STATS_KEY)
+    now = time.time()
+    status = {}
+    for kind in KINDS:
+        oldest = [s for key in (_dirty_key(kind), _draining_key(kind)) for _, s in r.zrange(key, 0, 0, withscores=True)]
+        status[kind] = {
+            "backlog": r.zcard(_dirty_key(kind)) + r.zcard(_draining_key(kind)),
+            "oldest_age_seconds": now - min(oldest) if oldest else 0,
+            "last_drain_keys": int(stats.get(f"{kind}:keys", 0)),
+            "last_drain_latency_seconds": float(stats.get(f"{kind}:latency", 0)),
+        }
+    status["last_drain_at"] = float(stats.get("drained_at", 0))
+    return status
+
+class RollupCollector:
+    """Exports rollup_status() with one Redis round of reads per scrape, shared by every gauge."""
+
+    def _families(self):
+        return {name: GaugeMetricFamily(name, help_, labels=["kind"]) for name, (help_, _) in ROLLUP_METRICS.items()}
+
+    def describe(self):
+        # Lets the registry check names at registration without touching Redis.
+        return list(self._families().values())
+
+    def collect(self):
+        families = self._families()
+        try:
+            status = rollup_status()
+        except Exception:
+            status = None
+        for name, (_, field) in ROLLUP_METRICS.items():
+            for kind in KINDS:
+                families[name].add_metric([kind], status[kind][field] if status else float("nan"))
+        return list(families.values())
+
+REGISTRY.register(RollupCollector())
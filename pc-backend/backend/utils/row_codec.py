@@ -0,0 +1,49 @@
+import enum
+import uuid
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+import msgpack
+
+# msgpack ext type codes; values round-trip as the same Python types the database driver returned.
+EXT_DECIMAL, EXT_DATE, EXT_DATETIME, EXT_UUID = 1, 2, 3, 4
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(value).encode())
+    if isinstance(value, datetime):
+        return msgpack.ExtType(EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, date):
+        return msgpack.ExtType(EXT_DATE, value.isoformat().encode())
+    if isinstance(value, uuid.UUID):
+        return msgpack.ExtType(EXT_UUID, value.bytes)
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+def _ext_hook(code, data):
+    if code == EXT_DECIMAL:
+        return Decimal(data.decode())
+    if code == EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == EXT_DATE:
+        return date.fromisoformat(data.decode())
+    if code == EXT_UUID:
+        return uuid.UUID(bytes=data)
+    return msgpack.ExtType(code, data)
+
+@lru_cache(maxsize=256)
+def _row_type(fields):
+    return namedtuple("CachedRow", fields, rename=True)
+
+def encode_rows(rows):
+    rows = list(rows)
+    fields = list(rows[0]._fields) if rows else []
+    return msgpack.packb([fields, [list(r) for r in rows]], default=_default, use_bin_type=True)
+
+def decode_rows(blob):
+    """Rows come back as namedtuples, so attribute access and _asdict() work as on SQLAlchemy rows."""
+    fields, rows = msgpack.unpackb(blob, ext_hook=_ext_hook, raw=False)
+    row_type = _row_type(tuple(fields))
+    return [row_type(*r) for r in rows]
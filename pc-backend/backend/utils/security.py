@@ -1,47 +1,58 @@
-import hashlib
-import hmac
+import json
+import time
 from datetime import datetime
 from functools import wraps
 from flask import request, abort, current_app, g
 from flask_jwt_extended import get_jwt
+from sqlalchemy import select
 from backend.models.security import ApiKey
+from backend.utils.api_key_cache import cached_scopes, epoch, record_use, remember_verified
 from backend.utils.db import get_db_session
 from bcrypt import checkpw
 
+async def _verify_key(kid: str, secret: str):
+    """bcrypt path: look the key up and check the secret; a match is remembered so the next call skips bcrypt."""
+    key_obj = current_app.redis.get(f"ak:{kid}")
+    if key_obj:
+        key_dict = json.loads(key_obj)
+        key_obj = ApiKey(key_hash=key_dict['key_hash'], expires_at=datetime.fromisoformat(key_dict['expires_at']), scopes=key_dict['scopes'])
+    else:
+        async with get_db_session() as session:
+            key_obj = (await session.execute(select(ApiKey).filter_by(key_id=kid, revoked=False))).scalars().first()
+        if key_obj:
+            current_app.redis.setex(f"ak:{kid}", int(epoch(key_obj.expires_at) - time.time()), json.dumps({'key_hash': key_obj.key_hash, 'expires_at': str(key_obj.expires_at), 'scopes': key_obj.scopes}))
+    valid_until = epoch(key_obj.expires_at) if key_obj else 0
+    if valid_until < time.time():
+        with current_app.redis.pipeline() as pipe:
+            grace, grace_ttl = pipe.get(f"ak_grace:{kid}").ttl(f"ak_grace:{kid}").execute()
+        if not grace:
+            abort(401, "Invalid key")
+        grace_dict = json.loads(grace)
+        key_obj = ApiKey(key_hash=grace_dict['key_hash'], expires_at=datetime.fromisoformat(grace_dict['expires_at']), scopes=grace_dict.get('scopes', []))
+        valid_until = time.time() + grace_ttl
+    if not checkpw(secret.encode(), key_obj.key_hash.encode()):
+        abort(401, "Invalid key")
+    remember_verified(kid, secret, key_obj.scopes, valid_until)
+    return key_obj.scopes
+
 def require_api_key(required_scopes: set[str]):
     def wrapper(fn):
         @wraps(fn)
-        def inner(*a, **kw):
+        async def inner(*a, **kw):
             token = request.headers.get("X-Api-Key", "")
             if not token:
                 legacy_token = request.headers.get("X-Ingestion-Token", "")
                 if legacy_token == current_app.config['INGESTION_TOKEN']:
-                    return fn(*a, **kw)
+                    return await fn(*a, **kw)
                 abort(401, "API key required")
             kid, _, secret = token.partition(".")
-            with get_db_session() as session:
-                key_obj = current_app.redis.get(f"ak:{kid}")
-                if key_obj:
-                    key_dict = json.loads(key_obj)
-                    key_obj = ApiKey(key_hash=key_dict['key_hash'], expires_at=datetime.fromisoformat(key_dict['expires_at']), scopes=key_dict['scopes'])
-                else:
-                    key_obj = session.query(ApiKey).filter_by(key_id=kid, revoked=False).first()
-                    if key_obj:
-                        current_app.redis.setex(f"ak:{kid}", int((key_obj.expires_at - datetime.utcnow()).total_seconds()), json.dumps({'key_hash': key_obj.key_hash, 'expires_at': str(key_obj.expires_at), 'scopes': key_obj.scopes}))
-                if not key_obj or datetime.utcnow() > key_obj.expires_at:
-                    grace = current_app.redis.get(f"ak_grace:{kid}")
-                    if grace:
-                        grace_dict = json.loads(grace)
-                        key_obj = ApiKey(key_hash=grace_dict['key_hash'], expires_at=datetime.fromisoformat(grace_dict['expires_at']))
-                    else:
-                        abort(401, "Invalid key")
-                if not required_scopes.issubset(set(key_obj.scopes)):
-                    abort(403, "Scope insufficient")
-                if checkpw(secret.encode(), key_obj.key_hash.encode()):
-                    key_obj.last_used_at = datetime.utcnow()
-                    session.commit()
-                    return fn(*a, **kw)
-                abort(401, "Invalid key")
+            scopes = cached_scopes(kid, secret)
+            if scopes is None:
+                scopes = await _verify_key(kid, secret)
+            if not required_scopes.issubset(set(scopes or [])):
+                abort(403, "Scope insufficient")
+            record_use(kid)
+            return await fn(*a, **kw)
         return inner
     return wrapper
 
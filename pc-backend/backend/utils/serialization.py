@@ -0,0 +1,37 @@
+from datetime import date
+from decimal import Decimal
+from typing import Any, Iterable, Optional
+import orjson
+from flask import current_app, request
+from werkzeug.http import http_date
+
+# orjson handles UUID and Enum itself. Dates and Decimals are handed to _default, so they keep the form
+# jsonify gave them (RFC 822 dates, Decimal strings) and clients see the same payloads as before.
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return http_date(value)
+    if hasattr(value, "_asdict"):
+        return value._asdict()
+    raise TypeError
+
+def dumps(payload: Any) -> bytes:
+    return orjson.dumps(payload, default=_default, option=OPTIONS)
+
+def rows_payload(rows: Iterable[Any], shape: Optional[str] = None):
+    """Rows as a list of objects, or with shape="columns" as {"columns": [...], "data": [[...]]}."""
+    rows = list(rows)
+    fields = list(rows[0]._fields) if rows else []
+    if shape == "columns":
+        return {"columns": fields, "data": [list(r) for r in rows]}
+    return [dict(zip(fields, r)) for r in rows]
+
+def json_response(payload: Any, status: int = 200):
+    return current_app.response_class(dumps(payload), status=status, mimetype="application/json")
+
+def rows_response(rows: Iterable[Any], status: int = 200):
+    # ?shape=columns sends field names once instead of on every row.
+    return json_response(rows_payload(rows, request.args.get("shape")), status)
@@ -0,0 +1,47 @@
+import hashlib
+import time
+from functools import wraps
+from flask import current_app, request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.utils.cache_tags import tag_versions
+from backend.utils.db import get_db_session
+
+class Tag(str):
+    """A cache tag in a watermark. Its version moves on writes that no timestamp column records, such as deletes."""
+
+async def data_watermark(session: AsyncSession, columns):
+    # Latest write across the given timestamp columns; each max() is its own scalar subquery on an index.
+    tags = [c for c in columns if isinstance(c, Tag)]
+    latest = [select(func.max(c)).scalar_subquery() for c in columns if not isinstance(c, Tag)]
+    value = (await session.execute(select(func.greatest(*latest)))).scalar()
+    watermark = value.isoformat() if value else None
+    if tags:
+        watermark = f"{watermark}|" + ",".join(f"{t}={v}" for t, v in tag_versions(tags))
+    return watermark
+
+def request_etag(watermark, bucket=None):
+    parts = [request.path, sorted(request.args.items(multi=True)), watermark]
+    if bucket:
+        # For payloads computed against now(): the tag also rolls over every `bucket` seconds.
+        parts.append(int(time.time() // bucket))
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+def conditional(*columns, bucket=None):
+    """Weak ETag from the request and the data watermark of columns; If-None-Match gets a 304 before the view runs."""
+    def decorator(fn):
+        @wraps(fn)
+        async def inner(*a, **kw):
+            async with get_db_session(read_only=True) as session:
+                etag = request_etag(await data_watermark(session, columns), bucket)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(await fn(*a, **kw))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return inner
+    return decorator